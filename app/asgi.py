@@ -7,10 +7,87 @@ For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 """
 
+import asyncio
+import contextvars
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers import asgi
+from django.db import connections
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
+
+class ASGIRequest(asgi.ASGIRequest):
+    # serves the API's reads from the event loop, see app.asgi_urls
+    urlconf = 'app.asgi_urls'
+
+
+async def iterate_in_thread(iterable):
+    """Yield the items of iterable, each one fetched in a thread of its own
+
+    All of them come from the same thread, as a database cursor the
+    iterable reads from is tied to that thread's connection, which is
+    closed once the iteration ends.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    iterator = iter(iterable)
+    done = object()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='stream') as executor:
+        try:
+            while True:
+                item = await loop.run_in_executor(
+                    executor, context.run, next, iterator, done
+                )
+                if item is done:
+                    return
+                yield item
+        finally:
+            await loop.run_in_executor(executor, connections.close_all)
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    request_class = ASGIRequest
+
+    async def send_response(self, response, send):
+        """As Django's, except that streaming content is read in a thread
+
+        Django 3.1 iterates it on the event loop, where the queries of eg.
+        the recipe export raise SynchronousOnlyOperation.
+        """
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = [
+            (header.encode('ascii'), value.encode('latin1'))
+            for header, value in response.items()
+        ] + [
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        ]
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        async for part in iterate_in_thread(response):
+            for chunk, _ in self.chunk_bytes(part):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_asgi_application():
+    """As django.core.asgi.get_asgi_application, with the ASGI urlconf"""
+    django.setup(set_prefix=False)
+    return ASGIHandler()
+
+
 application = get_asgi_application()
@@ -0,0 +1,28 @@
+"""URLs served under ASGI, see app/asgi.py
+
+The same as app.urls, except that the reads of recipes, tags and
+ingredients go through recipe.async_views.
+"""
+from django.urls import include, path, re_path
+
+from app import urls
+from recipe import urls as recipe_urls
+from recipe.async_views import async_view
+
+ASYNC_ROUTES = ('recipe-list', 'recipe-detail', 'tag-list', 'ingredient-list')
+
+# the router's routes in their own order, as the detail route would
+# otherwise shadow recipes/search/, recipes/export/ and the other actions
+recipe_patterns = [
+    re_path(
+        pattern.pattern.regex.pattern, async_view(pattern.callback), name=pattern.name
+    )
+    if pattern.name in ASYNC_ROUTES else pattern
+    for pattern in recipe_urls.router.urls
+]
+
+urlpatterns = [
+    path('api/recipe/', include((recipe_patterns, recipe_urls.app_name)))
+    if getattr(pattern, 'app_name', None) == recipe_urls.app_name else pattern
+    for pattern in urls.urlpatterns
+]
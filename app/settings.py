@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,7 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,11 +82,87 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Postgres (psycopg2 must be installed) when DB_HOST is set, SQLite otherwise
+if os.environ.get('DB_HOST'):
+    # DB_POOL hands connections out of an in-process pool, see
+    # core.db.backends.postgresql_pool; they go back to it after each request.
+    # Up to DB_POOL_MAX returned connections stay open for reuse, so each
+    # process may hold that many: keep workers * DB_POOL_MAX within the
+    # server's max_connections, or lower DB_POOL_MAX, at the cost of
+    # waiting for a connection (DB_POOL_TIMEOUT) under bursts
+    DB_POOL = bool(os.environ.get('DB_POOL'))
+    DATABASES = {
+        'default': {
+            'ENGINE': (
+                'core.db.backends.postgresql_pool' if DB_POOL
+                else 'django.db.backends.postgresql'
+            ),
+            'HOST': os.environ['DB_HOST'],
+            'PORT': os.environ.get('DB_PORT', ''),
+            'NAME': os.environ.get('DB_NAME', 'app'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASS', ''),
+            # seconds a connection is kept open for the following requests
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0 if DB_POOL else 60)),
+            # kept connections are checked as each request starts, see core.db
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 10)),
+                **({
+                    'MIN_CONNECTIONS': int(os.environ.get('DB_POOL_MIN', 2)),
+                    'MAX_CONNECTIONS': int(os.environ.get('DB_POOL_MAX', 20)),
+                    'POOL_TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                } if DB_POOL else {}),
+            },
+        }
+    }
+    # read replicas of the primary, given as DB_REPLICA_HOSTS=host1,host2
+    DB_REPLICA_HOSTS = os.environ.get('DB_REPLICA_HOSTS', '').split(',')
+    for i, host in enumerate(filter(None, map(str.strip, DB_REPLICA_HOSTS)), 1):
+        DATABASES[f'replica_{i}'] = {
+            **DATABASES['default'],
+            'HOST': host,
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            # tests use an in-memory database unless given a file here,
+            # which concurrent clients need (see core.test.test_benchmarks)
+            'TEST': {'NAME': os.environ.get('DB_TEST_NAME')},
+        },
+        # the same file opened read only, a replica for core.routers
+        'readonly': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': f'file:{BASE_DIR / "db.sqlite3"}?mode=ro',
+            'TEST': {'MIRROR': 'default'},
+        },
     }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Aliases the reads of safe requests may go to, see core.routers. Clients
+# that wrote read from 'default' for PIN_SECONDS afterwards, pinned by a
+# cookie; CACHE_ALIAS, if set, names a shared cache to also pin them by
+# their credentials in.
+DATABASE_REPLICAS = {
+    'ALIASES': tuple(alias for alias in DATABASES if alias != 'default'),
+    'PIN_SECONDS': int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5)),
+    'CACHE_ALIAS': None,
+}
+
+# Run in order on each new SQLite connection, see core.db. WAL lets readers
+# go on while a write is in progress; busy_timeout comes first so the others
+# wait for a lock too. An empty dict keeps SQLite's defaults.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
 }
 
 
@@ -129,4 +208,88 @@ MEDIA_URL = '/media/'
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'core.User'
+
+# Token -> user lookups cached by user.authentication.CachedTokenAuthentication.
+# Without a CACHE_ALIAS shared by the processes, a deleted token or a
+# deactivated user keeps authenticating in the processes that did not make
+# the change for up to TTL seconds; with one, revocation is immediate.
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 1024,
+    'TTL': 60,
+    'CACHE_ALIAS': None,
+}
+
+# Background processing of uploaded recipe images, see recipe.images
+RECIPE_IMAGE_PIPELINE = {
+    'WORKERS': 2,
+    'EAGER': False,
+    'THUMBNAIL_SIZES': ((200, 200), (600, 600)),
+    'QUALITY': 85,
+    # uploads are decoded in the web process, so bound what they may cost
+    'MAX_IMAGE_PIXELS': 40_000_000,
+}
+
+# On-demand resized recipe images served under /media/recipe/, see recipe.variants
+RECIPE_IMAGE_VARIANTS = {
+    'MAX_BYTES': 256 * 1024 * 1024,
+    'SIZES': ((100, 100), (200, 200), (600, 600), (1200, 1200)),
+    'QUALITY': 80,
+}
+
+# Swap the backend (eg. for memcached or redis) to share cached responses
+# between processes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recipe-app',
+    }
+}
+
+# Rendered recipe list/detail responses, see recipe.response_cache
+RECIPE_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'default',
+    'TTL': 300,
+}
+
+# Threads running the database work of the API's reads under ASGI, see
+# recipe.async_views
+ASYNC_API = {
+    'DB_THREADS': 8,
+}
+
+# Per endpoint timings on /metrics and cProfile dumps, see core.profiling.
+# The middleware removes itself unless ENABLED.
+REQUEST_PROFILING = {
+    'ENABLED': bool(os.environ.get('REQUEST_PROFILING')),
+    'RESERVOIR_SIZE': 1024,
+    'PROFILE_HEADER': 'X-Profile',
+    'PROFILE_SAMPLE_RATE': float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    'PROFILE_DIR': os.environ.get('PROFILE_DIR'),
+    # X-Profile is honoured, and /metrics served, for staff users or when
+    # the header is set to the secret
+    'PROFILE_SECRET': os.environ.get('PROFILE_SECRET'),
+    'PROFILE_KEEP': 100,
+}
+
+# /readyz probes, see core.health
+HEALTH_CHECKS = {
+    'CACHE_SECONDS': 5,
+    'DATABASE_ALIAS': 'default',
+    'CACHE_ALIAS': 'default',
+}
+
+# core.renderers/core.parsers use orjson when it is installed and fall
+# back to DRF's stdlib JSON handling otherwise
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+}
@@ -18,8 +18,19 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from core.views import healthz, metrics, readyz
+from recipe.views import recipe_image_variant
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
+    path('metrics', metrics, name='metrics'),
+    path(
+        'media/recipe/<uuid:image_id>.<str:ext>/<int:width>x<int:height>.<str:fmt>',
+        recipe_image_variant,
+        name='recipe-image-variant'
+    ),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls'))
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .db import apply_sqlite_pragmas, close_unusable_connections
+        request_started.connect(
+            close_unusable_connections,
+            dispatch_uid='core.db.close_unusable_connections'
+        )
+        connection_created.connect(
+            apply_sqlite_pragmas,
+            dispatch_uid='core.db.apply_sqlite_pragmas'
+        )
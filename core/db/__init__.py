@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import connections
+
+
+def close_unusable_connections(**kwargs):
+    """Close kept connections that no longer work before a request uses them
+
+    Django 3.1 only finds out that a persistent connection was dropped
+    (by a database restart or failover) when a query on it fails. The
+    connections whose settings enable CONN_HEALTH_CHECKS are checked as
+    each request starts instead, the next query reconnecting.
+    """
+    for conn in connections.all():
+        if (conn.connection is None
+                or not conn.settings_dict.get('CONN_HEALTH_CHECKS')
+                or conn.in_atomic_block):
+            continue
+        if not conn.is_usable():
+            conn.errors_occurred = True
+            conn.close()
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Tune each new SQLite connection with the SQLITE_PRAGMAS setting"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    read_only = 'mode=ro' in str(connection.settings_dict['NAME'])
+    with connection.cursor() as cursor:
+        for pragma, value in pragmas.items():
+            # the journal mode is stored in the file, which a read-only
+            # connection cannot change
+            if pragma == 'journal_mode' and read_only:
+                continue
+            cursor.execute(f'PRAGMA {pragma} = {value}')
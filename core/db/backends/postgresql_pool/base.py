@@ -0,0 +1,124 @@
+"""PostgreSQL backend handing out connections from an in-process pool
+
+Opening a connection costs a few milliseconds of TCP, TLS and backend
+startup; with this engine closing a connection returns it to a pool
+shared by the threads of the process, and the next connect takes it
+back. Settings OPTIONS:
+
+- MIN_CONNECTIONS: connections opened up front
+- MAX_CONNECTIONS: connections open at once; more wait for one to be returned
+- POOL_TIMEOUT: seconds to wait for a connection before giving up
+
+Returned connections are kept idle up to MAX_CONNECTIONS, rather than
+psycopg2's MIN_CONNECTIONS, so a burst of concurrent requests reuses
+them instead of opening and closing new ones; a process can therefore
+hold MAX_CONNECTIONS server connections once it has seen that many at
+once.
+
+Use it with CONN_MAX_AGE = 0 so connections go back to the pool at the
+end of each request rather than staying with the thread.
+"""
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from psycopg2 import extras, pool
+
+POOL_OPTIONS = ('MIN_CONNECTIONS', 'MAX_CONNECTIONS', 'POOL_TIMEOUT')
+
+
+class ConnectionPool(pool.ThreadedConnectionPool):
+    """Thread safe pool waiting for a free connection instead of failing"""
+
+    def __init__(self, minconn, maxconn, timeout, **kwargs):
+        super().__init__(minconn, maxconn, **kwargs)
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, key=None):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise pool.PoolError(
+                f'no connection available after {self.timeout} seconds'
+            )
+        try:
+            conn = super().getconn(key)
+            if conn.closed:
+                # dropped while idle in the pool
+                super().putconn(conn, close=True)
+                conn = super().getconn(key)
+        except BaseException:
+            self.slots.release()
+            raise
+        return conn
+
+    def _putconn(self, conn, key=None, close=False):
+        # psycopg2 closes what is returned beyond minconn; keep up to
+        # maxconn. Called with the pool's lock held, so no one else sees
+        # minconn changed
+        minconn = self.minconn
+        self.minconn = self.maxconn
+        try:
+            super()._putconn(conn, key, close)
+        finally:
+            self.minconn = minconn
+
+    def putconn(self, conn, key=None, close=False):
+        try:
+            # rolls back an unfinished transaction, closes a broken connection
+            super().putconn(conn, key, close=close or bool(conn.closed))
+        finally:
+            self.slots.release()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(options, conn_params):
+    """The process' pool of connections made with conn_params"""
+    # a forked worker must not share the connections of its parent
+    key = (os.getpid(), tuple(sorted((k, str(v)) for k, v in conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                options.get('MIN_CONNECTIONS', 1),
+                options.get('MAX_CONNECTIONS', 10),
+                options.get('POOL_TIMEOUT', 10),
+                **conn_params
+            )
+        return _pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        for option in POOL_OPTIONS:
+            conn_params.pop(option, None)
+        return conn_params
+
+    @property
+    def pool(self):
+        return get_pool(self.settings_dict['OPTIONS'], self.get_connection_params())
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        connection = get_pool(self.settings_dict['OPTIONS'], conn_params).getconn()
+        # as in the postgresql backend, see its get_new_connection
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # one that failed may be broken without psycopg2 knowing
+                self.pool.putconn(self.connection, close=self.errors_occurred)
@@ -0,0 +1,94 @@
+"""Checks that the services the API depends on are reachable
+
+Each check raises when its service cannot be used. Readiness probes can
+come every second from several load balancers, so run_checks() keeps the
+outcome for CACHE_SECONDS instead of probing on every request. The
+errors are logged rather than reported, as the probe is unauthenticated.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.db import connections
+
+DEFAULTS = {
+    'CACHE_SECONDS': 5,
+    'DATABASE_ALIAS': 'default',
+    'CACHE_ALIAS': 'default',
+}
+
+CACHE_KEY = 'health-check'
+
+logger = logging.getLogger(__name__)
+
+
+def health_settings():
+    return {**DEFAULTS, **getattr(settings, 'HEALTH_CHECKS', {})}
+
+
+def check_database(alias='default'):
+    """Connect to the database if needed and run a trivial query"""
+    connection = connections[alias]
+    connection.ensure_connection()
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def check_cache(alias='default'):
+    """Write to the cache and read the value back"""
+    cache = caches[alias]
+    value = str(time.time())
+    cache.set(CACHE_KEY, value, 60)
+    if cache.get(CACHE_KEY) != value:
+        raise RuntimeError('the cache did not keep the value written')
+
+
+def check_storage():
+    """Look up the root of the media storage"""
+    if not default_storage.exists(''):
+        raise RuntimeError('the media storage root does not exist')
+
+
+def checks():
+    config = health_settings()
+    return {
+        'database': lambda: check_database(config['DATABASE_ALIAS']),
+        'cache': lambda: check_cache(config['CACHE_ALIAS']),
+        'storage': check_storage,
+    }
+
+
+_results = None
+_expires = 0
+_lock = threading.Lock()
+
+
+def run_checks():
+    """Map each check to 'ok' or 'failed', cached briefly"""
+    global _results, _expires
+    with _lock:
+        if _results is not None and time.monotonic() < _expires:
+            return _results
+        results = {}
+        for name, check in checks().items():
+            try:
+                check()
+            except Exception:
+                logger.exception('Health check %s failed', name)
+                results[name] = 'failed'
+            else:
+                results[name] = 'ok'
+        _results = results
+        _expires = time.monotonic() + health_settings()['CACHE_SECONDS']
+        return results
+
+
+def reset():
+    """Forget the cached outcome, so the next run_checks() probes again"""
+    global _results
+    with _lock:
+        _results = None
@@ -0,0 +1,108 @@
+import re
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from recipe import facets, search
+from recipe.rows import row_serializer
+from recipe.views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+# (name, viewset, action, query parameters)
+VIEW_SHAPES = (
+    ('tag list', TagViewSet, 'list', {}),
+    ('assigned tag list', TagViewSet, 'list', {'assigned_only': '1'}),
+    ('ingredient list', IngredientViewSet, 'list', {}),
+    ('assigned ingredient list', IngredientViewSet, 'list', {'assigned_only': '1'}),
+    ('recipe list', RecipeViewSet, 'list', {}),
+    ('recipe list by time and price', RecipeViewSet, 'list',
+     {'time_minutes_max': '30', 'price_max': '10'}),
+    ('recipe detail', RecipeViewSet, 'retrieve', {}),
+)
+
+# SQLite: "SCAN core_tag" (3.36+) or "SCAN TABLE core_tag AS U0"
+SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?: AS (\w+))?')
+POSTGRES_SCAN = re.compile(r'\bSeq Scan on (\w+)')
+
+
+def sequential_scans(plan, sql, vendor):
+    """Names of the tables plan reads in full
+
+    SQLite may name a table by its alias, which is resolved from sql.
+    """
+    if vendor == 'postgresql':
+        return POSTGRES_SCAN.findall(plan)
+
+    tables = []
+    for name, alias in SQLITE_SCAN.findall(plan):
+        match = re.search(rf'"(\w+)" (?:AS )?"?{name}"?(?:\W|$)', sql)
+        if match and not alias:
+            name = match.group(1)
+        if name != 'CONSTANT':
+            tables.append(name)
+    return tables
+
+
+class Command(BaseCommand):
+    """EXPLAIN the queries behind the recipe API, failing on full table scans"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='tables with at most this many rows may be scanned'
+        )
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.order_by('pk').first()
+        if user is None:
+            user = get_user_model()(pk=0)
+        tables = {model._meta.db_table: model for model in apps.get_models()}
+        counts = {}
+
+        failures = []
+        for name, queryset in self.querysets(user):
+            try:
+                plan = queryset.explain()
+                sql = str(queryset.query)
+            except EmptyResultSet:
+                self.stdout.write(f'{name}: matches nothing for this user, skipped')
+                continue
+
+            self.stdout.write(f'{name}:\n  ' + plan.replace('\n', '\n  '))
+            for table in sequential_scans(plan, sql, connection.vendor):
+                if table not in counts:
+                    model = tables.get(table)
+                    counts[table] = model._base_manager.count() if model else 0
+                if counts[table] > options['min_rows']:
+                    failures.append(f'{name} scans {table} ({counts[table]} rows)')
+
+        if failures:
+            raise CommandError('Sequential scans found:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('No sequential scans above the threshold'))
+
+    def querysets(self, user):
+        """(name, queryset) for each query shape the API runs"""
+        factory = RequestFactory()
+        for name, viewset, action, params in VIEW_SHAPES:
+            view = viewset(action=action, kwargs={}, format_kwarg=None)
+            view.request = Request(factory.get('/', params))
+            view.request.user = user
+            queryset = view.filter_queryset(view.get_queryset())
+            if action == 'retrieve':
+                queryset = queryset.filter(pk=0)
+            else:
+                paginator = view.pagination_class
+                queryset = queryset.order_by(*paginator.ordering)[:paginator.page_size]
+            yield name, queryset
+
+            rows = row_serializer(view.get_serializer_class())
+            for relation in rows.relations:
+                yield f'{name}, {relation.name}', relation.queryset([0])
+
+        for relation in facets.RELATIONS:
+            yield f'{relation} membership index', facets.membership_rows(relation, user.pk)
+        yield 'search', search.matching_tokens(user.pk, ['curry', 'rice'])
@@ -0,0 +1,71 @@
+import json
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from recipe import importer
+
+
+class Command(BaseCommand):
+    """Import a user's recipes from an NDJSON or CSV export"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help='email of the owner')
+        parser.add_argument('--format', choices=importer.FORMATS)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--checkpoint',
+            help='file recording progress; an existing one resumes the import'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["user"]}')
+
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in importer.FORMATS:
+            raise CommandError('Pass --format, the file extension is not ndjson or csv')
+
+        checkpoint = options['checkpoint']
+        skip = self.read_checkpoint(checkpoint)
+        if skip:
+            self.stdout.write(f'Resuming after {skip} records')
+        start = time.monotonic()
+
+        def progress(result):
+            if checkpoint:
+                self.write_checkpoint(checkpoint, result.processed)
+            rate = (result.processed - skip) / max(time.monotonic() - start, 1e-6)
+            self.stdout.write(
+                f'{result.processed} records read, {result.created} imported, '
+                f'{result.failed} failed ({rate:.0f} records/s)'
+            )
+
+        with open(path, encoding='utf-8', newline='') as stream:
+            result = importer.import_recipes(
+                user, stream, fmt, skip, options['batch_size'], progress
+            )
+
+        for error in result.errors:
+            self.stderr.write(f'line {error["line"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} recipes, {result.failed} failed'
+        ))
+
+    def read_checkpoint(self, path):
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            return json.load(f)['processed']
+
+    def write_checkpoint(self, path, processed):
+        # write then rename, so an interruption never leaves half a file
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump({'processed': processed}, f)
+        os.replace(f'{path}.tmp', path)
@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+
+from core.models import Recipe
+from recipe import search
+
+
+class Command(BaseCommand):
+    """Rebuild the recipe search index from scratch"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipes = Recipe.objects.order_by('id')
+        total = 0
+        last_id = 0
+        while True:
+            batch = list(recipes.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            search.index_recipes(batch)
+            total += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} recipes'))
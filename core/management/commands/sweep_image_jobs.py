@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand
+
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Finish or fail recipe image jobs lost with their worker
+
+    Jobs are queued in the web process, so run this after a restart or
+    periodically: unfinished jobs older than --stale-after seconds are
+    processed again, or failed with --no-retry, and staged uploads no job
+    uses any more are deleted.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-after', type=float, default=None,
+            help='Seconds after which an unfinished job is taken for lost'
+        )
+        parser.add_argument(
+            '--no-retry', action='store_false', dest='retry',
+            help='Fail lost jobs instead of processing them again'
+        )
+
+    def handle(self, *args, **options):
+        retried, failed, deleted = images.sweep(
+            options['stale_after'], options['retry']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Retried {retried} jobs, failed {failed}, '
+            f'deleted {deleted} orphaned uploads'
+        ))
@@ -1,21 +1,46 @@
+import random
 import time
 
-from django.core.management import BaseCommand
-from django.db import connections
+from django.core.management import BaseCommand, CommandError
 from django.db.utils import OperationalError
 
+from core.health import check_database
+
 
 class Command(BaseCommand):
-    """test if the database is available"""
+    """Wait until the database accepts connections and answers a query"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Seconds to wait before giving up'
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Longest pause between attempts, in seconds'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write('Waiting for database')
-        db_conn = None
-        while not db_conn:
+        deadline = time.monotonic() + options['timeout']
+        delay = 0.1
+        while True:
             try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database in unavailable ,retry after 1 second')
-                time.sleep(1)
+                check_database(options['database'])
+                break
+            except OperationalError as exc:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f'Database unavailable after {options["timeout"]} seconds: {exc}'
+                    )
+                # jitter keeps containers started together from retrying in step
+                pause = min(random.uniform(delay / 2, delay), remaining)
+                self.stdout.write(
+                    f'Database unavailable, retrying in {pause:.1f} seconds'
+                )
+                time.sleep(pause)
+                delay = min(delay * 2, options['max_delay'])
 
         self.stdout.write(self.style.SUCCESS('Database is available!'))
@@ -0,0 +1,71 @@
+from django.db import migrations
+from django.db.models import F
+
+BATCH_SIZE = 500
+
+
+def normalize_name(name):
+    # a copy of core.models.normalize_name as of this migration
+    return ' '.join(name.split()).casefold()
+
+
+def chunks(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def merge_duplicates(apps, model_name, relation):
+    """Fill normalized_name and fold same-named objects into the oldest one
+
+    Recipes linked to a duplicate are linked to the kept object instead;
+    pairs they already had are left alone.
+    """
+    model = apps.get_model('core', model_name)
+    through = apps.get_model('core', 'Recipe')._meta.get_field(relation).remote_field.through
+    CatalogVersion = apps.get_model('core', 'CatalogVersion')
+    column = f'{model_name.lower()}_id'
+
+    kept = {}
+    replaced = {}
+    changed = []
+    users = set()
+    for obj in model.objects.order_by('id').only('id', 'user_id', 'name').iterator():
+        obj.normalized_name = normalize_name(obj.name)
+        key = (obj.user_id, obj.normalized_name)
+        if key in kept:
+            replaced[obj.id] = kept[key]
+            users.add(obj.user_id)
+        else:
+            kept[key] = obj.id
+            changed.append(obj)
+    model.objects.bulk_update(changed, ['normalized_name'], batch_size=BATCH_SIZE)
+
+    for ids in chunks(list(replaced)):
+        links = through.objects.filter(**{f'{column}__in': ids})
+        through.objects.bulk_create([
+            through(recipe_id=recipe_id, **{column: replaced[obj_id]})
+            for recipe_id, obj_id in links.values_list('recipe_id', column)
+        ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+        model.objects.filter(id__in=ids).delete()
+
+    # cached responses and ETags are keyed on these
+    for user_ids in chunks(list(users)):
+        CatalogVersion.objects.filter(user_id__in=user_ids).update(
+            version=F('version') + 1
+        )
+
+
+def merge(apps, schema_editor):
+    merge_duplicates(apps, 'Tag', 'tags')
+    merge_duplicates(apps, 'Ingredient', 'ingredient')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_attr_normalized_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.1.1 on 2026-10-18 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_recipe_through_models'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipesearchtoken',
+            name='core_recipe_user_id_5fdf98_idx',
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='tags',
+            field=models.ManyToManyField(through='core.RecipeTag', to='core.Tag'),
+        ),
+        migrations.AddIndex(
+            model_name='recipesearchtoken',
+            index=models.Index(fields=['user', 'token'], name='core_search_user_token_idx', opclasses=['int4_ops', 'varchar_pattern_ops']),
+        ),
+    ]
@@ -58,22 +58,98 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.name
 
 
-class Tag(models.Model):
-    """Tag model"""
+def normalize_name(name):
+    """Key under which a tag/ingredient name is unique for a user"""
+    return ' '.join(name.split()).casefold()
+
+
+class RecipeAttrManager(models.Manager):
+
+    def get_or_create_by_name(self, user, name):
+        """The user's object with this name, ignoring case; (obj, created)"""
+        return self.get_or_create(
+            user=user,
+            normalized_name=normalize_name(name),
+            defaults={'name': name}
+        )
+
+    def get_or_create_by_names(self, user, names):
+        """Map each of the names to the user's object, creating missing ones
+
+        Missing objects are inserted in bulk, skipping any created
+        concurrently, then everything is read back in one query per
+        chunk of names.
+        """
+        wanted = {}
+        for name in names:
+            # new objects are named as first spelled
+            wanted.setdefault(normalize_name(name), name)
+        found = {}
+        keys = list(wanted)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            found.update(
+                (obj.normalized_name, obj)
+                for obj in self.filter(user=user, normalized_name__in=chunk)
+            )
+        missing = [key for key in wanted if key not in found]
+        if missing:
+            self.bulk_create([
+                self.model(user=user, name=wanted[key], normalized_name=key)
+                for key in missing
+            ], batch_size=500, ignore_conflicts=True)
+            for start in range(0, len(missing), 500):
+                found.update(
+                    (obj.normalized_name, obj)
+                    for obj in self.filter(
+                        user=user, normalized_name__in=missing[start:start + 500]
+                    )
+                )
+        return {name: found[normalize_name(name)] for name in names}
+
+
+class RecipeAttr(models.Model):
+    """Base of the per user, uniquely named tags and ingredients"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    normalized_name = models.CharField(max_length=255, editable=False)
+
+    objects = RecipeAttrManager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
 
-class Ingredient(models.Model):
+class Tag(RecipeAttr):
+    """Tag model"""
+
+    class Meta:
+        # keyset pagination walks a user's tags by (-name, id)
+        indexes = [models.Index(fields=['user', '-name', 'id'])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'normalized_name'], name='unique_tag_name'
+            )
+        ]
+
+
+class Ingredient(RecipeAttr):
     """Model to save the ingredients"""
-    name = models.CharField(max_length=255)
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
-    def __str__(self):
-        return self.name
+    class Meta:
+        indexes = [models.Index(fields=['user', '-name', 'id'])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'normalized_name'], name='unique_ingredient_name'
+            )
+        ]
 
 
 class Recipe(models.Model):
@@ -83,9 +159,93 @@ class Recipe(models.Model):
     time_minutes = models.IntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
     link = models.CharField(max_length=255, blank=True)
-    ingredient = models.ManyToManyField('Ingredient')
-    tags = models.ManyToManyField('Tag')
+    ingredient = models.ManyToManyField('Ingredient', through='RecipeIngredient')
+    tags = models.ManyToManyField('Tag', through='RecipeTag')
     image = models.ImageField(blank=True, upload_to=recipe_image_life_path)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', 'id'])]
+
     def __str__(self):
         return self.title
+
+
+class RecipeTag(models.Model):
+    """Link between a recipe and one of its tags"""
+    recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE)
+    tag = models.ForeignKey('Tag', on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'core_recipe_tags'
+        unique_together = (('recipe', 'tag'),)
+        # the unique index serves recipe -> tags, this one tag -> recipes
+        indexes = [models.Index(fields=['tag', 'recipe'])]
+
+
+class RecipeIngredient(models.Model):
+    """Link between a recipe and one of its ingredients"""
+    recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE)
+    ingredient = models.ForeignKey('Ingredient', on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'core_recipe_ingredient'
+        unique_together = (('recipe', 'ingredient'),)
+        indexes = [models.Index(fields=['ingredient', 'recipe'])]
+
+
+class RecipeSearchToken(models.Model):
+    """Inverted index entry: a token found in a recipe, its tags or ingredients"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE)
+    token = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField()
+
+    class Meta:
+        # for token__startswith within a user; on PostgreSQL LIKE 'term%'
+        # can only use the index under the C collation or a pattern opclass
+        indexes = [models.Index(
+            fields=['user', 'token'],
+            name='core_search_user_token_idx',
+            opclasses=['int4_ops', 'varchar_pattern_ops'],
+        )]
+
+    def __str__(self):
+        return self.token
+
+
+class RecipeImageJob(models.Model):
+    """Background processing of an image uploaded for a recipe"""
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE)
+    staged_file = models.CharField(max_length=255)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    error = models.CharField(max_length=255, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.status}'
+
+
+class CatalogVersion(models.Model):
+    """Counter bumped whenever any of a user's recipes, tags or ingredients change"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.version}'
@@ -0,0 +1,373 @@
+"""Per endpoint timing of requests, served on /metrics
+
+RequestProfilingMiddleware is enabled by REQUEST_PROFILING['ENABLED'].
+For each request it records:
+
+- wall time
+- the number and duration of database queries
+- the time spent producing serializer data
+- the response size
+
+The figures are kept per resolved URL name and method in fixed-size
+reservoirs of samples, from which /metrics reports p50/p95/p99 in the
+Prometheus text format. A request picked at PROFILE_SAMPLE_RATE is also
+run under cProfile, its stats dumped to PROFILE_DIR, where the newest
+PROFILE_KEEP dumps are kept. So is one carrying PROFILE_HEADER, set to
+PROFILE_SECRET or sent by a staff user; as the middleware comes before
+authentication, a staff user's request is profiled provisionally and
+its stats only dumped once the view has identified them. Under ASGI
+profiling only covers the event loop's thread. /metrics is likewise
+only served to staff users or on PROFILE_HEADER set to PROFILE_SECRET.
+"""
+import asyncio
+import contextvars
+import cProfile
+import hmac
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework import serializers
+
+DEFAULTS = {
+    'ENABLED': False,
+    'RESERVOIR_SIZE': 1024,
+    'PROFILE_HEADER': 'X-Profile',
+    'PROFILE_SAMPLE_RATE': 0.0,
+    'PROFILE_DIR': None,
+    'PROFILE_SECRET': None,
+    'PROFILE_KEEP': 100,
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+METRICS = (
+    ('request_duration_seconds', 'Wall time of requests'),
+    ('request_db_queries', 'Database queries made by requests'),
+    ('request_db_duration_seconds', 'Time requests spent in database queries'),
+    ('request_serializer_duration_seconds', 'Time requests spent producing serializer data'),
+    ('response_size_bytes', 'Size of response bodies'),
+)
+
+# endpoints left out of the statistics
+EXCLUDED = {'metrics'}
+
+
+def profiling_settings():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_PROFILING', {})}
+
+
+class Reservoir:
+    """Uniform sample of at most size values, with their count and sum"""
+
+    def __init__(self, size):
+        self.size = size
+        self.samples = []
+        self.count = 0
+        self.sum = 0
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+        else:
+            # each value seen stays with probability size / count
+            index = random.randrange(self.count)
+            if index < self.size:
+                self.samples[index] = value
+
+    def quantile(self, q):
+        if not self.samples:
+            return 0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Registry:
+    """Reservoirs of each metric per (endpoint, method)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reservoirs = {}
+
+    def record(self, endpoint, method, values):
+        size = profiling_settings()['RESERVOIR_SIZE']
+        with self.lock:
+            for metric, value in values.items():
+                key = (metric, endpoint, method)
+                if key not in self.reservoirs:
+                    self.reservoirs[key] = Reservoir(size)
+                self.reservoirs[key].add(value)
+
+    def clear(self):
+        with self.lock:
+            self.reservoirs.clear()
+
+    def render(self):
+        """The statistics as Prometheus summaries"""
+        with self.lock:
+            lines = []
+            for metric, help_text in METRICS:
+                lines += [
+                    f'# HELP {metric} {help_text}',
+                    f'# TYPE {metric} summary',
+                ]
+                for (name, endpoint, method), reservoir in sorted(self.reservoirs.items()):
+                    if name != metric:
+                        continue
+                    labels = f'endpoint="{escape(endpoint)}",method="{method}"'
+                    for q in QUANTILES:
+                        lines.append(
+                            f'{metric}{{{labels},quantile="{q}"}} {reservoir.quantile(q):g}'
+                        )
+                    lines.append(f'{metric}_sum{{{labels}}} {reservoir.sum:g}')
+                    lines.append(f'{metric}_count{{{labels}}} {reservoir.count}')
+            return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestStats:
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0
+        self.serializer_seconds = 0
+        self.in_serializer = False
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+@contextmanager
+def timed_serializer():
+    """Count the time of the block as the current request's serializer time"""
+    stats = _current.get()
+    if stats is None or stats.in_serializer:
+        # nested serializers are part of the outer one's time
+        yield
+        return
+    stats.in_serializer = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializer_seconds += time.perf_counter() - start
+        stats.in_serializer = False
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+def instrument_connection(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def instrument_new_connection(sender, connection, **kwargs):
+    instrument_connection(connection)
+
+
+def instrument_connections():
+    """Time the queries of this thread's connections, once install()ed"""
+    if _installed:
+        for connection in connections.all():
+            instrument_connection(connection)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """Hook the timing of queries and serializer data, once per process"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        # connections of other threads are hooked as they connect, or by
+        # instrument_connections(), eg. in recipe.async_views' pool
+        connection_created.connect(
+            instrument_new_connection, dispatch_uid='core.profiling'
+        )
+        data = serializers.BaseSerializer.data
+
+        def timed_data(serializer):
+            with timed_serializer():
+                return data.fget(serializer)
+
+        serializers.BaseSerializer.data = property(timed_data)
+        _installed = True
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not profiling_settings()['ENABLED']:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # tells Django's handler to await the middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats, token, profiler, start = self.start(request)
+        try:
+            if profiler is not None:
+                response = profiler.runcall(self.get_response, request)
+            else:
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, profiler, start)
+
+    async def __acall__(self, request):
+        stats, token, profiler, start = self.start(request)
+        try:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, profiler, start)
+
+    def start(self, request):
+        instrument_connections()
+        stats = RequestStats()
+        token = _current.set(stats)
+        profiler = cProfile.Profile() if self.should_profile(request) else None
+        return stats, token, profiler, time.perf_counter()
+
+    def finish(self, request, response, stats, profiler, start):
+        elapsed = time.perf_counter() - start
+        endpoint = endpoint_name(request)
+        if endpoint not in EXCLUDED:
+            values = {
+                'request_duration_seconds': elapsed,
+                'request_db_queries': stats.db_queries,
+                'request_db_duration_seconds': stats.db_seconds,
+                'request_serializer_duration_seconds': stats.serializer_seconds,
+            }
+            if not response.streaming:
+                values['response_size_bytes'] = len(response.content)
+            registry.record(endpoint, request.method, values)
+        if profiler is not None and self.may_dump(request):
+            response['X-Profile-File'] = self.dump(profiler, endpoint)
+        return response
+
+    def should_profile(self, request):
+        request._profile_allowed = True
+        if random.random() < profiling_settings()['PROFILE_SAMPLE_RATE']:
+            return True
+        if not profile_header(request):
+            return False
+        if has_secret(request):
+            return True
+        # maybe a staff user, known once the view has authenticated them
+        request._profile_allowed = False
+        return bool(
+            request.headers.get('Authorization')
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+        )
+
+    def may_dump(self, request):
+        if request._profile_allowed:
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+    def dump(self, profiler, endpoint):
+        directory = profiling_settings()['PROFILE_DIR'] or tempfile.gettempdir()
+        os.makedirs(directory, exist_ok=True)
+        name = endpoint.replace(':', '-').replace('/', '-')
+        path = os.path.join(
+            directory, f'{name}-{int(time.time())}-{uuid.uuid4().hex[:8]}.prof'
+        )
+        profiler.dump_stats(path)
+        self.prune(directory)
+        return os.path.basename(path)
+
+    def prune(self, directory):
+        """Remove all but the newest PROFILE_KEEP dumps"""
+        keep = profiling_settings()['PROFILE_KEEP']
+        paths = [
+            entry.path for entry in os.scandir(directory)
+            if entry.name.endswith('.prof')
+        ]
+        if len(paths) <= keep:
+            return
+        paths.sort(key=mtime)
+        for path in paths[:len(paths) - keep]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # pruned by another process meanwhile
+                pass
+
+
+def profile_header(request):
+    header = profiling_settings()['PROFILE_HEADER']
+    return request.headers.get(header) if header else None
+
+
+def has_secret(request):
+    """Whether the request carries PROFILE_SECRET in PROFILE_HEADER"""
+    value = profile_header(request)
+    secret = profiling_settings()['PROFILE_SECRET']
+    return bool(
+        value and secret and hmac.compare_digest(value.encode(), secret.encode())
+    )
+
+
+def may_read_metrics(request):
+    """Whether the request may read /metrics, as a staff user or by the secret"""
+    if has_secret(request):
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+def mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0
@@ -0,0 +1,162 @@
+"""JSON rendering through orjson when it is installed
+
+orjson is optional: without it, or for output it cannot produce the same
+way as DRF (indented or ASCII-only JSON), rendering falls back to DRF's
+JSONRenderer and its stdlib encoder.
+"""
+import csv
+import decimal
+import io
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# DRF escapes these so the output stays a JavaScript subset, see JSONRenderer
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer producing the same bytes several times faster
+
+    Decimals are written as JSON numbers directly with orjson releases
+    that support fragments, else as floats like DRF's encoder does.
+    Unlike the stdlib encoder orjson writes NaN and infinities as null
+    rather than failing.
+    """
+    options = 0
+    chunk_size = 500
+
+    def __init__(self):
+        if orjson is not None:
+            # facet counts are keyed by ids; datetimes go through DRF's
+            # encoder so they are formatted the same as before
+            self.options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            self.default = self.encoder_class().default
+
+    def accelerated(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and self.compact
+            and not self.ensure_ascii
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        )
+
+    def encode_default(self, obj):
+        if isinstance(obj, decimal.Decimal) and hasattr(orjson, 'Fragment'):
+            return orjson.Fragment(str(obj))
+        return self.default(obj)
+
+    def dumps(self, data):
+        ret = orjson.dumps(data, default=self.encode_default, option=self.options)
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not self.accelerated(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return self.dumps(data)
+        except orjson.JSONEncodeError:
+            # eg. integers beyond 64 bits, which the stdlib encoder handles
+            return super().render(data, accepted_media_type, renderer_context)
+
+    def render_iter(self, items, accepted_media_type=None, renderer_context=None):
+        """Render an iterable as a JSON array, yielding it in chunks
+
+        Lets long lists be sent as a StreamingHttpResponse without holding
+        the whole document in memory.
+        """
+        if self.accelerated(accepted_media_type, renderer_context):
+            dumps = self.dumps
+        else:
+            def dumps(item):
+                return super(FastJSONRenderer, self).render(
+                    item, accepted_media_type, renderer_context
+                )
+
+        chunk = [b'[']
+        separator = b''
+        for item in items:
+            chunk += (separator, dumps(item))
+            separator = b','
+            if len(chunk) >= self.chunk_size:
+                yield b''.join(chunk)
+                chunk = []
+        chunk.append(b']')
+        yield b''.join(chunk)
+
+
+class NDJSONRenderer(FastJSONRenderer):
+    """Newline delimited JSON, one object per line"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, list):
+            data = [data]
+        return b''.join(self.render_iter(data, accepted_media_type, renderer_context))
+
+    def render_iter(self, items, accepted_media_type=None, renderer_context=None):
+        """Yield the lines of the items in chunks"""
+        if self.accelerated(accepted_media_type, renderer_context):
+            dumps = self.dumps
+        else:
+            def dumps(item):
+                return super(FastJSONRenderer, self).render(item, self.media_type, {})
+
+        chunk = []
+        for item in items:
+            chunk += (dumps(item), b'\n')
+            if len(chunk) >= self.chunk_size:
+                yield b''.join(chunk)
+                chunk = []
+        if chunk:
+            yield b''.join(chunk)
+
+
+class CSVRenderer(BaseRenderer):
+    """Flat objects as CSV rows, headed by the keys of the first one"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+    chunk_size = 500
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, list):
+            data = [data]
+        return b''.join(self.render_iter(data, accepted_media_type, renderer_context))
+
+    def render_iter(self, items, accepted_media_type=None, renderer_context=None):
+        """Yield the header and rows in chunks"""
+        buffer = io.StringIO()
+        writer = None
+        for count, item in enumerate(items, 1):
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(item))
+                writer.writeheader()
+                # let the client see the response start straight away
+                yield self.flush(buffer)
+            writer.writerow(item)
+            if count % self.chunk_size == 0:
+                yield self.flush(buffer)
+        if buffer.tell():
+            yield self.flush(buffer)
+
+    def flush(self, buffer):
+        content = buffer.getvalue().encode(self.charset)
+        buffer.seek(0)
+        buffer.truncate()
+        return content
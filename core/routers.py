@@ -0,0 +1,198 @@
+"""Sending the reads of safe requests to database replicas
+
+ReplicaRoutingMiddleware records, for the duration of each request,
+whether its reads may go to one of the DATABASE_REPLICAS aliases: only
+GET/HEAD/OPTIONS requests of clients that have not written recently do.
+Writes, reads inside a transaction and reads outside of a request go to
+'default'. A request that writes pins its client to 'default' for
+PIN_SECONDS, so what it just created is visible on the next read even
+while the replicas lag behind.
+
+The pin is a signed cookie, which holds across processes. Clients that
+don't keep cookies can be pinned by their Authorization header or
+session cookie too, in the cache named by CACHE_ALIAS; it has to be one
+shared by the processes, a per-process cache would pin them only in the
+one that saw the write.
+"""
+import asyncio
+import contextvars
+import hashlib
+import random
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+DEFAULTS = {
+    'ALIASES': (),
+    'PIN_SECONDS': 5,
+    'CACHE_ALIAS': None,
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# recipes, tags, ingredients and the indexes built from them
+ROUTED_APPS = {'core'}
+
+KEY_PREFIX = 'replica-pin'
+
+PIN_COOKIE = 'replica_pin'
+
+_request_state = contextvars.ContextVar('replica_routing', default=None)
+
+
+def replica_settings():
+    return {**DEFAULTS, **getattr(settings, 'DATABASE_REPLICAS', {})}
+
+
+def replica_aliases():
+    return [
+        alias for alias in replica_settings()['ALIASES']
+        if alias in connections.databases
+    ]
+
+
+def pin_cache():
+    """The cache clients are pinned in by their credentials, if any"""
+    alias = replica_settings()['CACHE_ALIAS']
+    if alias is None:
+        return None
+    cache = caches[alias]
+    if isinstance(cache, LocMemCache):
+        raise ImproperlyConfigured(
+            f'DATABASE_REPLICAS CACHE_ALIAS {alias!r} is a per-process cache'
+        )
+    return cache
+
+
+def has_pin_cookie(request):
+    try:
+        request.get_signed_cookie(
+            PIN_COOKIE, salt=PIN_COOKIE,
+            max_age=replica_settings()['PIN_SECONDS']
+        )
+    except (KeyError, signing.BadSignature):
+        return False
+    return True
+
+
+def set_pin_cookie(response):
+    response.set_signed_cookie(
+        PIN_COOKIE, '1', salt=PIN_COOKIE,
+        max_age=replica_settings()['PIN_SECONDS'],
+        httponly=True, samesite='Lax'
+    )
+
+
+def client_key(request):
+    """Cache key of the client making the request, None if anonymous"""
+    credentials = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    digest = hashlib.sha256(credentials.encode()).hexdigest()
+    return f'{KEY_PREFIX}:{digest}'
+
+
+class RequestState:
+    """Where the reads of the current request go"""
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        pin_cache()
+        if asyncio.iscoroutinefunction(get_response):
+            # tells Django's handler to await the middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        cache, key = pin_cache(), client_key(request)
+        pinned = has_pin_cookie(request) or (
+            cache is not None and key is not None and cache.get(key) is not None
+        )
+        state = RequestState(self.replica(request, pinned))
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote:
+            set_pin_cookie(response)
+            if cache is not None and key is not None:
+                cache.set(key, True, replica_settings()['PIN_SECONDS'])
+        return response
+
+    async def __acall__(self, request):
+        cache, key = pin_cache(), client_key(request)
+        pinned = has_pin_cookie(request) or (
+            cache is not None and key is not None
+            and await sync_to_async(cache.get, thread_sensitive=False)(key) is not None
+        )
+        state = RequestState(self.replica(request, pinned))
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote:
+            set_pin_cookie(response)
+            if cache is not None and key is not None:
+                await sync_to_async(cache.set, thread_sensitive=False)(
+                    key, True, replica_settings()['PIN_SECONDS']
+                )
+        return response
+
+    def replica(self, request, pinned):
+        aliases = replica_aliases()
+        if aliases and request.method in SAFE_METHODS and not pinned:
+            # one replica per request, so its reads agree with each other
+            return random.choice(aliases)
+        return None
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        state = _request_state.get()
+        if (state is None or state.replica is None or state.wrote
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        # objects read from a replica would otherwise be saved back to it
+        if model._meta.app_label in ROUTED_APPS:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replica_settings()['ALIASES']}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_settings()['ALIASES']:
+            return False
+        return None
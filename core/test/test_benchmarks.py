@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import skipIf, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection, connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.renderers import FastJSONRenderer, orjson
+
+RUN_BENCHMARKS = bool(os.environ.get('RUN_BENCHMARKS'))
+
+
+def best_of(func, repeat=5):
+    """Return the fastest of repeat timings of func in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def recipe_page(count):
+    """A recipe list response as RecipeSerializer renders it"""
+    return {
+        'next': 'http://testserver/api/recipe/recipes/?cursor=cD0xMDA%3D',
+        'previous': None,
+        'results': [
+            {
+                'id': i,
+                'title': f'Recipe number {i}',
+                'time_minutes': i % 90,
+                'ingredient': list(range(i % 7, i % 7 + 6)),
+                'tags': list(range(i % 5, i % 5 + 3)),
+                'price': f'{i % 100}.99',
+                'link': f'https://example.com/recipes/{i}',
+            }
+            for i in range(count)
+        ],
+    }
+
+
+@skipUnless(RUN_BENCHMARKS, 'set RUN_BENCHMARKS=1 to run benchmarks')
+@skipIf(orjson is None, 'orjson is not installed')
+class RendererBenchmark(SimpleTestCase):
+    """Rendering recipe list pages with DRF's renderer and with orjson"""
+
+    def test_recipe_pages(self):
+        for count in (100, 1000):
+            data = recipe_page(count)
+            drf = best_of(lambda: JSONRenderer().render(data))
+            fast = best_of(lambda: FastJSONRenderer().render(data))
+            print(f'\nrender {count} recipes: DRF {drf * 1000:.2f} ms, '
+                  f'orjson {fast * 1000:.2f} ms ({drf / fast:.1f}x)')
+            self.assertLess(fast, drf)
+
+
+def requests_per_second(worker, threads, requests):
+    """Throughput of threads each calling worker requests times
+
+    Returns requests/s and how many requests failed on a database error.
+    """
+    def run(thread):
+        failed = 0
+        try:
+            for n in range(requests):
+                try:
+                    worker(thread, n)
+                except OperationalError:
+                    # eg. SQLite's "database is locked"
+                    failed += 1
+        finally:
+            connections.close_all()
+        return failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        failed = sum(executor.map(run, range(threads)))
+    return threads * requests / (time.perf_counter() - start), failed
+
+
+@skipUnless(RUN_BENCHMARKS, 'set RUN_BENCHMARKS=1 to run benchmarks')
+@override_settings(RECIPE_RESPONSE_CACHE={'ENABLED': False})
+class ConcurrentThroughputBenchmark(TransactionTestCase):
+    """Recipe API requests per second from concurrent clients
+
+    Runs against the configured database, so the numbers of runs with
+    SQLite (tuned by SQLITE_PRAGMAS) and with Postgres (DB_HOST, plus
+    DB_POOL for the pooled backend) can be compared. SQLite's shared
+    in-memory test database locks whole tables, so the SQLite run needs a
+    test database file given by DB_TEST_NAME.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        if connection.vendor == 'sqlite':
+            if connection.is_in_memory_db():
+                self.skipTest('set DB_TEST_NAME to run against an SQLite file')
+            # reconnect with the pragmas of the settings
+            connections.close_all()
+        self.user = get_user_model().objects.create_user(
+            email='bench@example.com',
+            password='pass123'
+        )
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(10)]
+        for i in range(200):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=i % 90, price='5.00'
+            )
+            recipe.tags.add(tags[i % 10])
+        self.tag_ids = [tag.id for tag in tags]
+
+    def worker(self):
+        clients = {}
+
+        def request(thread, n):
+            client = clients.get(thread)
+            if client is None:
+                client = clients[thread] = APIClient()
+                client.force_authenticate(self.user)
+            if n % 5:
+                res = client.get(reverse('recipe:recipe-list'))
+            else:
+                res = client.post(reverse('recipe:recipe-list'), {
+                    'title': f'New {thread}-{n}', 'time_minutes': 5,
+                    'price': '2.50', 'tags': self.tag_ids[:2], 'ingredient': [],
+                }, format='json')
+            self.assertLess(res.status_code, 300)
+        return request
+
+    def test_read_write_mix(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('PRAGMA journal_mode')
+                mode = f'journal_mode={cursor.fetchone()[0]}'
+            else:
+                mode = connection.settings_dict['ENGINE']
+        for threads in (1, 4, 8):
+            rate, failed = requests_per_second(self.worker(), threads, 25)
+            print(f'\n{connection.vendor} ({mode}), {threads} clients: '
+                  f'{rate:.0f} requests/s, {failed} failed')
+
+    def reads_during_write_bursts(self, readers):
+        """Recipe list requests/s of readers while a client writes in bursts"""
+        done = threading.Event()
+
+        def write():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                n = 0
+                while not done.is_set():
+                    n += 1
+                    client.post(reverse('recipe:recipe-bulk'), [
+                        {'title': f'Burst {n}-{i}', 'time_minutes': 5, 'price': '2.50'}
+                        for i in range(50)
+                    ], format='json')
+                    time.sleep(0.01)
+            finally:
+                connections.close_all()
+
+        def read(thread, n):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            res = client.get(reverse('recipe:recipe-list'))
+            self.assertEqual(res.status_code, 200)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            return requests_per_second(read, readers, 25)
+        finally:
+            done.set()
+            writer.join()
+
+    def test_reads_during_write_bursts(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('compares SQLite journal modes')
+        for mode in ('delete', 'wal'):
+            pragmas = {**settings.SQLITE_PRAGMAS, 'journal_mode': mode}
+            with override_settings(SQLITE_PRAGMAS=pragmas):
+                connections.close_all()
+                # switch the journal mode before other connections hold locks
+                connection.ensure_connection()
+                rate, failed = self.reads_during_write_bursts(4)
+            print(f'\nsqlite journal_mode={mode}, 4 readers during write bursts: '
+                  f'{rate:.0f} reads/s, {failed} failed')
+        connections.close_all()
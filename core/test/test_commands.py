@@ -1,29 +1,157 @@
 
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
 from unittest.mock import patch
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+from core.management.commands import check_query_plans
+from core.models import Recipe, Tag
+
 
 class CommandTest(TestCase):
     """management command """
     def test_db_is_available_or_ready(self):
         """Test if the db is available"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+        with patch('core.management.commands.wait_for_db.check_database') as cd:
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(cd.call_count, 1)
 
     @patch('time.sleep', return_value=True)
     def test_db_is_available(self, ts):
         """test waiting for db"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+        with patch('core.management.commands.wait_for_db.check_database') as cd:
+            cd.side_effect = [OperationalError] * 5 + [None]
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(cd.call_count, 6)
+        pauses = [call.args[0] for call in ts.call_args_list]
+        self.assertEqual(len(pauses), 5)
+        # exponential backoff, jittered between half and all of the delay
+        for attempt, pause in enumerate(pauses):
+            self.assertGreaterEqual(pause, 0.1 * 2 ** attempt / 2)
+            self.assertLessEqual(pause, 0.1 * 2 ** attempt)
+
+    @patch('time.sleep', return_value=True)
+    def test_backoff_is_capped(self, ts):
+        with patch('core.management.commands.wait_for_db.check_database') as cd:
+            cd.side_effect = [OperationalError] * 10 + [None]
+            call_command('wait_for_db', max_delay=1, stdout=StringIO())
+        self.assertLessEqual(max(call.args[0] for call in ts.call_args_list), 1)
+
+    @patch('time.sleep', return_value=True)
+    @patch('time.monotonic', side_effect=[0, 1, 2])
+    def test_gives_up_after_timeout(self, tm, ts):
+        with patch('core.management.commands.wait_for_db.check_database') as cd:
+            cd.side_effect = OperationalError('connection refused')
+            with self.assertRaisesMessage(CommandError, 'connection refused'):
+                call_command('wait_for_db', timeout=2, stdout=StringIO())
+        self.assertEqual(cd.call_count, 2)
+
+    def test_probes_the_database(self):
+        out = StringIO()
+        call_command('wait_for_db', stdout=out)
+        self.assertIn('Database is available!', out.getvalue())
+
+
+class ImportRecipesCommandTest(TestCase):
+    """import_recipes management command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123'
+        )
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'recipes.ndjson')
+        with open(self.path, 'w') as f:
+            for i in range(5):
+                record = {
+                    'title': f'Recipe {i}', 'time_minutes': 10, 'price': '1.00',
+                    'tags': ['Quick'],
+                }
+                f.write(json.dumps(record) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_import_with_progress(self):
+        out = StringIO()
+        call_command(
+            'import_recipes', self.path, user=self.user.email,
+            batch_size=2, stdout=out
+        )
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(Tag.objects.get().recipe_set.count(), 5)
+        self.assertIn('4 records read', out.getvalue())
+        self.assertIn('Imported 5 recipes', out.getvalue())
+
+    def test_resume_from_checkpoint(self):
+        checkpoint = os.path.join(self.tmpdir, 'import.checkpoint')
+        with open(checkpoint, 'w') as f:
+            json.dump({'processed': 3}, f)
+
+        call_command(
+            'import_recipes', self.path, user=self.user.email,
+            checkpoint=checkpoint, stdout=StringIO()
+        )
+
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            ['Recipe 3', 'Recipe 4']
+        )
+        with open(checkpoint) as f:
+            self.assertEqual(json.load(f), {'processed': 5})
+
+    def test_unknown_user(self):
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', self.path, user='nobody@example.com')
+
 
+class CheckQueryPlansCommandTest(TestCase):
+    """check_query_plans management command"""
 
+    def test_api_queries_use_indexes(self):
+        user = get_user_model().objects.create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123'
+        )
+        tags = [Tag.objects.create(user=user, name=f'tag {i}') for i in range(3)]
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=user, title=f'curry {i}', time_minutes=10, price=5
+            )
+            recipe.tags.add(*tags)
 
+        out = StringIO()
+        call_command('check_query_plans', min_rows=1, stdout=out)
 
+        self.assertIn('assigned tag list', out.getvalue())
+        self.assertIn('No sequential scans', out.getvalue())
 
+    def test_sequential_scan_fails(self):
+        with patch.object(
+            check_query_plans, 'sequential_scans', return_value=['core_tag']
+        ):
+            get_user_model().objects.create_user('other@gmail.com', 'pass123')
+            Tag.objects.create(user=get_user_model().objects.get(), name='Vegan')
+            with self.assertRaises(CommandError):
+                call_command('check_query_plans', min_rows=0, stdout=StringIO())
 
+    def test_sequential_scans_parsed(self):
+        sql = 'SELECT "U0"."id" FROM "core_recipe_tags" U0 WHERE "U0"."recipe_id" = 1'
+        plan = '2 0 0 SCAN U0\n5 0 0 SEARCH core_tag USING INDEX x (user_id=?)'
+        self.assertEqual(
+            check_query_plans.sequential_scans(plan, sql, 'sqlite'),
+            ['core_recipe_tags']
+        )
+        plan = 'Seq Scan on core_recipe  (cost=0.00..1.01 rows=1 width=4)'
+        self.assertEqual(
+            check_query_plans.sequential_scans(plan, '', 'postgresql'),
+            ['core_recipe']
+        )
@@ -0,0 +1,101 @@
+from unittest import skipIf
+from unittest.mock import MagicMock, patch
+
+from django.core.signals import request_started
+from django.test import SimpleTestCase
+
+from core.db import close_unusable_connections
+
+try:
+    from core.db.backends.postgresql_pool.base import ConnectionPool, pool
+except Exception:  # psycopg2 is not installed
+    ConnectionPool = None
+
+
+def fake_connection(usable=True, health_checks=True, in_atomic_block=False):
+    conn = MagicMock(in_atomic_block=in_atomic_block, errors_occurred=False)
+    conn.settings_dict = {'CONN_HEALTH_CHECKS': health_checks}
+    conn.is_usable.return_value = usable
+    return conn
+
+
+class CloseUnusableConnectionsTest(SimpleTestCase):
+
+    def check(self, *conns):
+        with patch('core.db.connections') as connections:
+            connections.all.return_value = conns
+            close_unusable_connections()
+
+    def test_closes_unusable_connection(self):
+        conn = fake_connection(usable=False)
+        self.check(conn)
+        conn.close.assert_called_once_with()
+        self.assertTrue(conn.errors_occurred)
+
+    def test_keeps_usable_connection(self):
+        conn = fake_connection()
+        self.check(conn)
+        conn.close.assert_not_called()
+
+    def test_skips_connections_without_health_checks(self):
+        conn = fake_connection(usable=False, health_checks=False)
+        self.check(conn)
+        conn.is_usable.assert_not_called()
+        conn.close.assert_not_called()
+
+    def test_skips_closed_connection_and_transactions(self):
+        closed = fake_connection(usable=False)
+        closed.connection = None
+        atomic = fake_connection(usable=False, in_atomic_block=True)
+        self.check(closed, atomic)
+        closed.is_usable.assert_not_called()
+        atomic.close.assert_not_called()
+
+    def test_runs_as_requests_start(self):
+        with patch('core.db.connections') as connections:
+            connections.all.return_value = []
+            request_started.send(sender=self.__class__)
+            connections.all.assert_called_once_with()
+
+
+@skipIf(ConnectionPool is None, 'psycopg2 is not installed')
+class ConnectionPoolTest(SimpleTestCase):
+
+    def setUp(self):
+        patcher = patch('psycopg2.pool.psycopg2.connect')
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.connect.side_effect = lambda *args, **kwargs: MagicMock(closed=0)
+
+    def test_reuses_returned_connections(self):
+        connections = ConnectionPool(1, 2, 0.01, dbname='app')
+        conn = connections.getconn()
+        connections.putconn(conn)
+        self.assertIs(connections.getconn(), conn)
+        self.assertEqual(self.connect.call_count, 1)
+
+    def test_keeps_returned_connections_up_to_max(self):
+        connections = ConnectionPool(1, 3, 0.01, dbname='app')
+        burst = [connections.getconn() for _ in range(3)]
+        for conn in burst:
+            connections.putconn(conn)
+
+        again = [connections.getconn() for _ in range(3)]
+
+        self.assertEqual(set(map(id, again)), set(map(id, burst)))
+        self.assertEqual(self.connect.call_count, 3)
+        for conn in burst:
+            conn.close.assert_not_called()
+
+    def test_waits_for_a_free_connection(self):
+        connections = ConnectionPool(0, 1, 0.01, dbname='app')
+        connections.getconn()
+        with self.assertRaises(pool.PoolError):
+            connections.getconn()
+
+    def test_replaces_closed_connection(self):
+        connections = ConnectionPool(1, 1, 0.01, dbname='app')
+        conn = connections.getconn()
+        connections.putconn(conn)
+        conn.closed = 1
+        self.assertIsNot(connections.getconn(), conn)
@@ -0,0 +1,75 @@
+import tempfile
+from unittest.mock import patch
+
+from django.db.utils import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import health
+
+HEALTHZ_URL = reverse('healthz')
+READYZ_URL = reverse('readyz')
+
+
+class HealthEndpointsTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        health.reset()
+        self.addCleanup(health.reset)
+
+    def test_healthz(self):
+        res = self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+
+    def test_readyz(self):
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['checks'], {
+            'database': 'ok', 'cache': 'ok', 'storage': 'ok',
+        })
+        self.assertIn('no-cache', res['Cache-Control'])
+
+    def test_readyz_database_unavailable(self):
+        error = OperationalError('could not connect to server db.internal')
+        with patch('core.health.check_database', side_effect=error), \
+                self.assertLogs('core.health', 'ERROR') as logs:
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['status'], 'unavailable')
+        self.assertEqual(res.json()['checks']['database'], 'failed')
+        self.assertNotIn(b'db.internal', res.content)
+        self.assertIn('db.internal', logs.output[0])
+
+    def test_readyz_storage_missing(self):
+        with override_settings(MEDIA_ROOT=self.media_root.name + '/missing'), \
+                self.assertLogs('core.health', 'ERROR'):
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['checks']['storage'], 'failed')
+
+    def test_checks_are_cached(self):
+        with patch('core.health.check_database') as check:
+            self.client.get(READYZ_URL)
+            self.client.get(READYZ_URL)
+            self.assertEqual(check.call_count, 1)
+
+            health.reset()
+            self.client.get(READYZ_URL)
+            self.assertEqual(check.call_count, 2)
+
+    @override_settings(HEALTH_CHECKS={'CACHE_SECONDS': 0})
+    def test_checks_can_run_every_time(self):
+        with patch('core.health.check_database') as check:
+            self.client.get(READYZ_URL)
+            self.client.get(READYZ_URL)
+            self.assertEqual(check.call_count, 2)
@@ -0,0 +1,50 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MergeDuplicateRecipeAttrsTest(TransactionTestCase):
+    """0013 folds same-named tags/ingredients before names become unique"""
+    databases = '__all__'
+    before = [('core', '0012_recipe_attr_normalized_name')]
+    after = [('core', '0014_unique_recipe_attr_names')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicates_merged(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('core', 'User')
+        Tag = apps.get_model('core', 'Tag')
+        Recipe = apps.get_model('core', 'Recipe')
+        user = User.objects.create(email='kousik.sekar@gmail.com')
+        other = User.objects.create(email='other@gmail.com')
+
+        vegan = Tag.objects.create(user=user, name='Vegan')
+        duplicate = Tag.objects.create(user=user, name=' vegan')
+        Tag.objects.create(user=other, name='Vegan')
+        both = Recipe.objects.create(user=user, title='a', time_minutes=1, price=1)
+        both.tags.add(vegan, duplicate)
+        one = Recipe.objects.create(user=user, title='b', time_minutes=1, price=1)
+        one.tags.add(duplicate)
+
+        apps = self.migrate(self.after)
+        Tag = apps.get_model('core', 'Tag')
+        Recipe = apps.get_model('core', 'Recipe')
+
+        self.assertEqual(
+            list(Tag.objects.filter(user_id=user.id).values_list('id', 'normalized_name')),
+            [(vegan.id, 'vegan')]
+        )
+        self.assertEqual(Tag.objects.filter(user_id=other.id).count(), 1)
+        for recipe_id in (both.id, one.id):
+            self.assertEqual(
+                list(Recipe.objects.get(id=recipe_id).tags.values_list('id', flat=True)),
+                [vegan.id]
+            )
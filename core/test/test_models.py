@@ -1,4 +1,5 @@
 from unittest.mock import patch
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from pathlib import Path
@@ -52,6 +53,30 @@ class ModelTest(TestCase):
         ingredient = models.Ingredient.objects.create(user=sample_user(), name='Pepper')
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_tag_name_unique_ignoring_case(self):
+        user = sample_user()
+        tag = models.Tag.objects.create(user=user, name='Main  Course')
+        self.assertEqual(tag.normalized_name, 'main course')
+
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                models.Tag.objects.create(user=user, name='main course ')
+        other = get_user_model().objects.create_user('other@gmail.com', 'pass123')
+        models.Tag.objects.create(user=other, name='Main Course')
+
+    def test_get_or_create_by_names(self):
+        user = sample_user()
+        salt = models.Ingredient.objects.create(user=user, name='Salt')
+
+        found = models.Ingredient.objects.get_or_create_by_names(
+            user, ['SALT', 'Pepper', 'pepper']
+        )
+
+        self.assertEqual(found['SALT'], salt)
+        self.assertEqual(found['Pepper'], found['pepper'])
+        self.assertEqual(found['Pepper'].name, 'Pepper')
+        self.assertEqual(models.Ingredient.objects.count(), 2)
+
     def test_recipe_str(self):
         recipe = models.Recipe.objects.create(
             user=sample_user(),
@@ -0,0 +1,185 @@
+import os
+import pstats
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import profiling
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('metrics')
+
+PROFILING = {'ENABLED': True, 'PROFILE_SAMPLE_RATE': 0.0}
+
+
+class ReservoirTest(SimpleTestCase):
+
+    def test_quantiles(self):
+        reservoir = profiling.Reservoir(1000)
+        for value in range(1, 101):
+            reservoir.add(value)
+
+        self.assertEqual(reservoir.quantile(0.5), 51)
+        self.assertEqual(reservoir.quantile(0.99), 100)
+        self.assertEqual((reservoir.count, reservoir.sum), (100, 5050))
+
+    def test_bounded_sample(self):
+        reservoir = profiling.Reservoir(10)
+        for value in range(1000):
+            reservoir.add(value)
+
+        self.assertEqual(len(reservoir.samples), 10)
+        self.assertEqual(reservoir.count, 1000)
+
+    def test_empty(self):
+        self.assertEqual(profiling.Reservoir(10).quantile(0.5), 0)
+
+
+class RequestProfilingMiddlewareTest(TestCase):
+
+    def setUp(self):
+        profiling.registry.clear()
+        self.addCleanup(profiling.registry.clear)
+        self.user = get_user_model().objects.create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123'
+        )
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=5, price='1.00'
+            )
+            recipe.tags.add(tag)
+
+    def client_for(self, user=None):
+        # a new client loads the middleware under the current settings
+        client = APIClient()
+        client.force_authenticate(user or self.user)
+        return client
+
+    def test_disabled_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            profiling.RequestProfilingMiddleware(lambda request: None)
+        res = self.client_for().get(METRICS_URL)
+        self.assertEqual(res.status_code, 404)
+
+    @override_settings(REQUEST_PROFILING=PROFILING)
+    def test_records_per_endpoint(self):
+        res = self.client_for().get(RECIPES_URL)
+
+        reservoirs = {
+            metric: reservoir
+            for (metric, endpoint, method), reservoir
+            in profiling.registry.reservoirs.items()
+            if (endpoint, method) == ('recipe:recipe-list', 'GET')
+        }
+        self.assertEqual(reservoirs['request_duration_seconds'].count, 1)
+        self.assertGreater(reservoirs['request_db_queries'].sum, 0)
+        self.assertGreater(reservoirs['request_db_duration_seconds'].sum, 0)
+        self.assertGreater(reservoirs['request_serializer_duration_seconds'].sum, 0)
+        self.assertEqual(reservoirs['response_size_bytes'].sum, len(res.content))
+
+    @override_settings(REQUEST_PROFILING=PROFILING)
+    def test_metrics_in_prometheus_format(self):
+        client = self.client_for()
+        client.get(RECIPES_URL)
+        client.get(RECIPES_URL)
+        staff = get_user_model().objects.create_user(
+            email='staff@gmail.com',
+            password='pass123',
+            is_staff=True
+        )
+        client.force_login(staff)
+
+        res = client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = res.content.decode()
+        self.assertIn('# TYPE request_duration_seconds summary', text)
+        labels = 'endpoint="recipe:recipe-list",method="GET"'
+        self.assertIn(f'request_duration_seconds{{{labels},quantile="0.99"}}', text)
+        self.assertIn(f'request_duration_seconds_count{{{labels}}} 2', text)
+        self.assertNotIn('endpoint="metrics"', text)
+
+    @override_settings(REQUEST_PROFILING={**PROFILING, 'PROFILE_SECRET': 's3cret'})
+    def test_metrics_refused_without_staff_or_secret(self):
+        client = APIClient()
+        client.force_login(self.user)
+
+        self.assertEqual(APIClient().get(METRICS_URL).status_code, 403)
+        self.assertEqual(client.get(METRICS_URL).status_code, 403)
+        self.assertEqual(
+            APIClient().get(METRICS_URL, HTTP_X_PROFILE='guess').status_code, 403
+        )
+        res = APIClient().get(METRICS_URL, HTTP_X_PROFILE='s3cret')
+        self.assertEqual(res.status_code, 200)
+
+    def test_profile_by_header(self):
+        staff = get_user_model().objects.create_user(
+            email='staff@gmail.com',
+            password='pass123',
+            is_staff=True
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(REQUEST_PROFILING={**PROFILING, 'PROFILE_DIR': directory}):
+                res = self.client_for(staff).get(
+                    RECIPES_URL, HTTP_X_PROFILE='1', HTTP_AUTHORIZATION='Token x'
+                )
+                unprofiled = self.client_for(staff).get(RECIPES_URL)
+
+            path = os.path.join(directory, res['X-Profile-File'])
+            self.assertTrue(res['X-Profile-File'].startswith('recipe-recipe-list-'))
+            self.assertGreater(pstats.Stats(path).total_calls, 0)
+            self.assertEqual(os.listdir(directory), [res['X-Profile-File']])
+        self.assertNotIn('X-Profile-File', unprofiled)
+
+    def test_profile_header_ignored_for_other_users(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(REQUEST_PROFILING={**PROFILING, 'PROFILE_DIR': directory}):
+                res = self.client_for().get(
+                    RECIPES_URL, HTTP_X_PROFILE='1', HTTP_AUTHORIZATION='Token x'
+                )
+                anonymous = APIClient().get(RECIPES_URL, HTTP_X_PROFILE='1')
+
+            self.assertEqual(os.listdir(directory), [])
+        self.assertNotIn('X-Profile-File', res)
+        self.assertNotIn('X-Profile-File', anonymous)
+
+    def test_profile_by_secret(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(REQUEST_PROFILING={
+                **PROFILING, 'PROFILE_DIR': directory, 'PROFILE_SECRET': 's3cret'
+            }):
+                res = APIClient().get(RECIPES_URL, HTTP_X_PROFILE='s3cret')
+                wrong = APIClient().get(RECIPES_URL, HTTP_X_PROFILE='guess')
+
+            self.assertEqual(os.listdir(directory), [res['X-Profile-File']])
+        self.assertNotIn('X-Profile-File', wrong)
+
+    def test_profile_dumps_capped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(REQUEST_PROFILING={
+                **PROFILING, 'PROFILE_DIR': directory,
+                'PROFILE_SAMPLE_RATE': 1.0, 'PROFILE_KEEP': 2,
+            }):
+                names = [
+                    self.client_for().get(RECIPES_URL)['X-Profile-File']
+                    for _ in range(4)
+                ]
+
+            self.assertEqual(sorted(os.listdir(directory)), sorted(names[2:]))
+
+    def test_profile_sampled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(REQUEST_PROFILING={
+                **PROFILING, 'PROFILE_DIR': directory, 'PROFILE_SAMPLE_RATE': 1.0
+            }):
+                res = self.client_for().get(RECIPES_URL)
+
+            self.assertIn('X-Profile-File', res)
@@ -0,0 +1,127 @@
+import datetime
+import io
+import uuid
+from decimal import Decimal
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser
+from core.renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer, orjson
+
+PAYLOAD = {
+    'next': None,
+    'results': [
+        {'id': 1, 'title': 'Crème brûlée', 'price': '5.00', 'tags': [1, 2]},
+        {'id': 2, 'title': 'line\u2028break\u2029', 'price': '0.99', 'tags': []},
+    ],
+    'facets': {'tags': {1: 1, 2: 1}},
+    'created': timezone.make_aware(datetime.datetime(2020, 9, 1, 12, 30, 5, 123456)),
+    'day': datetime.date(2020, 9, 1),
+    'uuid': uuid.UUID('12345678123456781234567812345678'),
+    'lazy': gettext_lazy('Recipe'),
+    'ratio': 0.5,
+}
+
+
+class FastJSONRendererTest(TestCase):
+
+    def setUp(self):
+        self.renderer = FastJSONRenderer()
+
+    def test_same_bytes_as_drf(self):
+        self.assertEqual(
+            self.renderer.render(PAYLOAD), JSONRenderer().render(PAYLOAD)
+        )
+
+    def test_line_separators_escaped(self):
+        rendered = self.renderer.render({'title': 'a\u2028b'})
+        self.assertEqual(rendered, b'{"title":"a\\u2028b"}')
+
+    def test_indent_falls_back(self):
+        media_type = 'application/json; indent=4'
+        self.assertEqual(
+            self.renderer.render(PAYLOAD, media_type),
+            JSONRenderer().render(PAYLOAD, media_type)
+        )
+
+    def test_big_integer_falls_back(self):
+        self.assertEqual(self.renderer.render({'id': 2 ** 70}), b'{"id":%d}' % 2 ** 70)
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_decimal_as_number(self):
+        rendered = self.renderer.render({'price': Decimal('7.50')})
+        self.assertIn(rendered, (b'{"price":7.50}', b'{"price":7.5}'))
+
+    def test_none_renders_empty(self):
+        self.assertEqual(self.renderer.render(None), b'')
+
+    def test_without_orjson(self):
+        with patch('core.renderers.orjson', None):
+            renderer = FastJSONRenderer()
+            self.assertEqual(renderer.render(PAYLOAD), JSONRenderer().render(PAYLOAD))
+
+    def test_render_iter(self):
+        items = [{'id': i} for i in range(1234)]
+        chunks = list(self.renderer.render_iter(iter(items)))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b''.join(chunks), JSONRenderer().render(items))
+        self.assertEqual(b''.join(self.renderer.render_iter([])), b'[]')
+
+    def test_render_iter_without_orjson(self):
+        items = [{'id': i, 'title': 'a\u2028b'} for i in range(3)]
+        with patch('core.renderers.orjson', None):
+            rendered = b''.join(FastJSONRenderer().render_iter(items))
+        self.assertEqual(rendered, JSONRenderer().render(items))
+
+
+class StreamingRendererTest(TestCase):
+
+    def test_ndjson_lines(self):
+        items = [{'id': 1, 'title': 'Crème'}, {'id': 2, 'title': 'Toast'}]
+
+        self.assertEqual(
+            b''.join(NDJSONRenderer().render_iter(iter(items))),
+            '{"id":1,"title":"Crème"}\n{"id":2,"title":"Toast"}\n'.encode()
+        )
+
+    def test_ndjson_renders_single_object(self):
+        self.assertEqual(NDJSONRenderer().render({'detail': 'Not found.'}),
+                         b'{"detail":"Not found."}\n')
+
+    def test_csv_header_sent_first(self):
+        items = iter([{'id': 1, 'title': 'Curry, hot'}, {'id': 2, 'title': 'Toast'}])
+        chunks = CSVRenderer().render_iter(items)
+
+        self.assertEqual(next(chunks), b'id,title\r\n')
+        self.assertEqual(b''.join(chunks), b'1,"Curry, hot"\r\n2,Toast\r\n')
+
+
+class FastJSONParserTest(TestCase):
+
+    def parse(self, body, parser=None):
+        return (parser or FastJSONParser()).parse(io.BytesIO(body))
+
+    def test_same_data_as_drf(self):
+        body = '{"title": "Crème", "tags": [1, 2], "price": 5.5}'.encode()
+        self.assertEqual(self.parse(body), self.parse(body, JSONParser()))
+
+    def test_invalid_json(self):
+        with self.assertRaises(ParseError):
+            self.parse(b'{"title": ')
+
+    def test_nan_rejected(self):
+        with self.assertRaises(ParseError):
+            self.parse(b'{"price": NaN}')
+
+    def test_without_orjson(self):
+        with patch('core.parsers.orjson', None):
+            self.assertEqual(self.parse(b'{"id": 1}'), {'id': 1})
@@ -0,0 +1,272 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import MagicMock, patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.db import apply_sqlite_pragmas
+from core.models import Recipe, Tag
+from core.routers import (
+    PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, RequestState,
+    _request_state
+)
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class ReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        patcher = patch('core.routers.connections')
+        self.connections = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.default = self.connections.__getitem__.return_value
+        self.default.in_atomic_block = False
+
+    def in_request(self, replica='readonly'):
+        state = RequestState(replica)
+        token = _request_state.set(state)
+        self.addCleanup(_request_state.reset, token)
+        return state
+
+    def test_safe_request_reads_go_to_replica(self):
+        self.in_request()
+        self.assertEqual(self.router.db_for_read(Recipe), 'readonly')
+        self.assertEqual(self.router.db_for_read(Tag), 'readonly')
+
+    def test_reads_outside_requests_go_to_default(self):
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_unsafe_request_reads_go_to_default(self):
+        self.in_request(replica=None)
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_reads_in_a_transaction_stay_on_default(self):
+        self.in_request()
+        self.default.in_atomic_block = True
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_reads_after_a_write_go_to_default(self):
+        state = self.in_request()
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+        self.assertTrue(state.wrote)
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_writes_go_to_default(self):
+        tag = Tag(name='Vegan')
+        tag._state.db = 'readonly'
+        self.assertEqual(self.router.db_for_write(Tag, instance=tag), 'default')
+
+    def test_other_apps_not_routed(self):
+        self.in_request()
+        self.assertIsNone(self.router.db_for_read(Token))
+        self.assertIsNone(self.router.db_for_write(Token))
+
+    def test_no_migrations_on_replicas(self):
+        self.assertFalse(self.router.allow_migrate('readonly', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+    def test_relations_across_aliases(self):
+        recipe, tag = Recipe(), Tag()
+        recipe._state.db, tag._state.db = 'readonly', 'default'
+        self.assertTrue(self.router.allow_relation(recipe, tag))
+
+
+PIN_CACHE_DIR = tempfile.mkdtemp()
+
+
+class ReplicaRoutingMiddlewareTest(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def run_request(self, request, write=False):
+        seen = {}
+
+        def view(request):
+            if write:
+                ReplicaRouter().db_for_write(Recipe)
+            seen['state'] = _request_state.get()
+            return HttpResponse()
+
+        self.response = ReplicaRoutingMiddleware(view)(request)
+        self.assertIsNone(_request_state.get())
+        return seen['state']
+
+    def with_cookies(self, request):
+        """The request, as sent by a client that kept the last response's cookies"""
+        for name, morsel in self.response.cookies.items():
+            request.COOKIES[name] = morsel.value
+        return request
+
+    def test_get_uses_a_replica(self):
+        state = self.run_request(self.factory.get('/', HTTP_AUTHORIZATION='Token a'))
+        self.assertEqual(state.replica, 'readonly')
+
+    def test_post_uses_default(self):
+        state = self.run_request(self.factory.post('/', HTTP_AUTHORIZATION='Token a'))
+        self.assertIsNone(state.replica)
+
+    def test_write_pins_the_client(self):
+        self.run_request(self.factory.post('/'), write=True)
+
+        pinned = self.run_request(self.with_cookies(self.factory.get('/')))
+        other = self.run_request(self.factory.get('/'))
+
+        self.assertIsNone(pinned.replica)
+        self.assertEqual(other.replica, 'readonly')
+
+    def test_read_does_not_pin(self):
+        self.run_request(self.factory.get('/'))
+        self.assertNotIn(PIN_COOKIE, self.response.cookies)
+
+    def test_forged_pin_ignored(self):
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.assertEqual(self.run_request(request).replica, 'readonly')
+
+    def test_pin_expires(self):
+        self.run_request(self.factory.post('/'), write=True)
+        request = self.with_cookies(self.factory.get('/'))
+
+        later = time.time() + settings.DATABASE_REPLICAS['PIN_SECONDS'] + 1
+        with patch('django.core.signing.time.time', return_value=later):
+            state = self.run_request(request)
+        self.assertEqual(state.replica, 'readonly')
+
+    @override_settings(
+        CACHES={**settings.CACHES, 'pins': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': PIN_CACHE_DIR,
+        }},
+        DATABASE_REPLICAS={**settings.DATABASE_REPLICAS, 'CACHE_ALIAS': 'pins'},
+    )
+    def test_credentials_pin_in_shared_cache(self):
+        """For clients that don't keep cookies"""
+        self.addCleanup(shutil.rmtree, PIN_CACHE_DIR, ignore_errors=True)
+        self.run_request(self.factory.post('/', HTTP_AUTHORIZATION='Token a'), write=True)
+
+        pinned = self.run_request(self.factory.get('/', HTTP_AUTHORIZATION='Token a'))
+        other = self.run_request(self.factory.get('/', HTTP_AUTHORIZATION='Token b'))
+        self.assertIsNone(pinned.replica)
+        self.assertEqual(other.replica, 'readonly')
+
+        request = self.factory.post('/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = 'abc'
+        self.run_request(request, write=True)
+        request = self.factory.get('/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = 'abc'
+        self.assertIsNone(self.run_request(request).replica)
+
+    @override_settings(
+        DATABASE_REPLICAS={**settings.DATABASE_REPLICAS, 'CACHE_ALIAS': 'default'}
+    )
+    def test_per_process_pin_cache_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ReplicaRoutingMiddleware(lambda request: HttpResponse())
+
+    @override_settings(DATABASE_REPLICAS={'ALIASES': ()})
+    def test_without_replicas(self):
+        state = self.run_request(self.factory.get('/', HTTP_AUTHORIZATION='Token a'))
+        self.assertIsNone(state.replica)
+
+
+@override_settings(RECIPE_RESPONSE_CACHE={'ENABLED': False})
+class ReplicaReadYourWritesTest(TransactionTestCase):
+    """Two SQLite files, the test database and a copy of it, as primary and replica"""
+    databases = '__all__'
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('copies the SQLite test database')
+        caches['default'].clear()
+        self.user = get_user_model().objects.create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        Recipe.objects.create(
+            user=self.user, title='Replicated', time_minutes=5, price='1.00'
+        )
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, 'replica.sqlite3')
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM INTO %s', [path])
+        connections.databases['replica'] = {
+            **connection.settings_dict, 'NAME': f'file:{path}?mode=ro', 'TEST': {}
+        }
+        self.addCleanup(self.remove_replica)
+        replicas = override_settings(DATABASE_REPLICAS={
+            **settings.DATABASE_REPLICAS, 'ALIASES': ('replica',)
+        })
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def remove_replica(self):
+        connections['replica'].close()
+        delattr(connections._connections, 'replica')
+        del connections.databases['replica']
+
+    def titles(self, client):
+        res = client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, 200)
+        return sorted(recipe['title'] for recipe in res.data['results'])
+
+    def test_reads_from_replica_until_client_writes(self):
+        # the replica does not have recipes created since the copy
+        Recipe.objects.create(
+            user=self.user, title='Not replicated', time_minutes=5, price='1.00'
+        )
+        self.assertEqual(self.titles(self.client), ['Replicated'])
+
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Fresh', 'time_minutes': 5, 'price': '2.00',
+            'tags': [], 'ingredient': [],
+        }, format='json')
+        self.assertEqual(res.status_code, 201)
+
+        self.assertEqual(
+            self.titles(self.client), ['Fresh', 'Not replicated', 'Replicated']
+        )
+
+
+class SqlitePragmasTest(TestCase):
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_new_connections(self):
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+
+    def test_journal_mode_skipped_for_read_only_connections(self):
+        conn = MagicMock(vendor='sqlite', settings_dict={'NAME': 'file:db?mode=ro'})
+        with override_settings(SQLITE_PRAGMAS={'journal_mode': 'wal', 'busy_timeout': 10}):
+            apply_sqlite_pragmas(sender=None, connection=conn)
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_called_once_with('PRAGMA busy_timeout = 10')
+
+    def test_reads_in_tests_use_default(self):
+        """Test cases run in a transaction, which keeps reads on default"""
+        self.assertEqual(Recipe.objects.all().db, 'default')
@@ -1,3 +1,42 @@
-from django.shortcuts import render
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.cache import never_cache
 
-# Create your views here.
+from . import health, profiling
+
+
+@never_cache
+def healthz(request):
+    """Liveness: the process answers requests"""
+    return JsonResponse({'status': 'ok'})
+
+
+@never_cache
+def readyz(request):
+    """Readiness: the database, cache and media storage can be used
+
+    Each check is reported as ok or failed only, the errors are logged.
+    """
+    results = health.run_checks()
+    ready = all(result == 'ok' for result in results.values())
+    return JsonResponse(
+        {'status': 'ok' if ready else 'unavailable', 'checks': results},
+        status=200 if ready else 503
+    )
+
+
+@never_cache
+def metrics(request):
+    """Per endpoint request statistics in the Prometheus text format
+
+    Served to staff users (by session) and to scrapers sending
+    PROFILE_SECRET in PROFILE_HEADER.
+    """
+    if not profiling.profiling_settings()['ENABLED']:
+        raise Http404('Request profiling is not enabled.')
+    if not profiling.may_read_metrics(request):
+        raise PermissionDenied
+    return HttpResponse(
+        profiling.registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
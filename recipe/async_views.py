@@ -0,0 +1,124 @@
+"""Serving the recipe API's reads concurrently under ASGI
+
+Under ASGI, Django 3.1 runs every synchronous view on one shared thread,
+so requests queue behind each other however many arrive at once. The
+views wrapped here run on the event loop instead:
+
+- token authentication is answered from the token cache without leaving
+  the loop
+- the DRF view, whose ORM work has no async interface in this Django, runs
+  in a pool of ASYNC_API['DB_THREADS'] threads. This bounds the number of
+  requests holding a database connection at once.
+
+app/asgi.py serves the list and detail routes of app/asgi_urls.py through
+these views.
+"""
+import asyncio
+import contextvars
+import copy
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from core import profiling
+from user.authentication import CachedTokenAuthentication, token_cache
+
+DEFAULTS = {
+    'DB_THREADS': 8,
+}
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def async_settings():
+    return {**DEFAULTS, **getattr(settings, 'ASYNC_API', {})}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=async_settings()['DB_THREADS'],
+                thread_name_prefix='recipe-db'
+            )
+        return _executor
+
+
+def _call(func, args, kwargs):
+    profiling.instrument_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # the pool's threads outlive requests, so their connections are
+        # closed (or kept, per CONN_MAX_AGE) as at the end of a request
+        close_old_connections()
+
+
+async def run_in_pool(func, *args, **kwargs):
+    """Await func called in one of the database threads"""
+    loop = asyncio.get_running_loop()
+    # carries context variables, eg. the request's replica routing
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(context.run, _call, func, args, kwargs)
+    )
+
+
+async def authenticate(request):
+    """Authenticate a token request, from the token cache when possible
+
+    The user is handed to the DRF view as DRF's test client forces it, so
+    the view does not look the token up again. Requests without a valid
+    token are left for the view to reject.
+    """
+    auth = get_authorization_header(request).split()
+    if len(auth) != 2 or auth[0].lower() != b'token':
+        return
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        return
+    if token_cache.shared_cache is None:
+        cached = token_cache.get(key)
+    else:
+        cached = await run_in_pool(token_cache.get, key)
+    if cached is not None:
+        user, token = copy.copy(cached[0]), cached[1]
+    else:
+        try:
+            user, token = await run_in_pool(
+                CachedTokenAuthentication().authenticate_credentials, key
+            )
+        except AuthenticationFailed:
+            return
+    request._force_auth_user = user
+    request._force_auth_token = token
+
+
+def render(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    return response
+
+
+def async_view(view):
+    """Serve the DRF view from the event loop, its work in the thread pool"""
+
+    async def handler(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            await authenticate(request)
+        return await run_in_pool(render, view, request, *args, **kwargs)
+
+    # keeps csrf_exempt and the other attributes of the view
+    return functools.wraps(view)(handler)
@@ -0,0 +1,163 @@
+from django.db import connections, router
+
+from core.models import Recipe, normalize_name
+from . import response_cache, signals
+
+BATCH_SIZE = 500
+
+RELATIONS = ('tags', 'ingredient')
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def insert(model, objs, batch_size=BATCH_SIZE):
+    """bulk_create objs and make sure each one has its primary key set
+
+    Must run inside a transaction. On SQLite, which can't return ids from
+    a multi-row INSERT, the batch's ids are read back right after the
+    insert: the transaction holds the database write lock from the insert
+    on, and new rowids are allocated in increasing order, so the newest
+    len(batch) rows are exactly the batch.
+    """
+    connection = connections[router.db_for_write(model)]
+    if connection.features.can_return_rows_from_bulk_insert:
+        model.objects.bulk_create(objs, batch_size=batch_size)
+    elif connection.vendor == 'sqlite':
+        for batch in chunks(objs, batch_size):
+            model.objects.bulk_create(batch)
+            ids = model.objects.order_by('-pk').values_list('pk', flat=True)
+            for obj, pk in zip(batch, list(ids[:len(batch)])[::-1]):
+                obj.pk = pk
+    else:
+        for obj in objs:
+            obj.save(force_insert=True)
+    return objs
+
+
+def link(relation, links, batch_size=BATCH_SIZE):
+    """Insert through rows for (recipe, related objects) pairs"""
+    field = Recipe._meta.get_field(relation)
+    through = field.remote_field.through
+    column = f'{field.m2m_reverse_field_name()}_id'
+    through.objects.bulk_create([
+        through(recipe_id=recipe.pk, **{column: obj.pk})
+        for recipe, objs in links
+        for obj in dict.fromkeys(objs)
+    ], batch_size=batch_size)
+
+
+def unlink(relation, recipes):
+    """Delete every through row of relation for the given recipes"""
+    through = Recipe._meta.get_field(relation).remote_field.through
+    through.objects.filter(recipe__in=recipes).delete()
+
+
+def recipes_changed(recipes):
+    by_user = {}
+    for recipe in recipes:
+        by_user.setdefault(recipe.user_id, []).append(recipe.pk)
+    for user_id, recipe_ids in by_user.items():
+        signals.recipes_changed.send(
+            sender=Recipe, user_id=user_id, recipe_ids=recipe_ids
+        )
+
+
+def create_recipes(items, batch_size=BATCH_SIZE):
+    """Insert recipes and their through rows from validated data"""
+    related = [
+        {relation: item.pop(relation, []) for relation in RELATIONS}
+        for item in items
+    ]
+    recipes = insert(Recipe, [Recipe(**item) for item in items], batch_size)
+    for relation in RELATIONS:
+        link(relation, [
+            (recipe, links[relation]) for recipe, links in zip(recipes, related)
+        ], batch_size)
+
+    recipes_changed(recipes)
+    return recipes
+
+
+def update_recipes(instances, items, batch_size=BATCH_SIZE):
+    """Apply validated partial updates, each item carrying the recipe's id"""
+    recipes = []
+    fields = set()
+    replaced = {relation: [] for relation in RELATIONS}
+    for item in items:
+        recipe = instances[item.pop('id')]
+        for relation in RELATIONS:
+            if relation in item:
+                replaced[relation].append((recipe, item.pop(relation)))
+        for attr, value in item.items():
+            setattr(recipe, attr, value)
+            fields.add(attr)
+        recipes.append(recipe)
+
+    if fields:
+        Recipe.objects.bulk_update(recipes, fields, batch_size=batch_size)
+    for relation, links in replaced.items():
+        if links:
+            unlink(relation, [recipe for recipe, _ in links])
+            link(relation, links, batch_size)
+
+    recipes_changed(recipes)
+    return recipes
+
+
+def delete_recipes(queryset):
+    """Delete the recipes, telling the indexes about them in one go"""
+    recipes = list(queryset.only('id', 'user'))
+    queryset.delete()
+    recipes_changed(recipes)
+
+
+def create_objects(model, items, batch_size=BATCH_SIZE):
+    """Get or create tags or ingredients by name, one per item"""
+    by_user = {}
+    for item in items:
+        by_user.setdefault(item['user'], []).append(item['name'])
+    found = {
+        user: model.objects.get_or_create_by_names(user, names)
+        for user, names in by_user.items()
+    }
+    # bulk_create sends no post_save, and lists show unused objects too
+    for user in found:
+        signals.catalog_changed(user.pk)
+    return [found[item['user']][item['name']] for item in items]
+
+
+def update_objects(model, instances, items, batch_size=BATCH_SIZE):
+    """Apply validated updates to tags or ingredients"""
+    objs = []
+    fields = set()
+    for item in items:
+        obj = instances[item.pop('id')]
+        for attr, value in item.items():
+            setattr(obj, attr, value)
+            fields.add(attr)
+        objs.append(obj)
+
+    if 'name' in fields:
+        fields.add('normalized_name')
+        for obj in objs:
+            obj.normalized_name = normalize_name(obj.name)
+    if fields:
+        model.objects.bulk_update(objs, fields, batch_size=batch_size)
+        relation = model_relation(model)
+        for user_id in {obj.user_id for obj in objs}:
+            signals.catalog_changed(user_id)
+        response_cache.invalidate(relation, [obj.pk for obj in objs])
+        recipes = Recipe.objects.filter(**{f'{relation}__in': objs})
+        recipes_changed(recipes.only('id', 'user').distinct())
+    return objs
+
+
+def model_relation(model):
+    """Name of the recipe many-to-many field pointing at model"""
+    for relation in RELATIONS:
+        if Recipe._meta.get_field(relation).related_model is model:
+            return relation
+    raise ValueError(f'Recipes are not related to {model.__name__}')
@@ -0,0 +1,172 @@
+import threading
+from collections import defaultdict
+
+from core.models import Recipe
+from . import versioning
+
+# Recipe many-to-many fields the index keeps bitmaps for
+RELATIONS = ('tags', 'ingredient')
+
+
+def popcount(bitmap):
+    """Number of set bits in bitmap"""
+    return bin(bitmap).count('1')
+
+
+class MembershipIndex:
+    """Bitmaps of one user's recipes per tag and per ingredient
+
+    Recipes get a dense bit position on first sight, so a bitmap stays
+    proportional to the user's recipe count rather than to the global
+    recipe id space. version is the catalog version the bitmaps reflect.
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.recipe_ids = []
+        self.members = {relation: defaultdict(int) for relation in RELATIONS}
+
+    def _slot(self, recipe_id):
+        slot = self.slots.get(recipe_id)
+        if slot is None:
+            slot = self.slots[recipe_id] = len(self.recipe_ids)
+            self.recipe_ids.append(recipe_id)
+        return slot
+
+    def advance(self, version):
+        """Follow a catalog change made by this process
+
+        Fails when the change isn't the very next version, i.e. someone
+        else changed the catalog or a change was rolled back in between.
+        """
+        with self.lock:
+            if self.version is None or version != self.version + 1:
+                return False
+            self.version = version
+            return True
+
+    def add(self, relation, recipe_id, object_ids):
+        with self.lock:
+            bit = 1 << self._slot(recipe_id)
+            members = self.members[relation]
+            for object_id in object_ids:
+                members[object_id] |= bit
+
+    def remove(self, relation, recipe_id, object_ids=None):
+        """Drop the recipe from object_ids, or from every object if None"""
+        with self.lock:
+            slot = self.slots.get(recipe_id)
+            if slot is None:
+                return
+            mask = ~(1 << slot)
+            members = self.members[relation]
+            for object_id in list(members if object_ids is None else object_ids):
+                if object_id in members:
+                    members[object_id] &= mask
+
+    def discard_recipe(self, recipe_id):
+        with self.lock:
+            slot = self.slots.pop(recipe_id, None)
+            if slot is None:
+                return
+            mask = ~(1 << slot)
+            for members in self.members.values():
+                for object_id in members:
+                    members[object_id] &= mask
+            self.recipe_ids[slot] = None
+
+    def discard_object(self, relation, object_id):
+        with self.lock:
+            self.members[relation].pop(object_id, None)
+
+    def bitmap(self, relation, object_ids, match_all=False):
+        """Recipes linked to any (or all) of object_ids"""
+        members = self.members[relation]
+        bitmaps = [members.get(object_id, 0) for object_id in object_ids]
+        if not bitmaps:
+            return 0
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result = result & bitmap if match_all else result | bitmap
+        return result
+
+    def bitmap_of(self, recipe_ids):
+        """Bitmap of the given recipes, ignoring ones without any links"""
+        result = 0
+        for recipe_id in recipe_ids:
+            slot = self.slots.get(recipe_id)
+            if slot is not None:
+                result |= 1 << slot
+        return result
+
+    def recipes(self, bitmap):
+        """Recipe ids whose bits are set in bitmap"""
+        bits = bin(bitmap)[:1:-1]
+        ids = []
+        slot = bits.find('1')
+        while slot != -1:
+            ids.append(self.recipe_ids[slot])
+            slot = bits.find('1', slot + 1)
+        return ids
+
+    def counts(self, relation, bitmap):
+        """How many recipes in bitmap each object of relation is linked to"""
+        counts = {}
+        for object_id, members in list(self.members[relation].items()):
+            count = popcount(members & bitmap)
+            if count:
+                counts[object_id] = count
+        return counts
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def through_column(relation):
+    """Through table column holding the related object's id"""
+    field = Recipe._meta.get_field(relation)
+    return f'{field.m2m_reverse_field_name()}_id'
+
+
+def membership_rows(relation, user_id):
+    """(recipe id, object id) of every link of the user's recipes"""
+    through = Recipe._meta.get_field(relation).remote_field.through
+    return through.objects.filter(recipe__user_id=user_id).values_list(
+        'recipe_id', through_column(relation)
+    )
+
+
+def build_index(user_id, version):
+    index = MembershipIndex(version)
+    for relation in RELATIONS:
+        for recipe_id, object_id in membership_rows(relation, user_id).iterator():
+            index.add(relation, recipe_id, (object_id,))
+    return index
+
+
+def get_index(user_id):
+    """Return the user's index, (re)building it unless it is up to date"""
+    version = versioning.current_version(user_id)
+    index = _indexes.get(user_id)
+    if index is None or index.version != version:
+        with _indexes_lock:
+            index = _indexes.get(user_id)
+            if index is None or index.version != version:
+                index = _indexes[user_id] = build_index(user_id, version)
+    return index
+
+
+def cached_index(user_id):
+    """Return the user's index only if it has already been built"""
+    return _indexes.get(user_id)
+
+
+def drop_index(user_id):
+    _indexes.pop(user_id, None)
+
+
+def clear_indexes():
+    _indexes.clear()
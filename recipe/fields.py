@@ -0,0 +1,129 @@
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+def related_cache(request):
+    """Objects resolved from primary keys so far in this request"""
+    if request is None:
+        return {}
+    cache = getattr(request, '_related_object_cache', None)
+    if cache is None:
+        cache = request._related_object_cache = {}
+    return cache
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field limited to the requesting user's objects
+
+    With many=True every submitted id is resolved by a single query,
+    and resolved objects are remembered for the rest of the request.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        user = self.context['request'].user
+        return super().get_queryset().filter(user=user)
+
+    def to_pk(self, data):
+        if isinstance(data, bool) or not isinstance(data, (int, str)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except ValueError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def prime(self, pks):
+        """Load whichever of pks are not cached yet with one query"""
+        cache = related_cache(self.context.get('request'))
+        model = self.get_queryset().model
+        missing = [pk for pk in dict.fromkeys(pks) if (model, pk) not in cache]
+        if missing:
+            for pk, obj in self.get_queryset().in_bulk(missing).items():
+                cache[(model, pk)] = obj
+        return cache
+
+    def resolve(self, data):
+        """Objects for the submitted ids, failing on all missing ids at once"""
+        pks = [self.to_pk(item) for item in data]
+        cache = self.prime(pks)
+        model = self.get_queryset().model
+        missing = [pk for pk in dict.fromkeys(pks) if (model, pk) not in cache]
+        if missing:
+            raise serializers.ValidationError([
+                self.error_messages['does_not_exist'].format(pk_value=pk)
+                for pk in missing
+            ])
+        return [cache[(model, pk)] for pk in pks]
+
+    def to_internal_value(self, data):
+        return self.resolve([data])[0]
+
+
+class UserPrimaryKeyOrNameRelatedField(UserPrimaryKeyRelatedField):
+    """Like UserPrimaryKeyRelatedField, also accepting objects by name
+
+    Integers and strings of digits are ids, other strings are names, and
+    so is anything given as {"name": ...}, digits or not. Names are
+    returned as they are: matching
+    or creating the objects is a write, left to the serializer's
+    create/update, see resolve_names.
+    """
+    default_error_messages = {
+        'blank_name': 'Names may not be blank.',
+        'long_name': 'Ensure names have no more than {max_length} characters.',
+    }
+
+    def name_of(self, data):
+        if isinstance(data, dict) and set(data) == {'name'}:
+            data = data['name']
+            if not isinstance(data, str):
+                self.fail('incorrect_type', data_type=type(data).__name__)
+        elif not isinstance(data, str) or data.isdigit():
+            return None
+        if not data.strip():
+            self.fail('blank_name')
+        max_length = self.get_queryset().model._meta.get_field('name').max_length
+        if len(data) > max_length:
+            self.fail('long_name', max_length=max_length)
+        return data
+
+    def resolve(self, data):
+        names = [self.name_of(item) for item in data]
+        objs = iter(super().resolve([
+            item for item, name in zip(data, names) if name is None
+        ]))
+        return [next(objs) if name is None else name for name in names]
+
+
+def resolve_names(user, model, groups):
+    """Replace the names in each list of groups by the user's objects
+
+    Objects are matched or created for all the lists at once: one query
+    finds the existing ones and one insert adds the rest.
+    """
+    names = [item for items in groups for item in items if isinstance(item, str)]
+    if not names:
+        return groups
+    found = model.objects.get_or_create_by_names(user, names)
+    return [
+        [found[item] if isinstance(item, str) else item for item in items]
+        for items in groups
+    ]
+
+
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    """Many related field handing all submitted ids to its child at once"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        return self.child_relation.resolve(data)
@@ -0,0 +1,98 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from . import facets
+
+# query parameter -> recipe many-to-many field
+MEMBERSHIP_PARAMS = {'tags': 'tags', 'ingredient': 'ingredient'}
+
+# query parameter -> (lookup, parser)
+RANGE_PARAMS = {
+    'time_minutes_min': ('time_minutes__gte', int),
+    'time_minutes_max': ('time_minutes__lte', int),
+    'price_min': ('price__gte', Decimal),
+    'price_max': ('price__lte', Decimal),
+}
+
+MATCH_CHOICES = ('any', 'all')
+
+
+def _parse(params, name, parser):
+    try:
+        return parser(params[name])
+    except (ValueError, InvalidOperation):
+        raise ValidationError({name: f'Invalid value {params[name]!r}.'})
+
+
+def _parse_ids(params, name):
+    value = params.get(name)
+    if not value:
+        return []
+    try:
+        return [int(str_id) for str_id in value.split(',')]
+    except ValueError:
+        raise ValidationError({name: 'Expected a comma separated list of ids.'})
+
+
+def parse_flag(params, name):
+    """Value of a 0/1 query parameter, False when it is absent"""
+    if not params.get(name):
+        return False
+    return bool(_parse(params, name, int))
+
+
+class RecipeFilterBackend(BaseFilterBackend):
+    """Filter recipes by tags/ingredients, exclusions and value ranges
+
+    ?tags=1,2&ingredient=3 keeps recipes linked to any of the listed
+    objects of each kind, ?match=all requires all of them, and
+    ?exclude_tags= / ?exclude_ingredient= drop recipes linked to any.
+    Membership is resolved against the user's in-memory bitmap index so
+    the recipe query never joins the through tables.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        match = params.get('match', 'any')
+        if match not in MATCH_CHOICES:
+            raise ValidationError({'match': f'Expected one of {MATCH_CHOICES}.'})
+
+        for name, (lookup, parser) in RANGE_PARAMS.items():
+            if params.get(name):
+                queryset = queryset.filter(**{lookup: _parse(params, name, parser)})
+
+        include = None
+        exclude = 0
+        index = None
+        for name, relation in MEMBERSHIP_PARAMS.items():
+            wanted = _parse_ids(params, name)
+            unwanted = _parse_ids(params, f'exclude_{name}')
+            if not (wanted or unwanted):
+                continue
+            index = index or facets.get_index(request.user.id)
+            if wanted:
+                bitmap = index.bitmap(relation, wanted, match_all=match == 'all')
+                include = bitmap if include is None else include & bitmap
+            exclude |= index.bitmap(relation, unwanted)
+
+        if include is not None:
+            queryset = queryset.filter(id__in=index.recipes(include & ~exclude))
+        elif exclude:
+            queryset = queryset.exclude(id__in=index.recipes(exclude))
+
+        return queryset
+
+
+def facet_counts(user_id, queryset):
+    """Recipes per tag and per ingredient among the queryset's recipes"""
+    index = facets.get_index(user_id)
+    recipe_ids = queryset.prefetch_related(None).order_by().values_list(
+        'id', flat=True
+    )
+    bitmap = index.bitmap_of(recipe_ids.iterator())
+    return {
+        relation: index.counts(relation, bitmap)
+        for relation in facets.RELATIONS
+    }
@@ -0,0 +1,221 @@
+import io
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from core.models import Recipe, RecipeImageJob, recipe_image_life_path
+from . import variants
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WORKERS': 2,
+    # process uploads inline instead of on the worker pool
+    'EAGER': False,
+    'STAGING_DIR': 'uploads/staging',
+    'THUMBNAIL_DIR': 'uploads/recipe/thumbs',
+    'THUMBNAIL_SIZES': ((200, 200), (600, 600)),
+    'QUALITY': 85,
+    # larger images are rejected before being decoded
+    'MAX_IMAGE_PIXELS': 40_000_000,
+    # seconds after which an unfinished job is taken for lost with its worker
+    'STALE_AFTER': 600,
+}
+
+
+def pipeline_settings():
+    return {**DEFAULTS, **getattr(settings, 'RECIPE_IMAGE_PIPELINE', {})}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=pipeline_settings()['WORKERS'],
+                    thread_name_prefix='recipe-image'
+                )
+    return _executor
+
+
+def stage_upload(uploaded_file):
+    """Park the raw upload in the staging area and return its storage name"""
+    ext = os.path.splitext(uploaded_file.name)[1].lower()
+    name = os.path.join(pipeline_settings()['STAGING_DIR'], f'{uuid.uuid4()}{ext}')
+    return default_storage.save(name, uploaded_file)
+
+
+def enqueue(recipe, uploaded_file):
+    """Stage an upload for the recipe and schedule it for processing"""
+    job = RecipeImageJob.objects.create(
+        recipe=recipe,
+        staged_file=stage_upload(uploaded_file)
+    )
+    if pipeline_settings()['EAGER']:
+        process_job(job.id)
+        job.refresh_from_db()
+    else:
+        transaction.on_commit(lambda: get_executor().submit(run_job, job.id))
+    return job
+
+
+def run_job(job_id):
+    """Worker entry point; the worker thread owns its own connection"""
+    try:
+        process_job(job_id)
+    except Exception:
+        logger.exception('Recipe image job %s crashed', job_id)
+    finally:
+        close_old_connections()
+
+
+def encode_jpeg(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def thumbnail_name(image_name, size):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return os.path.join(
+        pipeline_settings()['THUMBNAIL_DIR'], f'{stem}_{size[0]}x{size[1]}.jpg'
+    )
+
+
+def set_status(job_id, status, error=''):
+    RecipeImageJob.objects.filter(id=job_id).update(
+        status=status, error=error[:255], updated=timezone.now()
+    )
+
+
+def process_job(job_id):
+    """Validate, strip metadata from, re-encode and thumbnail a staged upload"""
+    options = pipeline_settings()
+    job = RecipeImageJob.objects.get(id=job_id)
+    set_status(job_id, RecipeImageJob.PROCESSING)
+
+    try:
+        with default_storage.open(job.staged_file) as staged:
+            with Image.open(staged) as image:
+                # the header gives the size, nothing is decoded yet
+                width, height = image.size
+                if width * height > options['MAX_IMAGE_PIXELS']:
+                    raise ValueError(
+                        f'{width}x{height} pixels, more than '
+                        f'{options["MAX_IMAGE_PIXELS"]}'
+                    )
+                image.verify()
+            staged.seek(0)
+            with Image.open(staged) as image:
+                # bake the EXIF orientation in; re-encoding drops the rest
+                image = ImageOps.exif_transpose(image).convert('RGB')
+    except Exception as exc:
+        set_status(job_id, RecipeImageJob.FAILED, f'Invalid image: {exc}')
+        default_storage.delete(job.staged_file)
+        return
+
+    name = default_storage.save(
+        str(recipe_image_life_path(None, 'image.jpg')),
+        encode_jpeg(image, options['QUALITY'])
+    )
+    for size in options['THUMBNAIL_SIZES']:
+        thumbnail = image.copy()
+        thumbnail.thumbnail(size)
+        default_storage.save(
+            thumbnail_name(name, size), encode_jpeg(thumbnail, options['QUALITY'])
+        )
+
+    replaced = Recipe.objects.filter(id=job.recipe_id).values_list(
+        'image', flat=True
+    ).first()
+    Recipe.objects.filter(id=job.recipe_id).update(image=name)
+    set_status(job_id, RecipeImageJob.DONE)
+    default_storage.delete(job.staged_file)
+    if replaced:
+        delete_image(replaced)
+
+
+def delete_image(name):
+    """Delete a recipe image with its thumbnails and cached variants"""
+    default_storage.delete(name)
+    for size in pipeline_settings()['THUMBNAIL_SIZES']:
+        default_storage.delete(thumbnail_name(name, size))
+    variants.purge(name)
+
+
+def stale_jobs(stale_after):
+    """Pending or processing jobs not touched for stale_after seconds
+
+    The worker pool lives in the web process, so a restart or crash leaves
+    the jobs it held unfinished for good.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return RecipeImageJob.objects.filter(
+        status__in=(RecipeImageJob.PENDING, RecipeImageJob.PROCESSING),
+        updated__lt=cutoff
+    )
+
+
+def orphaned_staged_files(stale_after):
+    """Staged uploads older than stale_after seconds no unfinished job uses"""
+    directory = pipeline_settings()['STAGING_DIR']
+    try:
+        names = default_storage.listdir(directory)[1]
+    except FileNotFoundError:
+        return []
+    in_use = set(RecipeImageJob.objects.filter(
+        status__in=(RecipeImageJob.PENDING, RecipeImageJob.PROCESSING)
+    ).values_list('staged_file', flat=True))
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    orphans = []
+    for name in names:
+        path = os.path.join(directory, name)
+        # a fresh upload's job may not be committed yet
+        if path not in in_use and default_storage.get_modified_time(path) < cutoff:
+            orphans.append(path)
+    return orphans
+
+
+def sweep(stale_after=None, retry=True):
+    """Finish or fail the jobs lost with their worker, drop orphaned uploads
+
+    A lost job whose upload is still staged is processed again here when
+    retry is set, and failed otherwise. Returns the numbers of jobs
+    retried and failed and of staged files deleted.
+    """
+    if stale_after is None:
+        stale_after = pipeline_settings()['STALE_AFTER']
+    retried = failed = 0
+    for job in stale_jobs(stale_after):
+        if retry and default_storage.exists(job.staged_file):
+            logger.info('Retrying lost recipe image job %s', job.id)
+            try:
+                process_job(job.id)
+            except Exception:
+                # rather than losing it again on every sweep
+                logger.exception('Recipe image job %s crashed', job.id)
+                set_status(job.id, RecipeImageJob.FAILED, 'Processing failed')
+            retried += 1
+        else:
+            set_status(job.id, RecipeImageJob.FAILED, 'Processing was interrupted')
+            failed += 1
+
+    orphans = orphaned_staged_files(stale_after)
+    for name in orphans:
+        default_storage.delete(name)
+    return retried, failed, len(orphans)
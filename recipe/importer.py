@@ -0,0 +1,170 @@
+"""Importing recipes in bulk from NDJSON or CSV, as exported by the API
+
+Records are read and validated one at a time, but written a batch at a
+time: the tags and ingredients a batch names are looked up and created
+with a couple of queries, then its recipes and their through rows are
+bulk inserted. Each batch is committed on its own, so an interrupted
+import can be resumed by skipping the records already processed.
+"""
+import csv
+import io
+import json
+
+from django.db import transaction
+from rest_framework import serializers
+
+from core.models import Tag, Ingredient
+from . import bulk
+from .serializers import RecipeImportSerializer
+
+FORMATS = ('ndjson', 'csv')
+
+# separates tag/ingredient names in CSV cells, see views.csv_record
+NAME_SEPARATOR = '|'
+
+# errors kept for the report, the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+def text_stream(stream):
+    """Read a binary stream, eg. an uploaded file, as UTF-8 text"""
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+
+def read_ndjson(stream):
+    """Yield (line number, record) for each non-blank line"""
+    for number, line in enumerate(text_stream(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def read_csv(stream):
+    """Yield (line number, record) for each row after the header"""
+    reader = csv.DictReader(text_stream(stream))
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_records(stream, fmt):
+    if fmt == 'csv':
+        return read_csv(stream)
+    return read_ndjson(stream)
+
+
+def names(value):
+    """Tag or ingredient names from a CSV cell or an exported list"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [name for name in value.split(NAME_SEPARATOR) if name]
+    if isinstance(value, list):
+        return [item.get('name') if isinstance(item, dict) else item for item in value]
+    return value
+
+
+class ImportResult:
+    """Counts and first errors of an import"""
+
+    def __init__(self, processed=0):
+        self.processed = processed
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+class RecipeImporter:
+    """Imports records into one user's recipes, batch by batch"""
+
+    def __init__(self, user, batch_size=bulk.BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self.serializer = RecipeImportSerializer()
+        # name -> tag/ingredient, kept across batches
+        self.related = {Tag: {}, Ingredient: {}}
+
+    def run(self, records, skip=0, progress=None):
+        """Import (line, record) pairs after the first skip of them
+
+        progress, if given, is called with the result after each batch.
+        """
+        result = ImportResult(processed=skip)
+        batch = []
+        for index, (line, record) in enumerate(records):
+            if index < skip:
+                continue
+            try:
+                batch.append(self.validate(record))
+            except serializers.ValidationError as exc:
+                result.add_error(line, exc.detail)
+            result.processed += 1
+
+            if len(batch) >= self.batch_size:
+                self.write(batch, result, progress)
+                batch = []
+        self.write(batch, result, progress)
+        return result
+
+    def validate(self, record):
+        if not isinstance(record, dict):
+            raise serializers.ValidationError(['Expected a JSON object.'])
+        record = {
+            **record,
+            'tags': names(record.get('tags')),
+            'ingredient': names(record.get('ingredient')),
+        }
+        return self.serializer.run_validation(record)
+
+    def write(self, items, result, progress):
+        """Commit one batch of validated recipes
+
+        progress is called once the batch is committed; a checkpoint it
+        writes can only lag the database, by at most this batch.
+        """
+        if items:
+            with transaction.atomic():
+                tags = self.resolve(Tag, items, 'tags')
+                ingredients = self.resolve(Ingredient, items, 'ingredient')
+                for item in items:
+                    item['user'] = self.user
+                    item['tags'] = [tags[name] for name in item['tags']]
+                    item['ingredient'] = [ingredients[name] for name in item['ingredient']]
+                bulk.create_recipes(items, self.batch_size)
+            result.created += len(items)
+        if progress is not None:
+            progress(result)
+
+    def resolve(self, model, items, relation):
+        """Map each name used by the items to a tag/ingredient, creating missing ones"""
+        known = self.related[model]
+        missing = list(dict.fromkeys(
+            name for item in items for name in item[relation] if name not in known
+        ))
+        if missing:
+            known.update(model.objects.get_or_create_by_names(self.user, missing))
+        return known
+
+
+def import_recipes(user, stream, fmt, skip=0, batch_size=bulk.BATCH_SIZE, progress=None):
+    """Import a whole NDJSON/CSV stream into the user's recipes"""
+    importer = RecipeImporter(user, batch_size)
+    return importer.run(read_records(stream, fmt), skip, progress)
+
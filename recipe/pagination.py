@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeAttrPagination(CursorPagination):
+    """Keyset pagination for tags and ingredients, newest name first"""
+    ordering = ('-name', 'id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class RecipePagination(CursorPagination):
+    """Keyset pagination for recipes in creation order"""
+    ordering = ('id',)
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,30 @@
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def optimize_for_serializer(queryset, serializer_class):
+    """Restrict the queryset to the columns and relations the serializer renders"""
+    model = queryset.model
+    declared_fields = serializer_class._declared_fields
+    columns = []
+    prefetches = []
+
+    for name in serializer_class.Meta.fields:
+        model_field = model._meta.get_field(name)
+        if not model_field.many_to_many:
+            columns.append(name)
+            continue
+
+        related_model = model_field.related_model
+        child = getattr(declared_fields.get(name), 'child', None)
+        if isinstance(child, serializers.ModelSerializer):
+            related_fields = child.Meta.fields
+        else:
+            related_fields = (related_model._meta.pk.name,)
+        # ordered by id so recipe.rows renders members the same way
+        prefetches.append(Prefetch(
+            name,
+            queryset=related_model.objects.only(*related_fields).order_by('pk')
+        ))
+
+    return queryset.only(*columns).prefetch_related(*prefetches)
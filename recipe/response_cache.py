@@ -0,0 +1,172 @@
+"""Caching the rendered recipe list and detail responses per user
+
+List responses are keyed on the user's catalog version, so any change to
+their recipes, tags or ingredients retires them all. A detail response
+instead records the generation of the recipe and of every tag and
+ingredient it embeds, and is only served while all of them still match;
+invalidating a tag therefore retires exactly the details that show it.
+
+Generations only reach the other processes through a shared cache. With
+a per-process one (LocMemCache) detail responses are keyed on the
+catalog version as well, like lists.
+"""
+import functools
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework import status
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'default',
+    'TTL': 300,
+}
+
+KEY_PREFIX = 'recipe-response'
+
+
+def cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'RECIPE_RESPONSE_CACHE', {})}
+
+
+def get_cache():
+    return caches[cache_settings()['CACHE_ALIAS']]
+
+
+def shared(cache):
+    """Whether every process sees the cache"""
+    return not isinstance(cache, LocMemCache)
+
+
+def generation_key(relation, pk):
+    return f'{KEY_PREFIX}:gen:{relation}:{pk}'
+
+
+def generations(keys):
+    """Current generation of each key, starting the missing ones"""
+    cache = get_cache()
+    current = cache.get_many(keys)
+    for key in keys:
+        if key not in current:
+            # add() so a concurrent reader starting it too agrees on one value
+            cache.add(key, uuid.uuid4().hex, None)
+            current[key] = cache.get(key)
+    return current
+
+
+def invalidate(relation, ids):
+    """Retire cached details depending on the recipes, tags or ingredients
+
+    Done now and again on commit, so a reader re-caching the old rows
+    before the transaction commits does not keep them around.
+    """
+    keys = [generation_key(relation, pk) for pk in ids]
+    if not keys:
+        return
+    get_cache().delete_many(keys)
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def response_key(request, *parts):
+    path = '|'.join((request.get_full_path(), request.accepted_media_type or ''))
+    digest = hashlib.md5(path.encode()).hexdigest()
+    return ':'.join((KEY_PREFIX, str(request.user.pk), *map(str, parts), digest))
+
+
+def detail_dependencies(data):
+    """Generation keys of the recipe and the tags/ingredients in its data"""
+    keys = [generation_key('recipe', data['id'])]
+    for relation in ('tags', 'ingredient'):
+        for item in data.get(relation, ()):
+            pk = item['id'] if isinstance(item, dict) else item
+            keys.append(generation_key(relation, pk))
+    return keys
+
+
+def cacheable(request):
+    # the browsable API embeds the user and a CSRF token
+    return (
+        cache_settings()['ENABLED']
+        and getattr(request, 'accepted_renderer', None) is not None
+        and request.accepted_renderer.format != 'api'
+    )
+
+
+def store_on_render(response, key, entry):
+    """Cache the response body once it has been rendered"""
+    def store(rendered):
+        if rendered.status_code == status.HTTP_200_OK:
+            entry['content'] = rendered.content
+            entry['content_type'] = rendered['Content-Type']
+            get_cache().set(key, entry, cache_settings()['TTL'])
+        return rendered
+
+    response.add_post_render_callback(store)
+    return response
+
+
+def cache_list(handler):
+    """Serve a list response from cache while the catalog version holds"""
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        if not cacheable(request):
+            return handler(self, request, *args, **kwargs)
+        version = getattr(request, 'catalog_version', None)
+        if version is None:
+            return handler(self, request, *args, **kwargs)
+
+        # the user's generation guards against ids reused after a delete
+        user_key = generation_key('user', request.user.pk)
+        key = response_key(
+            request, 'list', generations([user_key])[user_key], version
+        )
+        entry = get_cache().get(key)
+        if entry is not None:
+            return HttpResponse(entry['content'], content_type=entry['content_type'])
+        response = handler(self, request, *args, **kwargs)
+        return store_on_render(response, key, {})
+
+    return wrapper
+
+
+def cache_detail(handler):
+    """Serve a detail response from cache while nothing it shows changed"""
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        if not cacheable(request):
+            return handler(self, request, *args, **kwargs)
+
+        pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        parts = ['detail', pk]
+        if not shared(get_cache()):
+            # changes made by other processes only show in the version
+            version = getattr(request, 'catalog_version', None)
+            if version is None:
+                return handler(self, request, *args, **kwargs)
+            parts.append(version)
+        key = response_key(request, *parts)
+        entry = get_cache().get(key)
+        if entry is not None:
+            dependencies = entry['dependencies']
+            if get_cache().get_many(list(dependencies)) == dependencies:
+                return HttpResponse(
+                    entry['content'], content_type=entry['content_type']
+                )
+
+        # take the recipe's generation before reading it, so a change
+        # racing this request leaves an entry that never matches
+        before = generations([generation_key('recipe', pk)])
+        response = handler(self, request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        dependencies = {
+            **generations(detail_dependencies(response.data)), **before
+        }
+        return store_on_render(response, key, {'dependencies': dependencies})
+
+    return wrapper
@@ -0,0 +1,104 @@
+import re
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from core.models import Recipe, RecipeSearchToken
+
+TOKEN_RE = re.compile(r'\w+')
+TOKEN_MAX_LENGTH = RecipeSearchToken._meta.get_field('token').max_length
+MAX_QUERY_TERMS = 8
+
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 2
+INGREDIENT_WEIGHT = 1
+
+
+def tokenize(text):
+    """Lowercase word tokens of text, each at most TOKEN_MAX_LENGTH long"""
+    return [token[:TOKEN_MAX_LENGTH] for token in TOKEN_RE.findall(text.lower())]
+
+
+def recipe_tokens(title, tag_names, ingredient_names):
+    """Token weights for a recipe's title, tag names and ingredient names"""
+    weights = Counter()
+    for token in set(tokenize(title)):
+        weights[token] += TITLE_WEIGHT
+    for name in tag_names:
+        for token in set(tokenize(name)):
+            weights[token] += TAG_WEIGHT
+    for name in ingredient_names:
+        for token in set(tokenize(name)):
+            weights[token] += INGREDIENT_WEIGHT
+    return weights
+
+
+def related_names(relation, recipe_ids):
+    """recipe id -> names of its tags or ingredients, in one query"""
+    field = Recipe._meta.get_field(relation)
+    rows = field.remote_field.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', f'{field.m2m_reverse_field_name()}__name')
+    names = defaultdict(list)
+    for recipe_id, name in rows:
+        names[recipe_id].append(name)
+    return names
+
+
+def index_recipes(recipes):
+    """Replace the index entries of the given recipes"""
+    recipes = list(recipes)
+    recipe_ids = [recipe.id for recipe in recipes]
+    tag_names = related_names('tags', recipe_ids)
+    ingredient_names = related_names('ingredient', recipe_ids)
+
+    with transaction.atomic():
+        RecipeSearchToken.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeSearchToken.objects.bulk_create([
+            RecipeSearchToken(
+                user_id=recipe.user_id,
+                recipe_id=recipe.id,
+                token=token,
+                weight=weight
+            )
+            for recipe in recipes
+            for token, weight in recipe_tokens(
+                recipe.title, tag_names[recipe.id], ingredient_names[recipe.id]
+            ).items()
+        ], batch_size=500)
+
+
+def matching_tokens(user_id, terms):
+    """(recipe id, token, weight) of the user's tokens starting with any term"""
+    prefixes = Q()
+    for term in terms:
+        prefixes |= Q(token__startswith=term)
+    return RecipeSearchToken.objects.filter(prefixes, user_id=user_id).values_list(
+        'recipe_id', 'token', 'weight'
+    )
+
+
+def rank_recipes(user_id, query, limit=None):
+    """Ids of the user's recipes matching every query term, best first
+
+    Each term matches tokens it is a prefix of; a recipe scores the
+    highest weight it has for each term, summed over the terms.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+
+    best = defaultdict(dict)
+    for recipe_id, token, weight in matching_tokens(user_id, terms):
+        for term in terms:
+            if token.startswith(term):
+                scores = best[recipe_id]
+                scores[term] = max(scores.get(term, 0), weight)
+
+    ranked = sorted(
+        (-sum(scores.values()), recipe_id)
+        for recipe_id, scores in best.items()
+        if len(scores) == len(terms)
+    )
+    return [recipe_id for _, recipe_id in ranked[:limit]]
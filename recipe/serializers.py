@@ -1,5 +1,68 @@
+from django.db import transaction
 from rest_framework import serializers
-from core.models import Tag, Ingredient, Recipe
+from rest_framework.settings import api_settings
+from core.models import Tag, Ingredient, Recipe, RecipeImageJob
+
+from . import bulk
+from .fields import UserPrimaryKeyOrNameRelatedField, resolve_names
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """Validating a list of objects in one pass and writing them in bulk
+
+    With an instance (a queryset of the objects the caller may change)
+    every item must carry the id of one of them and updates it.
+    """
+    max_items = 1000
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list) or not data:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: ['Expected a non-empty list of items.']
+            })
+        if len(data) > self.max_items:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    f'Expected at most {self.max_items} items.'
+                ]
+            })
+
+        if self.instance is not None:
+            self.instances = self.instance.in_bulk([
+                item.get('id') for item in data
+                if isinstance(item, dict) and isinstance(item.get('id'), int)
+            ])
+
+        self.prefetch(data)
+        validated, errors = [], []
+        for item in data:
+            try:
+                attrs, item_errors = self.child.run_validation(item), {}
+            except serializers.ValidationError as exc:
+                attrs, item_errors = None, dict(exc.detail)
+            if self.instance is not None:
+                obj_id = item.get('id') if isinstance(item, dict) else None
+                if obj_id not in self.instances:
+                    item_errors['id'] = [f'Invalid pk "{obj_id}" - object does not exist.']
+                elif attrs is not None:
+                    attrs['id'] = obj_id
+            validated.append(attrs)
+            errors.append(item_errors)
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return validated
+
+    def prefetch(self, data):
+        """Hook loading what the items refer to before they are validated"""
+
+    def create(self, validated_data):
+        return bulk.create_objects(self.child.Meta.model, validated_data)
+
+    def update(self, instance, validated_data):
+        return bulk.update_objects(
+            self.child.Meta.model, self.instances, validated_data
+        )
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -9,6 +72,7 @@ class TagSerializer(serializers.ModelSerializer):
         model = Tag
         fields = ('id', 'name',)
         read_only_fields = ('id',)
+        list_serializer_class = BulkListSerializer
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -18,15 +82,20 @@ class IngredientSerializer(serializers.ModelSerializer):
         model = Ingredient
         fields = ('id', 'name',)
         read_only_fields = ('id',)
+        list_serializer_class = BulkListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    """Serializing the Recipe model"""
-    tags = serializers.PrimaryKeyRelatedField(
+    """Serializing the Recipe model
+
+    Tags and ingredients are given by id or by name, missing names being
+    created for the user.
+    """
+    tags = UserPrimaryKeyOrNameRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
-    ingredient = serializers.PrimaryKeyRelatedField(
+    ingredient = UserPrimaryKeyOrNameRelatedField(
         many=True,
         queryset=Ingredient.objects.all()
     )
@@ -36,6 +105,95 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'time_minutes', 'ingredient', 'tags', 'price', 'link',)
         read_only_fields = ('id',)
 
+    def resolve_names(self, validated_data):
+        user = self.context['request'].user
+        for relation, model in (('tags', Tag), ('ingredient', Ingredient)):
+            if relation in validated_data:
+                validated_data[relation] = resolve_names(
+                    user, model, [validated_data[relation]]
+                )[0]
+        return validated_data
+
+    # atomic, so the recipe's save and tag/ingredient changes are indexed
+    # once, on commit
+    @transaction.atomic
+    def create(self, validated_data):
+        return super().create(self.resolve_names(validated_data))
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        return super().update(instance, self.resolve_names(validated_data))
+
+
+class RecipeBulkListSerializer(BulkListSerializer):
+    """Validating many recipes, resolving all their tags/ingredients at once"""
+
+    def prefetch(self, data):
+        for relation in bulk.RELATIONS:
+            field = self.child.fields[relation].child_relation
+            pks = []
+            for item in data:
+                related = item.get(relation) if isinstance(item, dict) else None
+                if isinstance(related, list):
+                    pks += [pk for pk in related if isinstance(pk, int)]
+            field.prime(pks)
+
+    def resolve_names(self, validated_data):
+        """Match or create the named tags/ingredients of all items at once"""
+        user = self.context['request'].user
+        for relation, model in (('tags', Tag), ('ingredient', Ingredient)):
+            items = [item for item in validated_data if relation in item]
+            groups = resolve_names(user, model, [item[relation] for item in items])
+            for item, related in zip(items, groups):
+                item[relation] = related
+        return validated_data
+
+    def create(self, validated_data):
+        return bulk.create_recipes(self.resolve_names(validated_data))
+
+    def update(self, instance, validated_data):
+        return bulk.update_recipes(self.instances, self.resolve_names(validated_data))
+
+
+class RecipeBulkSerializer(RecipeSerializer):
+    """Validating one recipe of a bulk request"""
+    tags = UserPrimaryKeyOrNameRelatedField(
+        many=True,
+        queryset=Tag.objects.all(),
+        required=False
+    )
+    ingredient = UserPrimaryKeyOrNameRelatedField(
+        many=True,
+        queryset=Ingredient.objects.all(),
+        required=False
+    )
+
+    class Meta(RecipeSerializer.Meta):
+        list_serializer_class = RecipeBulkListSerializer
+
+
+class RecipeImportSerializer(serializers.ModelSerializer):
+    """Validating one imported recipe, its tags and ingredients given by name"""
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False
+    )
+    ingredient = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False
+    )
+
+    class Meta:
+        model = Recipe
+        fields = ('title', 'time_minutes', 'price', 'link', 'ingredient', 'tags',)
+
+
+class RecipeImportUploadSerializer(serializers.Serializer):
+    """Accepting an NDJSON/CSV file of recipes to import"""
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(choices=('ndjson', 'csv'), required=False)
+    skip = serializers.IntegerField(min_value=0, default=0)
+
 
 class RecipeDetailSerializer(RecipeSerializer):
     ingredient = IngredientSerializer(many=True, read_only=True)
@@ -48,3 +206,18 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         model = Recipe
         fields= ('id', 'image',)
         read_only_fields = ('id',)
+
+
+class RecipeImageUploadSerializer(serializers.Serializer):
+    """Accepting a raw recipe image for background processing"""
+    image = serializers.FileField()
+
+
+class RecipeImageJobSerializer(serializers.ModelSerializer):
+    """Serializing the progress of a recipe image upload"""
+    image = serializers.ImageField(source='recipe.image', read_only=True)
+
+    class Meta:
+        model = RecipeImageJob
+        fields = ('id', 'recipe', 'status', 'error', 'image', 'created', 'updated',)
+        read_only_fields = ('id', 'recipe', 'status', 'error', 'created', 'updated',)
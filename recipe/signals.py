@@ -0,0 +1,295 @@
+import functools
+import threading
+
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import Signal, receiver
+
+from core.models import User, Tag, Ingredient, Recipe
+from . import facets, response_cache, search, versioning
+
+# Sent after bulk writes that bypass the model signals, with the ids of
+# one user's recipes whose fields or tags/ingredients changed.
+recipes_changed = Signal()
+
+
+class OnCommitBatch:
+    """Work gathered over a transaction and done once when it commits
+
+    A single write fires many signals, eg. a recipe's save and then each
+    of its tag and ingredient changes; batching them does their shared
+    work once. See defer().
+    """
+
+    def __init__(self):
+        self.done = False
+
+    def __call__(self):
+        if not self.done:
+            self.done = True
+            self.run()
+
+    def add(self, *args):
+        raise NotImplementedError
+
+    def run(self):
+        raise NotImplementedError
+
+
+# per thread and database alias, the batches being gathered
+_pending = threading.local()
+
+
+def pending(alias):
+    return _pending.__dict__.setdefault(alias, {})
+
+
+def defer(batch_class, *args):
+    """Add args to the current transaction's batch_class batch
+
+    Every addition registers the batch with on_commit again, so that it
+    stays registered by the additions surviving a savepoint rollback; it
+    runs once, on the first of them, with everything that was added. The
+    work of a rolled back addition is done all the same, so it must hold
+    for changes that did not happen. Outside of a transaction the batch
+    runs right away, on its own.
+    """
+    batches = pending(transaction.get_connection().alias)
+    batch = batches.get(batch_class)
+    if batch is None or batch.done:
+        batch = batches[batch_class] = batch_class()
+    batch.add(*args)
+    transaction.on_commit(batch)
+
+
+class SearchReindex(OnCommitBatch):
+    """Re-tokenize the recipes marked dirty, once"""
+
+    def __init__(self):
+        super().__init__()
+        self.recipe_ids = set()
+
+    def add(self, recipe_ids):
+        self.recipe_ids.update(recipe_ids)
+
+    def run(self):
+        # deleted or rolled back recipes drop out here
+        search.index_recipes(Recipe.objects.filter(id__in=self.recipe_ids))
+
+
+def reindex(recipe_ids):
+    """Mark the recipes' search tokens dirty"""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        defer(SearchReindex, recipe_ids)
+
+
+class CatalogChange:
+    """The catalog changes committed together
+
+    Each change is registered with on_commit on its own, so those of a
+    rolled back savepoint never reach it. On commit, the first change of
+    each user bumps their catalog version; the facet index follows the
+    bump and takes the changes' updates, unless the version moved by more
+    than one or a change asks for a rebuild, in which case it is dropped
+    and rebuilt on next use.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.indexes = {}
+
+    def __call__(self, user_id, update, rebuild):
+        self.started = True
+        if user_id not in self.indexes:
+            self.indexes[user_id] = self.follow(user_id)
+        index = self.indexes[user_id]
+        if index is None:
+            return
+        if rebuild:
+            facets.drop_index(user_id)
+            self.indexes[user_id] = None
+        elif update is not None:
+            update(index)
+
+    def follow(self, user_id):
+        """Bump the user's version, returning their index if it kept up"""
+        version = versioning.bump(user_id)
+        index = facets.cached_index(user_id)
+        if index is None:
+            return None
+        if version is None or not index.advance(version):
+            facets.drop_index(user_id)
+            return None
+        return index
+
+
+def catalog_changed(user_id, update=None, rebuild=False):
+    """Bump the user's catalog version once the transaction commits
+
+    update, if given, is then called with the user's facet index; rebuild
+    drops the index instead.
+    """
+    batches = pending(transaction.get_connection().alias)
+    change = batches.get(CatalogChange)
+    if change is None or change.started:
+        # one that never started was rolled back, and gathered nothing
+        change = batches[CatalogChange] = CatalogChange()
+    transaction.on_commit(functools.partial(change, user_id, update, rebuild))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        versioning.start(instance.pk)
+        response_cache.invalidate('user', [instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    update_membership('tags', instance, action, reverse, pk_set)
+    invalidate_responses('tags', instance, action, reverse, pk_set)
+    update_search_index(instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredient.through)
+def ingredients_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    update_membership('ingredient', instance, action, reverse, pk_set)
+    invalidate_responses('ingredient', instance, action, reverse, pk_set)
+    update_search_index(instance, action, reverse, pk_set)
+
+
+def update_membership(relation, instance, action, reverse, pk_set):
+    """Mirror a recipe tag/ingredient change into the facet index"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    pk = instance.pk
+    pk_set = set(pk_set or ())
+
+    def update(index):
+        if action == 'post_clear':
+            if reverse:
+                index.discard_object(relation, pk)
+            else:
+                index.remove(relation, pk)
+            return
+
+        change = index.add if action == 'post_add' else index.remove
+        if reverse:
+            for recipe_id in pk_set:
+                change(relation, recipe_id, (pk,))
+        else:
+            change(relation, pk, pk_set)
+
+    catalog_changed(instance.user_id, update)
+
+
+def invalidate_responses(relation, instance, action, reverse, pk_set):
+    """Retire the cached details of the recipes a membership change touched"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        response_cache.invalidate('recipe', [instance.pk])
+    elif action == 'post_clear':
+        # every recipe that showed it depends on it
+        response_cache.invalidate(relation, [instance.pk])
+    else:
+        response_cache.invalidate('recipe', pk_set)
+
+
+def update_search_index(instance, action, reverse, pk_set):
+    """Mark the recipes a tag/ingredient change touched for re-tokenizing"""
+    if reverse and action == 'pre_clear':
+        remember_recipes(instance)
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        reindex([instance.pk])
+    elif action == 'post_clear':
+        reindex_remembered_recipes(instance)
+    else:
+        reindex(pk_set)
+
+
+def remember_recipes(instance):
+    """Note which recipes a tag/ingredient is on before its links go away"""
+    instance._linked_recipe_ids = list(
+        instance.recipe_set.values_list('id', flat=True)
+    )
+
+
+def reindex_remembered_recipes(instance):
+    reindex(instance.__dict__.pop('_linked_recipe_ids', []))
+
+
+@receiver(recipes_changed)
+def recipes_bulk_changed(sender, user_id, recipe_ids, **kwargs):
+    catalog_changed(user_id, rebuild=True)
+    response_cache.invalidate('recipe', recipe_ids)
+    reindex(recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        catalog_changed(instance.user_id)
+        response_cache.invalidate('recipe', [instance.pk])
+        reindex([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_attr_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    catalog_changed(instance.user_id)
+    if not created:
+        response_cache.invalidate(
+            'tags' if sender is Tag else 'ingredient', [instance.pk]
+        )
+        reindex(instance.recipe_set.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_attr_deleting(sender, instance, **kwargs):
+    remember_recipes(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    catalog_changed(instance.user_id, lambda index: index.discard_recipe(pk))
+    response_cache.invalidate('recipe', [instance.pk])
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    catalog_changed(
+        instance.user_id, lambda index: index.discard_object('tags', pk)
+    )
+    response_cache.invalidate('tags', [instance.pk])
+    reindex_after_delete(instance)
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    catalog_changed(
+        instance.user_id, lambda index: index.discard_object('ingredient', pk)
+    )
+    response_cache.invalidate('ingredient', [instance.pk])
+    reindex_after_delete(instance)
+
+
+def reindex_after_delete(instance):
+    """Re-tokenize a deleted tag/ingredient's recipes once the cascade is done
+
+    The recipes may be part of the same cascade; the reindex, done on
+    commit, only touches the ones that survived.
+    """
+    reindex_remembered_recipes(instance)
@@ -0,0 +1,95 @@
+import json
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.models import Recipe
+
+
+def assert_constant_queries(testcase, num, func, populate, rounds=3):
+    """Assert func runs num queries, however many rows populate adds"""
+    for _ in range(rounds):
+        populate()
+        with testcase.assertNumQueries(num):
+            func()
+
+
+@contextmanager
+def run_on_commit(using=DEFAULT_DB_ALIAS):
+    """Run the pending on_commit callbacks as the block ends, as a commit would
+
+    A TestCase never commits, so they would never run otherwise. Like
+    Django 3.2's captureOnCommitCallbacks(execute=True), except that the
+    callbacks registered before the block run too.
+    """
+    yield
+    connection = connections[using]
+    # callbacks may register more of their own
+    while connection.run_on_commit:
+        # (savepoint ids, callback[, robust]) depending on the Django version
+        callback = connection.run_on_commit.pop(0)[1]
+        callback()
+
+
+def sample_user(email='kousik.sekar@gmail.com', password='pass123', **params):
+    """Create and return a sample user"""
+    return get_user_model().objects.create_user(
+        email=email, password=password, **params
+    )
+
+
+def sample_recipe(user, title='Sample recipe', commit=False, **params):
+    """Create and return a sample recipe
+
+    With commit, the work deferred to the commit (indexing, the catalog
+    version bump) is done before returning, see run_on_commit.
+    """
+    defaults = {'time_minutes': 10, 'price': 5.00}
+    defaults.update(params)
+    if not commit:
+        return Recipe.objects.create(user=user, title=title, **defaults)
+    with run_on_commit():
+        return Recipe.objects.create(user=user, title=title, **defaults)
+
+
+async def asgi_request(application, method, path, headers=(), data=None):
+    """Send one HTTP request to an ASGI application; (status, body)"""
+    body = b'' if data is None else json.dumps(data).encode()
+    path, _, query_string = path.partition('?')
+    headers = [(b'host', b'testserver')] + [
+        (name.lower().encode(), value.encode()) for name, value in headers
+    ]
+    if data is not None:
+        headers += [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ]
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query_string.encode(),
+        'root_path': '',
+        'headers': headers,
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {'body': b''}
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['body'] += message.get('body', b'')
+
+    await application(scope, receive, send)
+    return response['status'], response['body']
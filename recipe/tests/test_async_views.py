@@ -0,0 +1,201 @@
+import asyncio
+import json
+import threading
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from app.asgi import ASGIHandler, application
+from core import profiling
+from core.models import Recipe, Tag
+from recipe.async_views import authenticate
+from recipe.tests.helpers import asgi_request
+from recipe.views import RecipeViewSet
+from user.authentication import CachedTokenAuthentication, token_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+@override_settings(RECIPE_RESPONSE_CACHE={'ENABLED': False})
+class AsgiRecipeApiTest(TransactionTestCase):
+    """The API as app.asgi serves it, reads on the event loop"""
+    databases = '__all__'
+
+    def setUp(self):
+        caches['default'].clear()
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123'
+        )
+        self.auth = ('Authorization', f'Token {Token.objects.create(user=self.user).key}')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price='1.00'
+        )
+
+    def request(self, method, path, headers=None, data=None):
+        status, body = async_to_sync(asgi_request)(
+            application, method, path,
+            headers=[self.auth] if headers is None else headers, data=data
+        )
+        return status, json.loads(body) if body else None
+
+    def test_list_recipes(self):
+        status, body = self.request('GET', RECIPES_URL)
+
+        self.assertEqual(status, 200)
+        self.assertEqual([r['title'] for r in body['results']], ['Soup'])
+
+    def test_retrieve_recipe(self):
+        status, body = self.request('GET', detail_url(self.recipe.id))
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body['title'], 'Soup')
+
+    def test_list_tags(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        status, body = self.request('GET', TAGS_URL)
+
+        self.assertEqual(status, 200)
+        self.assertIn('Vegan', json.dumps(body))
+
+    def test_requires_a_valid_token(self):
+        self.assertEqual(self.request('GET', RECIPES_URL, headers=[])[0], 401)
+        status, _ = self.request(
+            'GET', RECIPES_URL, headers=[('Authorization', 'Token nope')]
+        )
+        self.assertEqual(status, 401)
+
+    def test_writes_are_delegated(self):
+        status, body = self.request('POST', RECIPES_URL, data={
+            'title': 'Stew', 'time_minutes': 30, 'price': '4.00',
+            'tags': ['Winter'], 'ingredient': [],
+        })
+
+        self.assertEqual(status, 201, body)
+        self.assertTrue(Recipe.objects.filter(title='Stew').exists())
+        status, body = self.request('GET', RECIPES_URL)
+        self.assertEqual(len(body['results']), 2)
+
+    def test_list_actions_served(self):
+        """Routes like recipes/search/ are not taken for a recipe's detail"""
+        status, body = self.request(
+            'GET', reverse('recipe:recipe-search') + '?q=soup'
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual([r['title'] for r in body['results']], ['Soup'])
+
+        status, body = self.request('DELETE', reverse('recipe:recipe-bulk'), data={
+            'ids': [self.recipe.id],
+        })
+        self.assertEqual(status, 204)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_export_streamed(self):
+        """The export's queries run off the event loop, chunk after chunk"""
+        Recipe.objects.create(
+            user=self.user, title='Stew', time_minutes=50, price='4.00'
+        )
+
+        with patch.object(RecipeViewSet, 'export_chunk_size', 1):
+            status, body = async_to_sync(asgi_request)(
+                application, 'GET', reverse('recipe:recipe-export') + '?format=ndjson',
+                headers=[self.auth]
+            )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [json.loads(line)['title'] for line in body.decode().splitlines()],
+            ['Soup', 'Stew']
+        )
+
+    def test_other_routes_served(self):
+        status, _ = self.request('GET', reverse('user:me'))
+        self.assertEqual(status, 200)
+        # the synchronous recipe routes stay reversible in the ASGI urlconf
+        self.assertEqual(
+            reverse('recipe:recipe-upload-image', args=[1], urlconf='app.asgi_urls'),
+            reverse('recipe:recipe-upload-image', args=[1])
+        )
+
+    def test_profiling_counts_pooled_queries(self):
+        profiling.registry.clear()
+        self.addCleanup(profiling.registry.clear)
+        with override_settings(REQUEST_PROFILING={'ENABLED': True}):
+            profiled = ASGIHandler()
+            status, _ = async_to_sync(asgi_request)(
+                profiled, 'GET', RECIPES_URL, headers=[self.auth]
+            )
+
+        self.assertEqual(status, 200)
+        queries = profiling.registry.reservoirs[
+            ('request_db_queries', 'recipe:recipe-list', 'GET')
+        ]
+        self.assertGreater(queries.sum, 0)
+
+    def test_reads_run_concurrently(self):
+        """Reads overlap instead of queueing on Django's single sync thread"""
+        barrier = threading.Barrier(3, timeout=5)
+        list_recipes = RecipeViewSet.list
+
+        def list_together(viewset, request, *args, **kwargs):
+            barrier.wait()
+            return list_recipes(viewset, request, *args, **kwargs)
+
+        async def requests():
+            return await asyncio.gather(*[
+                asgi_request(application, 'GET', RECIPES_URL, headers=[self.auth])
+                for _ in range(3)
+            ])
+
+        with patch.object(RecipeViewSet, 'list', list_together):
+            responses = async_to_sync(requests)()
+
+        self.assertEqual([status for status, _ in responses], [200] * 3)
+
+
+class AsyncTokenAuthenticationTest(TransactionTestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def authenticate(self, header):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=header)
+        async_to_sync(authenticate)(request)
+        return request
+
+    def test_cached_token_skips_lookup(self):
+        self.authenticate(f'Token {self.token.key}')
+
+        with patch.object(
+            CachedTokenAuthentication, 'authenticate_credentials'
+        ) as lookup:
+            request = self.authenticate(f'Token {self.token.key}')
+
+        lookup.assert_not_called()
+        self.assertEqual(request._force_auth_user, self.user)
+        self.assertEqual(request._force_auth_token, self.token)
+
+    def test_invalid_token_left_to_the_view(self):
+        request = self.authenticate('Token nope')
+        self.assertFalse(hasattr(request, '_force_auth_user'))
+
+    def test_other_schemes_ignored(self):
+        request = self.authenticate('Basic abc')
+        self.assertFalse(hasattr(request, '_force_auth_user'))
@@ -0,0 +1,250 @@
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import skipUnless
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db.backends.utils import CursorWrapper
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from app.asgi import application as asgi_application
+from core.models import Tag, Recipe
+
+from recipe import serializers
+from recipe.querysets import optimize_for_serializer
+from recipe.rows import row_serializer
+from recipe.tests.helpers import asgi_request
+
+TAGS_URL = reverse('recipe:tag-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+RUN_BENCHMARKS = bool(os.environ.get('RUN_BENCHMARKS'))
+
+
+def best_of(func, repeat=5):
+    """Return the fastest of repeat timings of func in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@skipUnless(RUN_BENCHMARKS, 'set RUN_BENCHMARKS=1 to run benchmarks')
+class AssignedOnlyBenchmark(TestCase):
+    """Latency of ?assigned_only=1 as each tag spans more recipes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='bench@example.com',
+            password='pass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tags = [
+            Tag.objects.create(user=self.user, name=f'tag {i}')
+            for i in range(50)
+        ]
+
+    def add_recipes(self, count):
+        Recipe.objects.bulk_create([
+            Recipe(user=self.user, title='bench', time_minutes=1, price=1)
+            for _ in range(count)
+        ])
+        recipes = Recipe.objects.filter(user=self.user)
+        Through = Recipe.tags.through
+        Through.objects.all().delete()
+        Through.objects.bulk_create([
+            Through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe in recipes for tag in self.tags
+        ])
+
+    def test_fan_out(self):
+        timings = []
+        for fan_out in (10, 100, 1000):
+            self.add_recipes(fan_out - Recipe.objects.count())
+            timings.append(best_of(
+                lambda: self.client.get(TAGS_URL, {'assigned_only': 1})
+            ))
+            print(f'\nassigned_only, {fan_out} recipes per tag: '
+                  f'{timings[-1] * 1000:.2f} ms')
+
+        self.assertLess(timings[-1], timings[0] * 3)
+
+
+@skipUnless(RUN_BENCHMARKS, 'set RUN_BENCHMARKS=1 to run benchmarks')
+class RowSerializerBenchmark(TestCase):
+    """Rendering a page of recipes through DRF versus from values() rows"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='bench@example.com',
+            password='pass123'
+        )
+        Tag.objects.bulk_create([
+            Tag(user=self.user, name=f'tag {i}', normalized_name=f'tag {i}')
+            for i in range(20)
+        ])
+        tags = list(Tag.objects.filter(user=self.user))
+        Recipe.objects.bulk_create([
+            Recipe(user=self.user, title=f'recipe {i}', time_minutes=i, price=i)
+            for i in range(1000)
+        ])
+        Through = Recipe.tags.through
+        Through.objects.bulk_create([
+            Through(recipe_id=recipe_id, tag_id=tag.id)
+            for recipe_id in Recipe.objects.values_list('id', flat=True)
+            for tag in tags[recipe_id % 10:recipe_id % 10 + 5]
+        ])
+
+    def test_throughput(self):
+        renderer = JSONRenderer()
+        queryset = Recipe.objects.filter(user=self.user).order_by('id')
+        for serializer_class in (
+            serializers.RecipeSerializer, serializers.RecipeDetailSerializer
+        ):
+            instances = optimize_for_serializer(queryset, serializer_class)
+            rows = row_serializer(serializer_class)
+
+            def drf():
+                return renderer.render(
+                    serializer_class(instances.all(), many=True).data
+                )
+
+            def values():
+                return renderer.render(
+                    rows.to_representation(rows.values(queryset))
+                )
+
+            self.assertEqual(values(), drf())
+            drf_time, values_time = best_of(drf), best_of(values)
+            print(f'\n{serializer_class.__name__}, 1000 recipes: '
+                  f'DRF {drf_time * 1000:.1f} ms, '
+                  f'rows {values_time * 1000:.1f} ms '
+                  f'({drf_time / values_time:.1f}x)')
+            self.assertLess(values_time, drf_time)
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def wsgi_environ(path, headers):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.url_scheme': 'http',
+        'wsgi.errors': io.StringIO(),
+    }
+    for name, value in headers:
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    return environ
+
+
+@skipUnless(RUN_BENCHMARKS, 'set RUN_BENCHMARKS=1 to run benchmarks')
+@override_settings(RECIPE_RESPONSE_CACHE={'ENABLED': False})
+class ServerLatencyBenchmark(TransactionTestCase):
+    """p50/p99 latency of recipe list reads from many concurrent clients
+
+    Compares a threaded WSGI server, Django's own ASGI handler, which runs
+    the synchronous views one at a time, and app.asgi. Against the SQLite
+    test database the work is CPU bound and the GIL lets one thread run at
+    a time whatever the server; BENCHMARK_DB_LATENCY_MS adds a delay to
+    each query to stand in for the round trips to a networked database.
+    """
+    databases = '__all__'
+    clients = 32
+    requests = 10
+
+    def setUp(self):
+        latency = float(os.environ.get('BENCHMARK_DB_LATENCY_MS', 0)) / 1000
+        if latency:
+            execute = CursorWrapper.execute
+
+            def delayed_execute(cursor, *args, **kwargs):
+                time.sleep(latency)
+                return execute(cursor, *args, **kwargs)
+
+            patcher = patch.object(CursorWrapper, 'execute', delayed_execute)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user(
+            email='bench@example.com',
+            password='pass123'
+        )
+        self.headers = [
+            ('Authorization', f'Token {Token.objects.create(user=self.user).key}')
+        ]
+        Recipe.objects.bulk_create([
+            Recipe(user=self.user, title=f'recipe {i}', time_minutes=i, price=i)
+            for i in range(100)
+        ])
+
+    def wsgi_timings(self):
+        handler = WSGIHandler()
+
+        def client(_):
+            timings = []
+            for _ in range(self.requests):
+                start = time.perf_counter()
+                statuses = []
+                response = handler(
+                    wsgi_environ(RECIPES_URL, self.headers),
+                    lambda status, headers: statuses.append(status)
+                )
+                b''.join(response)
+                response.close()
+                timings.append(time.perf_counter() - start)
+                self.assertEqual(statuses, ['200 OK'])
+            return timings
+
+        with ThreadPoolExecutor(self.clients) as executor:
+            return sum(executor.map(client, range(self.clients)), [])
+
+    def asgi_timings(self, application):
+        async def client():
+            timings = []
+            for _ in range(self.requests):
+                start = time.perf_counter()
+                status, _ = await asgi_request(
+                    application, 'GET', RECIPES_URL, headers=self.headers
+                )
+                timings.append(time.perf_counter() - start)
+                self.assertEqual(status, 200)
+            return timings
+
+        async def clients():
+            return await asyncio.gather(*[client() for _ in range(self.clients)])
+
+        return sum(async_to_sync(clients)(), [])
+
+    def test_latency(self):
+        servers = (
+            ('WSGI, threaded', self.wsgi_timings),
+            ('ASGI, Django', lambda: self.asgi_timings(ASGIHandler())),
+            ('ASGI, app.asgi', lambda: self.asgi_timings(asgi_application)),
+        )
+        for name, timings in servers:
+            timings()  # warm up
+            measured = timings()
+            print(f'\n{name}, {self.clients} clients: '
+                  f'p50 {percentile(measured, 0.5) * 1000:.1f} ms, '
+                  f'p99 {percentile(measured, 0.99) * 1000:.1f} ms')
@@ -0,0 +1,258 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe import search, versioning
+from recipe.tests.helpers import run_on_commit, sample_recipe, sample_user
+
+RECIPE_BULK_URL = reverse('recipe:recipe-bulk')
+TAG_BULK_URL = reverse('recipe:tag-bulk')
+
+
+class BulkRecipeApiTest(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with run_on_commit():
+            self.tag = Tag.objects.create(user=self.user, name='Vegan')
+            self.ingredient = Ingredient.objects.create(user=self.user, name='Rice')
+
+    def test_bulk_create(self):
+        payload = [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 5,
+                'price': '2.50',
+                'tags': [self.tag.id],
+                'ingredient': [self.ingredient.id],
+            }
+            for i in range(3)
+        ]
+
+        with run_on_commit():
+            res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 3)
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual([r['id'] for r in res.data], [r.id for r in recipes])
+        for recipe in recipes:
+            self.assertEqual(list(recipe.tags.all()), [self.tag])
+            self.assertEqual(list(recipe.ingredient.all()), [self.ingredient])
+        self.assertEqual(len(search.rank_recipes(self.user.id, 'vegan')), 3)
+
+    def test_bulk_create_query_count_independent_of_size(self):
+        def post(count):
+            payload = [
+                {'title': f'Recipe {i}', 'time_minutes': 5, 'price': '2.50',
+                 'tags': [self.tag.id], 'ingredient': [self.ingredient.id]}
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as ctx, run_on_commit():
+                res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(post(5), post(25))
+
+    def test_bulk_create_with_tag_names(self):
+        """Names shared by items are created once"""
+        payload = [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 5,
+                'price': '2.50',
+                'tags': ['vegan', f'tag {i}'],
+            }
+            for i in range(3)
+        ]
+
+        res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.tag.recipe_set.count(), 3)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+
+    def test_bulk_create_reports_item_errors(self):
+        other = sample_user('other@gmail.com')
+        foreign_tag = Tag.objects.create(user=other, name='Not mine')
+        payload = [
+            {'title': 'Fine', 'time_minutes': 5, 'price': '2.50'},
+            {'title': 'No time', 'price': '2.50'},
+            {'title': 'Foreign', 'time_minutes': 5, 'price': '2.50',
+             'tags': [foreign_tag.id]},
+        ]
+
+        res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('time_minutes', res.data[1])
+        self.assertIn('tags', res.data[2])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_rejects_non_list(self):
+        res = self.client.post(RECIPE_BULK_URL, {'title': 'x'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update(self):
+        recipe1 = sample_recipe(self.user)
+        recipe2 = sample_recipe(self.user)
+        recipe2.tags.add(self.tag)
+
+        res = self.client.patch(RECIPE_BULK_URL, [
+            {'id': recipe1.id, 'title': 'Renamed', 'tags': [self.tag.id]},
+            {'id': recipe2.id, 'price': '9.00', 'tags': []},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe1.refresh_from_db()
+        recipe2.refresh_from_db()
+        self.assertEqual(recipe1.title, 'Renamed')
+        self.assertEqual(list(recipe1.tags.all()), [self.tag])
+        self.assertEqual(recipe2.price, Decimal('9.00'))
+        self.assertEqual(list(recipe2.tags.all()), [])
+
+    def test_bulk_update_other_users_recipe(self):
+        other = sample_user('other@gmail.com')
+        recipe = sample_recipe(other)
+
+        res = self.client.patch(
+            RECIPE_BULK_URL, [{'id': recipe.id, 'title': 'Mine'}], format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', res.data[0])
+
+    def test_bulk_delete(self):
+        recipe1 = sample_recipe(self.user)
+        recipe2 = sample_recipe(self.user)
+        other = sample_user('other@gmail.com')
+        foreign = sample_recipe(other)
+
+        res = self.client.delete(
+            RECIPE_BULK_URL, {'ids': [recipe1.id, foreign.id]}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            list(Recipe.objects.values_list('id', flat=True).order_by('id')),
+            [recipe2.id, foreign.id]
+        )
+
+    def test_bulk_delete_query_count_independent_of_size(self):
+        """The catalog version is bumped once, not per deleted recipe"""
+        def delete(count):
+            with run_on_commit():
+                recipes = [sample_recipe(self.user) for _ in range(count)]
+                for recipe in recipes:
+                    recipe.tags.add(self.tag)
+            payload = {'ids': [recipe.id for recipe in recipes]}
+            start = versioning.current_version(self.user.id)
+            with CaptureQueriesContext(connection) as ctx, run_on_commit():
+                res = self.client.delete(RECIPE_BULK_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+            self.assertEqual(versioning.current_version(self.user.id), start + 1)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(delete(5), delete(25))
+
+
+class BulkTagApiTest(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_tags(self):
+        res = self.client.post(
+            TAG_BULK_URL, [{'name': 'Vegan'}, {'name': 'Quick'}], format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        tags = Tag.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(
+            res.data, [{'id': tag.id, 'name': tag.name} for tag in tags]
+        )
+
+    def test_bulk_create_reuses_existing_tags(self):
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(
+            TAG_BULK_URL, [{'name': 'vegan'}, {'name': 'Quick'}], format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data[0], {'id': vegan.id, 'name': 'Vegan'})
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_rename_to_existing_name(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+
+        res = self.client.patch(
+            TAG_BULK_URL, [{'id': quick.id, 'name': 'VEGAN'}], format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        quick.refresh_from_db()
+        self.assertEqual(quick.name, 'Quick')
+
+    def test_bulk_rename_tags_reindexes_recipes(self):
+        with run_on_commit():
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+            recipe = sample_recipe(self.user)
+            recipe.tags.add(tag)
+
+        with run_on_commit():
+            res = self.client.patch(
+                TAG_BULK_URL, [{'id': tag.id, 'name': 'Plant based'}], format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(search.rank_recipes(self.user.id, 'plant'), [recipe.id])
+
+    def test_bulk_writes_change_list_etag(self):
+        tags_url = reverse('recipe:tag-list')
+        with run_on_commit():
+            first = self.client.get(tags_url)
+
+        with run_on_commit():
+            res = self.client.post(TAG_BULK_URL, [{'name': 'Vegan'}], format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        created = self.client.get(tags_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(created.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(created['ETag'], first['ETag'])
+        self.assertEqual([tag['name'] for tag in created.json()['results']], ['Vegan'])
+
+        with run_on_commit():
+            res = self.client.patch(
+                TAG_BULK_URL, [{'id': res.data[0]['id'], 'name': 'Plant based'}],
+                format='json'
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        renamed = self.client.get(tags_url, HTTP_IF_NONE_MATCH=created['ETag'])
+        self.assertEqual(renamed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(renamed['ETag'], created['ETag'])
+        self.assertEqual(
+            [tag['name'] for tag in renamed.json()['results']], ['Plant based']
+        )
+
+    def test_bulk_delete_tags(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.delete(TAG_BULK_URL, {'ids': [tag.id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Tag.objects.exists())
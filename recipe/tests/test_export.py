@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe.tests.helpers import sample_recipe, sample_user
+from recipe.views import RecipeViewSet
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+class RecipeExportTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+
+        self.curry = sample_recipe(self.user, title='Curry')
+        self.curry.tags.add(
+            Tag.objects.create(user=self.user, name='Vegan'),
+            Tag.objects.create(user=self.user, name='Spicy, hot')
+        )
+        self.curry.ingredient.add(
+            Ingredient.objects.create(user=self.user, name='Rice')
+        )
+        self.toast = sample_recipe(self.user, title='Toast')
+
+    def export(self, fmt, **params):
+        res = self.client.get(EXPORT_URL, {'format': fmt, **params})
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        return res, b''.join(res.streaming_content).decode()
+
+    def test_ndjson(self):
+        res, content = self.export('ndjson')
+
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([line['title'] for line in lines], ['Curry', 'Toast'])
+        self.assertEqual(
+            sorted(tag['name'] for tag in lines[0]['tags']), ['Spicy, hot', 'Vegan']
+        )
+        self.assertEqual(lines[0]['price'], '5.00')
+
+    def test_csv(self):
+        res, content = self.export('csv')
+
+        self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('recipes.csv', res['Content-Disposition'])
+        records = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(
+            sorted(records[0]['tags'].split('|')), ['Spicy, hot', 'Vegan']
+        )
+        self.assertEqual(records[0]['ingredient'], 'Rice')
+        self.assertEqual(records[1]['tags'], '')
+
+    def test_limited_to_user_and_filters(self):
+        other = sample_user('other@gmail.com')
+        sample_recipe(other, title='Not mine')
+
+        res, content = self.export('ndjson', time_minutes_max=60)
+        titles = [json.loads(line)['title'] for line in content.splitlines()]
+        self.assertEqual(titles, ['Curry', 'Toast'])
+
+    def test_queries_per_chunk(self):
+        """Tags and ingredients are fetched once per chunk of recipes"""
+        Recipe.objects.bulk_create([
+            Recipe(user=self.user, title='bulk', time_minutes=1, price=1)
+            for _ in range(8)
+        ])
+        with patch.object(RecipeViewSet, 'export_chunk_size', 4):
+            res = self.client.get(EXPORT_URL, {'format': 'ndjson'})
+
+            # the recipes, then tags and ingredients for each of 3 chunks
+            with self.assertNumQueries(7):
+                lines = b''.join(res.streaming_content).splitlines()
+        self.assertEqual(len(lines), 10)
+
+    def test_unknown_format(self):
+        res = self.client.get(EXPORT_URL, {'format': 'xml'})
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_empty(self):
+        Recipe.objects.all().delete()
+
+        self.assertEqual(self.export('ndjson')[1], '')
+        self.assertEqual(self.export('csv')[1], '')
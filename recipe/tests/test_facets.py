@@ -0,0 +1,84 @@
+from django.test import TestCase
+
+from core.models import Tag
+
+from recipe import facets
+from recipe.tests.helpers import run_on_commit, sample_recipe, sample_user
+
+
+class MembershipIndexTest(TestCase):
+
+    def test_any_and_all_bitmaps(self):
+        index = facets.MembershipIndex()
+        index.add('tags', 10, (1, 2))
+        index.add('tags', 20, (1,))
+
+        self.assertEqual(
+            sorted(index.recipes(index.bitmap('tags', [1, 2]))), [10, 20]
+        )
+        self.assertEqual(
+            index.recipes(index.bitmap('tags', [1, 2], match_all=True)), [10]
+        )
+
+    def test_remove_and_discard(self):
+        index = facets.MembershipIndex()
+        index.add('tags', 10, (1, 2))
+        index.add('tags', 20, (1,))
+
+        index.remove('tags', 10, (2,))
+        self.assertEqual(index.recipes(index.bitmap('tags', [2])), [])
+
+        index.discard_recipe(20)
+        self.assertEqual(index.recipes(index.bitmap('tags', [1])), [10])
+
+    def test_counts(self):
+        index = facets.MembershipIndex()
+        index.add('tags', 10, (1, 2))
+        index.add('tags', 20, (1,))
+        index.add('ingredient', 20, (7,))
+
+        bitmap = index.bitmap_of([10, 20, 30])
+        self.assertEqual(index.counts('tags', bitmap), {1: 2, 2: 1})
+        self.assertEqual(index.counts('ingredient', bitmap), {7: 1})
+
+
+class MembershipSignalTest(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        facets.clear_indexes()
+
+    def test_index_built_from_through_tables(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(tag)
+
+        index = facets.get_index(self.user.id)
+
+        self.assertEqual(index.recipes(index.bitmap('tags', [tag.id])), [recipe.id])
+
+    def test_reverse_add_and_clear_update_index(self):
+        with run_on_commit():
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+            recipe = sample_recipe(self.user)
+        index = facets.get_index(self.user.id)
+
+        with run_on_commit():
+            tag.recipe_set.add(recipe)
+        self.assertEqual(index.recipes(index.bitmap('tags', [tag.id])), [recipe.id])
+
+        with run_on_commit():
+            tag.recipe_set.clear()
+        self.assertEqual(index.recipes(index.bitmap('tags', [tag.id])), [])
+
+    def test_deleted_recipe_leaves_index(self):
+        with run_on_commit():
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+            recipe = sample_recipe(self.user)
+            recipe.tags.add(tag)
+        index = facets.get_index(self.user.id)
+
+        with run_on_commit():
+            recipe.delete()
+
+        self.assertEqual(index.recipes(index.bitmap('tags', [tag.id])), [])
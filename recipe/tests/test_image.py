@@ -0,0 +1,254 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core.models import Recipe, RecipeImageJob
+
+from recipe import images, variants
+
+MEDIA_ROOT = tempfile.mkdtemp()
+PIPELINE = {'EAGER': True, 'THUMBNAIL_SIZES': ((20, 20),)}
+
+
+def image_url(recipe_id):
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def job_url(job_id):
+    return reverse('recipe:recipeimagejob-detail', args=[job_id])
+
+
+def sample_jpeg(size=(50, 30), exif=None):
+    ntf = tempfile.NamedTemporaryFile(suffix='.jpg')
+    img = Image.new('RGB', size=size)
+    if exif:
+        img.save(ntf, format='jpeg', exif=exif)
+    else:
+        img.save(ntf, format='jpeg')
+    ntf.seek(0)
+    return ntf
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RECIPE_IMAGE_PIPELINE=PIPELINE)
+class RecipeImagePipelineTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Sample recipe', time_minutes=10, price=5.00
+        )
+
+    def test_upload_accepted_and_processed(self):
+        with sample_jpeg() as ntf:
+            res = self.client.post(
+                image_url(self.recipe.id), {'image': ntf}, format='multipart'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res['Location'], f'http://testserver{job_url(res.data["id"])}')
+        self.assertEqual(res.data['status'], RecipeImageJob.DONE)
+
+        self.recipe.refresh_from_db()
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+        thumbnail = images.thumbnail_name(self.recipe.image.name, (20, 20))
+        with Image.open(default_storage.path(thumbnail)) as img:
+            self.assertEqual(img.size, (20, 12))
+        self.assertEqual(
+            os.listdir(os.path.join(MEDIA_ROOT, 'uploads/staging')), []
+        )
+
+    def test_metadata_stripped(self):
+        exif = Image.Exif()
+        exif[0x010e] = 'secret location'
+        with sample_jpeg(exif=exif.tobytes()) as ntf:
+            self.client.post(
+                image_url(self.recipe.id), {'image': ntf}, format='multipart'
+            )
+
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image.path) as img:
+            self.assertNotIn('exif', img.info)
+
+    def test_upload_bad_image_fails_job(self):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            ntf.write(b'not an image')
+            ntf.seek(0)
+            res = self.client.post(
+                image_url(self.recipe.id), {'image': ntf}, format='multipart'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], RecipeImageJob.FAILED)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_over_pixel_limit_fails_job(self):
+        with override_settings(RECIPE_IMAGE_PIPELINE={
+            **PIPELINE, 'MAX_IMAGE_PIXELS': 1000
+        }), sample_jpeg(size=(50, 30)) as ntf:
+            res = self.client.post(
+                image_url(self.recipe.id), {'image': ntf}, format='multipart'
+            )
+
+        self.assertEqual(res.data['status'], RecipeImageJob.FAILED)
+        self.assertIn('50x30 pixels', res.data['error'])
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_replaced_image_deleted(self):
+        with sample_jpeg() as ntf:
+            self.client.post(
+                image_url(self.recipe.id), {'image': ntf}, format='multipart'
+            )
+        self.recipe.refresh_from_db()
+        old = self.recipe.image.name
+        old_thumbnail = images.thumbnail_name(old, (20, 20))
+        image_id = os.path.splitext(os.path.basename(old))[0]
+        variant = variants.get_cache().path(image_id, 'etag', 'jpg')
+        os.makedirs(os.path.dirname(variant))
+        open(variant, 'wb').close()
+
+        with sample_jpeg() as ntf:
+            self.client.post(
+                image_url(self.recipe.id), {'image': ntf}, format='multipart'
+            )
+
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(self.recipe.image.name, old)
+        self.assertTrue(default_storage.exists(self.recipe.image.name))
+        self.assertFalse(default_storage.exists(old))
+        self.assertFalse(default_storage.exists(old_thumbnail))
+        self.assertFalse(os.path.exists(variant))
+
+    def test_upload_without_file(self):
+        res = self.client.post(
+            image_url(self.recipe.id), {'image': 'not_image'}, format='multipart'
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_job_status_limited_to_user(self):
+        job = RecipeImageJob.objects.create(recipe=self.recipe, staged_file='x.jpg')
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='pass123'
+        ))
+
+        self.assertEqual(
+            self.client.get(job_url(job.id)).data['status'], RecipeImageJob.PENDING
+        )
+        self.assertEqual(
+            other.get(job_url(job.id)).status_code, status.HTTP_404_NOT_FOUND
+        )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RECIPE_IMAGE_PIPELINE=PIPELINE)
+class SweepImageJobsTest(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123'
+        )
+        self.recipe = Recipe.objects.create(
+            user=user, title='Sample recipe', time_minutes=10, price=5.00
+        )
+        self.addCleanup(
+            shutil.rmtree, os.path.join(MEDIA_ROOT, 'uploads'), ignore_errors=True
+        )
+
+    def staged_job(self, status=RecipeImageJob.PENDING, age=3600):
+        """A job whose worker went away age seconds ago"""
+        with sample_jpeg() as ntf:
+            staged = images.stage_upload(File(ntf, name='upload.jpg'))
+        job = RecipeImageJob.objects.create(
+            recipe=self.recipe, staged_file=staged, status=status
+        )
+        RecipeImageJob.objects.filter(id=job.id).update(
+            updated=timezone.now() - timedelta(seconds=age)
+        )
+        self.age_file(staged, age)
+        return job
+
+    def age_file(self, name, age):
+        mtime = time.time() - age
+        os.utime(default_storage.path(name), (mtime, mtime))
+
+    def test_lost_job_processed_again(self):
+        job = self.staged_job(RecipeImageJob.PROCESSING)
+
+        out = StringIO()
+        call_command('sweep_image_jobs', stdout=out)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, RecipeImageJob.DONE)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image)
+        self.assertFalse(default_storage.exists(job.staged_file))
+        self.assertIn('Retried 1 jobs, failed 0', out.getvalue())
+
+    def test_lost_job_without_upload_failed(self):
+        job = self.staged_job()
+        default_storage.delete(job.staged_file)
+
+        call_command('sweep_image_jobs', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, RecipeImageJob.FAILED)
+
+    def test_no_retry_fails_lost_jobs(self):
+        job = self.staged_job()
+
+        call_command('sweep_image_jobs', retry=False, stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, RecipeImageJob.FAILED)
+        # its upload is left over, so it goes too
+        self.assertFalse(default_storage.exists(job.staged_file))
+
+    def test_recent_job_and_upload_left_alone(self):
+        job = self.staged_job(age=10)
+
+        call_command('sweep_image_jobs', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, RecipeImageJob.PENDING)
+        self.assertTrue(default_storage.exists(job.staged_file))
+
+    def test_orphaned_upload_deleted(self):
+        with sample_jpeg() as ntf:
+            old = images.stage_upload(File(ntf, name='old.jpg'))
+            fresh = images.stage_upload(File(ntf, name='fresh.jpg'))
+        self.age_file(old, 3600)
+
+        out = StringIO()
+        call_command('sweep_image_jobs', stdout=out)
+
+        self.assertFalse(default_storage.exists(old))
+        self.assertTrue(default_storage.exists(fresh))
+        self.assertIn('deleted 1 orphaned uploads', out.getvalue())
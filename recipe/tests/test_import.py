@@ -0,0 +1,165 @@
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe import importer
+
+IMPORT_URL = reverse('recipe:recipe-import-recipes')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def ndjson(*records):
+    return io.BytesIO(''.join(json.dumps(record) + '\n' for record in records).encode())
+
+
+def sample_record(title='Curry', **kwargs):
+    return {'title': title, 'time_minutes': 20, 'price': '7.50', **kwargs}
+
+
+class RecipeImporterTest(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123'
+        )
+
+    def test_upserts_tags_by_name(self):
+        """Known names are reused and new ones created once"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        stream = ndjson(
+            sample_record(tags=['Vegan', 'Quick'], ingredient=['Rice']),
+            sample_record(title='Rice bowl', tags=[{'id': 99, 'name': 'Quick'}]),
+        )
+
+        result = importer.import_recipes(self.user, stream, 'ndjson', batch_size=1)
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertIn(vegan, Recipe.objects.get(title='Curry').tags.all())
+        quick = Tag.objects.get(name='Quick')
+        self.assertEqual(quick.recipe_set.count(), 2)
+        self.assertEqual(Ingredient.objects.get().name, 'Rice')
+
+    def test_csv(self):
+        stream = io.BytesIO(
+            b'title,time_minutes,price,link,tags,ingredient\r\n'
+            b'Curry,20,7.50,,Vegan|Spicy,Rice\r\n'
+            b'Toast,3,0.99,https://example.com,,\r\n'
+        )
+
+        result = importer.import_recipes(self.user, stream, 'csv')
+
+        self.assertEqual(result.created, 2)
+        curry = Recipe.objects.get(title='Curry')
+        self.assertEqual(
+            sorted(curry.tags.values_list('name', flat=True)), ['Spicy', 'Vegan']
+        )
+        self.assertEqual(Recipe.objects.get(title='Toast').tags.count(), 0)
+
+    def test_invalid_records_reported(self):
+        stream = io.BytesIO(
+            json.dumps(sample_record()).encode() + b'\n'
+            b'not json\n'
+            + json.dumps(sample_record(price='lots')).encode() + b'\n'
+        )
+
+        result = importer.import_recipes(self.user, stream, 'ndjson')
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.failed, 2)
+        self.assertEqual([error['line'] for error in result.errors], [2, 3])
+        self.assertIn('price', result.errors[1]['errors'])
+
+    def test_resume(self):
+        """Skipped records are neither validated nor imported"""
+        stream = ndjson(sample_record('One'), sample_record('Two'), sample_record('Three'))
+        progress = []
+
+        result = importer.import_recipes(
+            self.user, stream, 'ndjson', skip=1, batch_size=1,
+            progress=lambda result: progress.append(result.processed)
+        )
+
+        self.assertEqual(result.processed, 3)
+        self.assertEqual(progress, [2, 3, 3])
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)), ['Three', 'Two']
+        )
+
+    def test_queries_per_batch(self):
+        """The number of queries depends on the batches, not the records"""
+        def run(count):
+            records = [
+                sample_record(f'Recipe {i}', tags=[f'tag {i % 3}'])
+                for i in range(count)
+            ]
+            importer.import_recipes(
+                self.user, ndjson(*records), 'ndjson', batch_size=100
+            )
+
+        run(3)  # creates the tags
+        with CaptureQueriesContext(connection) as few:
+            run(10)
+        with CaptureQueriesContext(connection) as many:
+            run(40)
+        self.assertEqual(len(many), len(few))
+
+
+class RecipeImportAPITest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_import_upload(self):
+        upload = SimpleUploadedFile(
+            'recipes.ndjson', ndjson(sample_record(tags=['Vegan'])).getvalue()
+        )
+
+        res = self.client.post(IMPORT_URL, {'file': upload}, format='multipart')
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data['created'], 1)
+        self.assertEqual(Recipe.objects.get().user, self.user)
+
+    def test_export_round_trip(self):
+        """An export imports back into the same recipes"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=20, price='7.50'
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        exports = {
+            fmt: b''.join(self.client.get(EXPORT_URL, {'format': fmt}).streaming_content)
+            for fmt in importer.FORMATS
+        }
+        for fmt, content in exports.items():
+            upload = SimpleUploadedFile(f'recipes.{fmt}', content)
+            res = self.client.post(IMPORT_URL, {'file': upload}, format='multipart')
+            self.assertEqual(res.data['created'], 1, res.data)
+
+        self.assertEqual(Recipe.objects.filter(title='Curry').count(), 3)
+        self.assertEqual(Tag.objects.get().recipe_set.count(), 3)
+
+    def test_unknown_format(self):
+        upload = SimpleUploadedFile('recipes.txt', b'title\r\n')
+
+        res = self.client.post(IMPORT_URL, {'file': upload}, format='multipart')
+
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('file_format', res.data)
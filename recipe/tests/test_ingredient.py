@@ -5,7 +5,7 @@ from django.test import TestCase
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
 
 from recipe.serializers import IngredientSerializer
 
@@ -43,7 +43,7 @@ class PrivateIngredientApiTest(TestCase):
         ingredient = Ingredient.objects.all().order_by('-name')
         serializer = IngredientSerializer(ingredient, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredient_limmited_to_user(self):
         user2 = get_user_model().objects.create_user(
@@ -57,8 +57,8 @@ class PrivateIngredientApiTest(TestCase):
         res = self.client.get(INGREDIENT_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ing.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ing.name)
 
     def test_create_ingredient_successful(self):
         payload = {'name': 'cabbage'}
@@ -75,9 +75,21 @@ class PrivateIngredientApiTest(TestCase):
         res = self.client.post(INGREDIENT_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
-
-
-
-
-
-
+    def test_retrieve_ingredients_assigned_to_recipes(self):
+        ing1 = Ingredient.objects.create(user=self.user, name='Apple')
+        ing2 = Ingredient.objects.create(user=self.user, name='Turkey')
+        for i in range(2):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'recipe {i}',
+                time_minutes=5,
+                price=3.00
+            )
+            recipe.ingredient.add(ing1)
+
+        res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
+
+        self.assertEqual(
+            res.data['results'], [IngredientSerializer(ing1).data]
+        )
+        self.assertNotIn(IngredientSerializer(ing2).data, res.data['results'])
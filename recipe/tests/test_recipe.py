@@ -1,7 +1,10 @@
+import itertools
 from PIL import Image
 import tempfile
 import os
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
@@ -13,6 +16,8 @@ from rest_framework.response import Response
 from core.models import Recipe, Tag, Ingredient
 
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer, RecipeImageSerializer
+from recipe import facets
+from recipe.tests.helpers import assert_constant_queries, run_on_commit
 
 RECIPE_URL = reverse('recipe:recipe-list')
 
@@ -65,6 +70,7 @@ class PrivateRecipeAPITest(TestCase):
             password='pass123'
         )
         self.client.force_authenticate(user=self.user)
+        facets.clear_indexes()
 
     def test_retrieve_Recipe(self):
         sample_recipe(user=self.user)
@@ -75,7 +81,7 @@ class PrivateRecipeAPITest(TestCase):
         recipe = Recipe.objects.all()
         serializer = RecipeSerializer(recipe, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_limited_to_user(self):
         user2 = get_user_model().objects.create(
@@ -89,8 +95,8 @@ class PrivateRecipeAPITest(TestCase):
         recipe = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipe, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_detail(self):
         recipe = sample_recipe(self.user)
@@ -104,6 +110,11 @@ class PrivateRecipeAPITest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_recipe_detail_malformed_id(self):
+        res = self.client.get(detail_url('abc'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_recipe_create(self):
         payload = {
             'title': 'Briyani',
@@ -157,6 +168,136 @@ class PrivateRecipeAPITest(TestCase):
         self.assertIn(ingredient1, ingredients)
         self.assertIn(ingredient2, ingredients)
 
+    def test_recipe_create_resolves_ingredients_in_one_query(self):
+        def create(count):
+            ingredients = [
+                sample_ingredient(self.user, name=f'ingredient {count}.{i}')
+                for i in range(count)
+            ]
+            payload = {
+                'title': 'Many ingredients',
+                'time_minutes': 5,
+                'price': 10.00,
+                'tags': [],
+                'ingredient': [ingredient.id for ingredient in ingredients],
+            }
+            with CaptureQueriesContext(connection) as ctx, run_on_commit():
+                res = self.client.post(RECIPE_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(create(2), create(30))
+
+    def test_recipe_create_rejects_other_users_tags(self):
+        user2 = get_user_model().objects.create(
+            email='other@gmail.com',
+            password='12344556'
+        )
+        tag = sample_tag(user=user2)
+        payload = {
+            'title': 'Borrowed tag',
+            'tags': [tag.id],
+            'time_minutes': 5,
+            'price': 10.00,
+        }
+
+        res = self.client.post(RECIPE_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_recipe_create_reports_all_missing_ids(self):
+        tag = sample_tag(user=self.user)
+        payload = {
+            'title': 'Missing tags',
+            'tags': [tag.id, 9998, 9999],
+            'ingredient': [],
+            'time_minutes': 5,
+            'price': 10.00,
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data['tags']), 2)
+        self.assertIn('9998', res.data['tags'][0])
+        self.assertIn('9999', res.data['tags'][1])
+
+    def test_recipe_create_with_tag_names(self):
+        """Names and ids can be mixed, existing names are reused in any case"""
+        vegan = sample_tag(user=self.user, name='Vegan')
+        quick = sample_tag(user=self.user, name='Quick')
+        payload = {
+            'title': 'Named tags',
+            'tags': ['vegan', quick.id, 'Dessert', {'name': 'dessert'}],
+            'ingredient': ['Salt'],
+            'time_minutes': 5,
+            'price': 10.00,
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        dessert = Tag.objects.get(user=self.user, name='Dessert')
+        self.assertEqual(
+            set(recipe.tags.all()), {vegan, quick, dessert}
+        )
+        self.assertEqual(sorted(res.data['tags']), sorted([vegan.id, quick.id, dessert.id]))
+        self.assertEqual(recipe.ingredient.get().name, 'Salt')
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_recipe_create_with_all_digit_tag_name(self):
+        """{"name": ...} is a name even when it looks like an id"""
+        tag = sample_tag(user=self.user, name='Vegan')
+        payload = {
+            'title': 'Numbered tag',
+            'tags': [{'name': str(tag.id)}, {'name': '1990'}],
+            'ingredient': [],
+            'time_minutes': 5,
+            'price': 10.00,
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            sorted(['1990', str(tag.id)])
+        )
+
+    def test_recipe_create_tag_names_in_constant_queries(self):
+        def create(count):
+            payload = {
+                'title': 'Many names',
+                'time_minutes': 5,
+                'price': 10.00,
+                'tags': [f'tag {count}.{i}' for i in range(count)],
+                'ingredient': [f'ingredient {count}.{i}' for i in range(count)],
+            }
+            with CaptureQueriesContext(connection) as ctx, run_on_commit():
+                res = self.client.post(RECIPE_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(create(2), create(30))
+
+    def test_recipe_create_rejects_blank_tag_name(self):
+        payload = {
+            'title': 'Blank tag',
+            'tags': ['  '],
+            'ingredient': [],
+            'time_minutes': 5,
+            'price': 10.00,
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data)
+        self.assertFalse(Tag.objects.exists())
+
     def test_partial_update_recipe(self):
         recipe = sample_recipe(user=self.user)
         recipe.tags.add(sample_tag(user=self.user))
@@ -211,9 +352,154 @@ class PrivateRecipeAPITest(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
+
+    def test_recipes_paginated_by_cursor(self):
+        recipes = [sample_recipe(user=self.user) for _ in range(3)]
+
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipes[0].id, recipes[1].id]
+        )
+        self.assertIsNone(res.data['previous'])
+
+        res = self.client.get(res.data['next'])
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipes[2].id]
+        )
+        self.assertIsNone(res.data['next'])
+
+    def test_filter_recipe_by_ingredient(self):
+        recipe1 = sample_recipe(self.user, title='Potato curry')
+        recipe2 = sample_recipe(self.user, title='Plain rice')
+        potato = sample_ingredient(self.user, name='Potato')
+        recipe1.ingredient.add(potato)
+
+        res = self.client.get(RECIPE_URL, {'ingredient': potato.id})
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipe1.id])
+        self.assertNotIn(recipe2.id, ids)
+
+    def test_filter_recipe_matching_all_tags(self):
+        vegan = sample_tag(self.user, name='Vegan')
+        quick = sample_tag(self.user, name='Quick')
+        both = sample_recipe(self.user, title='Salad')
+        both.tags.add(vegan, quick)
+        sample_recipe(self.user, title='Stew').tags.add(vegan)
+
+        res = self.client.get(
+            RECIPE_URL,
+            {'tags': f'{vegan.id},{quick.id}', 'match': 'all'}
+        )
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], [both.id]
+        )
+
+    def test_filter_recipe_excluding_tags(self):
+        meat = sample_tag(self.user, name='Meat')
+        steak = sample_recipe(self.user, title='Steak')
+        steak.tags.add(meat)
+        salad = sample_recipe(self.user, title='Salad')
+
+        res = self.client.get(RECIPE_URL, {'exclude_tags': meat.id})
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], [salad.id]
+        )
+
+    def test_filter_recipe_by_ranges(self):
+        sample_recipe(self.user, time_minutes=5, price=2.00)
+        match = sample_recipe(self.user, time_minutes=20, price=8.00)
+        sample_recipe(self.user, time_minutes=60, price=8.00)
+
+        res = self.client.get(RECIPE_URL, {
+            'time_minutes_min': 10,
+            'time_minutes_max': 30,
+            'price_min': '5.00',
+        })
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], [match.id]
+        )
+
+    def test_filter_recipe_invalid_params(self):
+        res = self.client.get(RECIPE_URL, {'match': 'some'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPE_URL, {'tags': 'a,b'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPE_URL, {'facets': 'x'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_sees_tags_added_after_first_use(self):
+        tag = sample_tag(self.user)
+        recipe = sample_recipe(self.user)
+        res = self.client.get(RECIPE_URL, {'tags': tag.id})
+        self.assertEqual(res.data['results'], [])
+
+        with run_on_commit():
+            recipe.tags.add(tag)
+        res = self.client.get(RECIPE_URL, {'tags': tag.id})
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], [recipe.id]
+        )
+
+    def test_list_facet_counts(self):
+        vegan = sample_tag(self.user, name='Vegan')
+        quick = sample_tag(self.user, name='Quick')
+        rice = sample_ingredient(self.user, name='Rice')
+        recipe1 = sample_recipe(self.user, price=2.00)
+        recipe1.tags.add(vegan, quick)
+        recipe1.ingredient.add(rice)
+        recipe2 = sample_recipe(self.user, price=3.00)
+        recipe2.tags.add(vegan)
+        sample_recipe(self.user, price=9.00).tags.add(quick)
+
+        res = self.client.get(RECIPE_URL, {'facets': 1, 'price_max': '5'})
+
+        self.assertEqual(res.data['facets'], {
+            'tags': {vegan.id: 2, quick.id: 1},
+            'ingredient': {rice.id: 1},
+        })
+
+    def test_list_query_count_is_constant(self):
+        """Listing recipes must not issue a query per recipe"""
+        names = itertools.count()
+
+        def populate():
+            name = f'name {next(names)}'
+            with run_on_commit():
+                recipe = sample_recipe(user=self.user)
+                recipe.tags.add(sample_tag(user=self.user, name=name))
+                recipe.ingredient.add(sample_ingredient(user=self.user, name=name))
+
+        # catalog version, recipes, then one prefetch each for tags and
+        # ingredients
+        assert_constant_queries(
+            self, 4, lambda: self.client.get(RECIPE_URL), populate
+        )
+
+    def test_detail_query_count_is_constant(self):
+        """Retrieving a recipe costs the same however many tags it has"""
+        recipe = sample_recipe(user=self.user)
+        names = itertools.count()
+
+        def populate():
+            name = f'name {next(names)}'
+            recipe.tags.add(sample_tag(user=self.user, name=name))
+            recipe.ingredient.add(sample_ingredient(user=self.user, name=name))
+
+        assert_constant_queries(
+            self, 4, lambda: self.client.get(detail_url(recipe.id)), populate
+        )
 
 
 
@@ -0,0 +1,142 @@
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe import facets, response_cache, versioning
+from recipe.tests.helpers import run_on_commit, sample_recipe, sample_user
+
+RECIPE_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+CACHE_DIR = tempfile.mkdtemp()
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+    }
+}
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ResponseCacheTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        response_cache.get_cache().clear()
+        facets.clear_indexes()
+
+        with run_on_commit():
+            self.recipe = sample_recipe(self.user)
+            self.tag = Tag.objects.create(user=self.user, name='Vegan')
+            self.recipe.tags.add(self.tag)
+            self.recipe.ingredient.add(
+                Ingredient.objects.create(user=self.user, name='Salt')
+            )
+
+    def assert_cached(self, url):
+        """The response is served with only the catalog version lookup"""
+        first = self.client.get(url)
+        with self.assertNumQueries(1):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, first.content)
+        return res
+
+    def test_list_cached(self):
+        self.client.get(RECIPE_URL)
+
+        res = self.assert_cached(RECIPE_URL)
+        self.assertEqual(res.json()['results'][0]['id'], self.recipe.id)
+
+    def test_list_cached_per_query(self):
+        self.client.get(RECIPE_URL)
+
+        res = self.client.get(RECIPE_URL, {'tags': str(self.tag.id + 1)})
+        self.assertEqual(res.json()['results'], [])
+
+    def test_list_invalidated_by_recipe_change(self):
+        self.client.get(RECIPE_URL)
+        with run_on_commit():
+            sample_recipe(self.user, title='Curry')
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.json()['results']), 2)
+
+    def test_detail_cached(self):
+        res = self.assert_cached(detail_url(self.recipe.id))
+        self.assertEqual(res.json()['tags'][0]['name'], 'Vegan')
+
+    def test_detail_invalidated_by_tag_rename(self):
+        self.client.get(detail_url(self.recipe.id))
+        self.tag.name = 'Vegetarian'
+        self.tag.save()
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.json()['tags'][0]['name'], 'Vegetarian')
+
+    def test_detail_invalidated_by_tag_delete(self):
+        self.client.get(detail_url(self.recipe.id))
+        self.tag.delete()
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.json()['tags'], [])
+
+    def test_detail_invalidated_by_membership_change(self):
+        self.client.get(detail_url(self.recipe.id))
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Quick'))
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(len(res.json()['tags']), 2)
+
+    def test_detail_invalidated_by_bulk_update(self):
+        self.client.get(detail_url(self.recipe.id))
+        self.client.patch(
+            BULK_URL, [{'id': self.recipe.id, 'title': 'Renamed'}], format='json'
+        )
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.json()['title'], 'Renamed')
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_detail_survives_unrelated_change(self):
+        """With a shared cache, changing another recipe leaves this one's entry"""
+        self.addCleanup(shutil.rmtree, CACHE_DIR, ignore_errors=True)
+        self.client.get(detail_url(self.recipe.id))
+        with run_on_commit():
+            other = sample_recipe(self.user, title='Curry')
+            other.tags.add(Tag.objects.create(user=self.user, name='Spicy'))
+
+        self.assert_cached(detail_url(self.recipe.id))
+
+    def test_detail_sees_change_from_other_process(self):
+        """A per-process cache can't hear of other processes' changes"""
+        self.client.get(detail_url(self.recipe.id))
+        # as another process would: the row and version change, but this
+        # process's generations are left alone
+        Recipe.objects.filter(id=self.recipe.id).update(title='Renamed')
+        versioning.bump(self.user.id)
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.json()['title'], 'Renamed')
+
+    def test_not_shared_between_users(self):
+        self.client.get(RECIPE_URL)
+        other = sample_user('other@gmail.com')
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.json()['results'], [])
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.status_code, 404)
@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe import serializers
+from recipe.querysets import optimize_for_serializer
+from recipe.rows import row_serializer
+
+
+def render_both(serializer_class, queryset):
+    """JSON of the DRF serializer and of its row serializer for queryset"""
+    instances = optimize_for_serializer(queryset, serializer_class)
+    expected = serializer_class(instances, many=True).data
+    rows = row_serializer(serializer_class)
+    actual = rows.to_representation(rows.values(queryset))
+    return JSONRenderer().render(expected), JSONRenderer().render(actual)
+
+
+class RowSerializerTest(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123'
+        )
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Quick', 'Dessert')
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Salt', 'Rice')
+        ]
+        self.curry = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=25,
+            price=Decimal('7.5'), link='https://example.com/curry'
+        )
+        self.curry.tags.add(tags[2], tags[0])
+        self.curry.ingredient.add(*ingredients)
+        Recipe.objects.create(
+            user=self.user, title='Toast', time_minutes=3, price=Decimal('0.99')
+        )
+
+    def test_tags_and_ingredients(self):
+        for serializer_class in (
+            serializers.TagSerializer, serializers.IngredientSerializer
+        ):
+            queryset = serializer_class.Meta.model.objects.order_by('-name')
+            expected, actual = render_both(serializer_class, queryset)
+            self.assertEqual(actual, expected)
+
+    def test_recipes(self):
+        expected, actual = render_both(
+            serializers.RecipeSerializer, Recipe.objects.order_by('id')
+        )
+        self.assertEqual(actual, expected)
+        self.assertIn(b'"price":"7.50"', actual)
+
+    def test_recipe_details(self):
+        expected, actual = render_both(
+            serializers.RecipeDetailSerializer, Recipe.objects.order_by('id')
+        )
+        self.assertEqual(actual, expected)
+
+    def test_empty(self):
+        expected, actual = render_both(
+            serializers.RecipeSerializer, Recipe.objects.none()
+        )
+        self.assertEqual(actual, b'[]')
+        self.assertEqual(actual, expected)
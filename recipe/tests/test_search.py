@@ -0,0 +1,154 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core.models import Recipe, RecipeSearchToken, Tag, Ingredient
+
+from recipe import search
+from recipe.tests.helpers import run_on_commit, sample_recipe, sample_user
+
+SEARCH_URL = reverse('recipe:recipe-search')
+
+
+class SearchIndexTest(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+
+    def test_tokenize(self):
+        self.assertEqual(
+            search.tokenize('Potato, Pea & Chilli-Curry'),
+            ['potato', 'pea', 'chilli', 'curry']
+        )
+
+    def test_prefix_match_all_terms(self):
+        curry = sample_recipe(self.user, 'Potato curry', commit=True)
+        sample_recipe(self.user, 'Potato salad', commit=True)
+
+        self.assertEqual(
+            search.rank_recipes(self.user.id, 'pot cur'), [curry.id]
+        )
+
+    def test_prefix_taken_literally(self):
+        underscored = sample_recipe(self.user, 'Mole_poblano', commit=True)
+        sample_recipe(self.user, 'Molexpoblano', commit=True)
+        accented = sample_recipe(self.user, 'Crème brûlée', commit=True)
+
+        self.assertEqual(
+            search.rank_recipes(self.user.id, 'mole_'), [underscored.id]
+        )
+        self.assertEqual(search.rank_recipes(self.user.id, 'brû'), [accented.id])
+
+    def test_title_ranks_above_ingredient(self):
+        in_title = sample_recipe(self.user, 'Garlic bread', commit=True)
+        in_ingredient = sample_recipe(self.user, 'Pasta', commit=True)
+        with run_on_commit():
+            in_ingredient.ingredient.add(
+                Ingredient.objects.create(user=self.user, name='Garlic')
+            )
+
+        self.assertEqual(
+            search.rank_recipes(self.user.id, 'garlic'),
+            [in_title.id, in_ingredient.id]
+        )
+
+    def test_tag_rename_reindexes_recipes(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = sample_recipe(self.user, 'Salad', commit=True)
+        with run_on_commit():
+            recipe.tags.add(tag)
+        self.assertEqual(search.rank_recipes(self.user.id, 'vegan'), [recipe.id])
+
+        tag.name = 'Plant based'
+        with run_on_commit():
+            tag.save()
+
+        self.assertEqual(search.rank_recipes(self.user.id, 'vegan'), [])
+        self.assertEqual(search.rank_recipes(self.user.id, 'plant'), [recipe.id])
+
+    def test_tag_removed_from_recipe(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = sample_recipe(self.user, 'Salad', commit=True)
+        with run_on_commit():
+            recipe.tags.add(tag)
+
+        with run_on_commit():
+            recipe.tags.remove(tag)
+
+        self.assertEqual(search.rank_recipes(self.user.id, 'vegan'), [])
+
+    def test_rebuild_command(self):
+        recipe = sample_recipe(self.user, 'Lemon rice', commit=True)
+        RecipeSearchToken.objects.all().delete()
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        self.assertEqual(search.rank_recipes(self.user.id, 'lemon'), [recipe.id])
+
+
+class SearchApiTest(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_login_required(self):
+        res = APIClient().get(SEARCH_URL, {'q': 'rice'})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_search_limited_to_user(self):
+        user2 = sample_user('other@gmail.com')
+        sample_recipe(user2, 'Lemon rice', commit=True)
+        recipe = sample_recipe(self.user, 'Curd rice', commit=True)
+
+        res = self.client.get(SEARCH_URL, {'q': 'rice'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in res.data['results']], [recipe.id]
+        )
+
+    def test_search_applies_filters(self):
+        sample_recipe(self.user, 'Quick rice', commit=True)
+        with run_on_commit():
+            slow = Recipe.objects.create(
+                user=self.user, title='Slow rice', time_minutes=90, price=5.00
+            )
+
+        res = self.client.get(SEARCH_URL, {'q': 'rice', 'time_minutes_min': 60})
+
+        self.assertEqual(
+            [item['id'] for item in res.data['results']], [slow.id]
+        )
+
+    def test_empty_query(self):
+        sample_recipe(self.user, 'Curd rice', commit=True)
+        res = self.client.get(SEARCH_URL, {'q': ''})
+        self.assertEqual(res.data['results'], [])
+
+    def test_create_indexes_recipe_once(self):
+        """A recipe's save and tag/ingredient changes reindex it on commit, once"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        payload = {
+            'title': 'Lemon rice',
+            'time_minutes': 10,
+            'price': '5.00',
+            'tags': [tag.id],
+            'ingredient': ['Lemon', 'Rice'],
+        }
+
+        with patch.object(search, 'index_recipes', wraps=search.index_recipes) as index:
+            with run_on_commit():
+                res = self.client.post(reverse('recipe:recipe-list'), payload)
+                index.assert_not_called()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        index.assert_called_once()
+        self.assertEqual(search.rank_recipes(self.user.id, 'vegan lem'), [res.data['id']])
@@ -1,4 +1,6 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
@@ -43,7 +45,7 @@ class PrivateTagApiTest(TestCase):
         tags = Tag.objects.all().order_by('-name')
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         user2 = get_user_model().objects.create_user(
@@ -57,8 +59,8 @@ class PrivateTagApiTest(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
+        self.assertEqual(len(res.data['results']), 1)
 
     def test_create_tag_successful(self):
         payload = {'name': 'Simple'}
@@ -66,6 +68,17 @@ class PrivateTagApiTest(TestCase):
         tag = Tag.objects.filter(user=self.user, name=payload['name']).exists()
         self.assertTrue(tag)
 
+    def test_create_existing_tag_returns_it(self):
+        """Creating a tag whose name exists, in any case, is a no-op"""
+        tag = Tag.objects.create(user=self.user, name='Simple')
+
+        res = self.client.post(TAGS_URL, {'name': 'SIMPLE'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['id'], tag.id)
+        self.assertEqual(res.data['name'], 'Simple')
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
     def test_create_tag_invalid(self):
         payload = {'name':''}
         res = self.client.post(TAGS_URL, payload)
@@ -85,8 +98,46 @@ class PrivateTagApiTest(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only':1})
         serializer1 = TagSerializer(tag1)
         serializer2 = TagSerializer(tag2)
-        self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer2.data, res.data['results'])
+
+    def test_assigned_only_invalid_value(self):
+        res = self.client.get(TAGS_URL, {'assigned_only': 'yes'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('assigned_only', res.data)
+
+    def test_assigned_tags_unique_without_distinct(self):
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'recipe {i}',
+                time_minutes=5,
+                price=3.00
+            )
+            recipe.tags.add(tag)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertNotIn('DISTINCT', ctx.captured_queries[-1]['sql'])
+
+    def test_tags_paginated_by_cursor(self):
+        for name in ('Breakfast', 'Lunch', 'Dinner'):
+            Tag.objects.create(user=self.user, name=name)
+
+        names = []
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            names += [tag['name'] for tag in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(names, ['Lunch', 'Dinner', 'Breakfast'])
 
 
 
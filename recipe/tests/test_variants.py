@@ -0,0 +1,153 @@
+import io
+import os
+import shutil
+import tempfile
+import uuid
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+
+from core.models import Recipe
+
+from recipe import variants
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def variant_url(image_name, width, height, fmt='jpg'):
+    image_id, ext = os.path.basename(image_name).split('.')
+    return reverse(
+        'recipe-image-variant', args=[image_id, ext, width, height, fmt]
+    )
+
+
+def jpeg_bytes(size):
+    buffer = io.BytesIO()
+    Image.new('RGB', size=size).save(buffer, format='jpeg')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeImageVariantTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123'
+        )
+        self.recipe = Recipe.objects.create(
+            user=user, title='Sample recipe', time_minutes=10, price=5.00
+        )
+        self.recipe.image.save('photo.jpg', ContentFile(jpeg_bytes((400, 200))))
+
+    def test_variant_resized_and_cached(self):
+        res = self.client.get(variant_url(self.recipe.image.name, 100, 100))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        with Image.open(io.BytesIO(b''.join(res.streaming_content))) as img:
+            self.assertEqual(img.size, (100, 50))
+
+        etag = res['ETag'].strip('"')
+        image_id = os.path.splitext(os.path.basename(self.recipe.image.name))[0]
+        cached = variants.get_cache().path(image_id, etag, 'jpg')
+        self.assertTrue(os.path.exists(cached))
+
+    def test_revalidation_not_modified(self):
+        url = variant_url(self.recipe.image.name, 100, 100)
+        res = self.client.get(url)
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.client.get(
+            url,
+            HTTP_IF_MODIFIED_SINCE=res['Last-Modified']
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_new_image_changes_url_and_etag(self):
+        old_name = self.recipe.image.name
+        etag = self.client.get(variant_url(old_name, 100, 100))['ETag']
+        self.recipe.image.save('other.jpg', ContentFile(jpeg_bytes((10, 10))))
+
+        res = self.client.get(
+            variant_url(self.recipe.image.name, 100, 100), HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertNotEqual(self.recipe.image.name, old_name)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_unsupported_requests(self):
+        name = self.recipe.image.name
+        self.assertEqual(
+            self.client.get(variant_url(name, 0, 100)).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+        self.assertEqual(
+            self.client.get(variant_url(name, 100, 100, 'gif')).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+
+    @override_settings(RECIPE_IMAGE_VARIANTS={'SIZES': ((100, 100),)})
+    def test_only_configured_sizes(self):
+        name = self.recipe.image.name
+        self.assertEqual(
+            self.client.get(variant_url(name, 100, 100)).status_code,
+            status.HTTP_200_OK
+        )
+        self.assertEqual(
+            self.client.get(variant_url(name, 101, 100)).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+
+    def test_unknown_image(self):
+        """Variants are only served for an existing image's own name"""
+        self.assertEqual(
+            self.client.get(variant_url(f'{uuid.uuid4()}.jpg', 100, 100)).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+        image_id = os.path.splitext(os.path.basename(self.recipe.image.name))[0]
+        self.assertEqual(
+            self.client.get(variant_url(f'{image_id}.png', 100, 100)).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+
+
+class VariantCacheTest(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def put(self, cache, name, mtime):
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(b'x' * 100)
+
+        path = cache.path(1, name, 'jpg')
+        cache.put(path, write)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_least_recently_used_evicted(self):
+        cache = variants.VariantCache(self.root, max_bytes=250)
+        first = self.put(cache, 'first', 1)
+        second = self.put(cache, 'second', 2)
+        cache.get(first)
+
+        third = self.put(cache, 'third', 3)
+
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertTrue(os.path.exists(third))
@@ -0,0 +1,185 @@
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+from recipe import facets, versioning
+from recipe.tests.helpers import run_on_commit, sample_recipe, sample_user
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class CatalogVersionTest(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        facets.clear_indexes()
+
+    def test_changes_bump_version(self):
+        """Saving recipes, tags and memberships each moves the version"""
+        start = versioning.current_version(self.user.id)
+        recipe = sample_recipe(self.user, commit=True)
+        after_recipe = versioning.current_version(self.user.id)
+        with run_on_commit():
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+        after_tag = versioning.current_version(self.user.id)
+        with run_on_commit():
+            recipe.tags.add(tag)
+        after_link = versioning.current_version(self.user.id)
+
+        self.assertLess(start, after_recipe)
+        self.assertLess(after_recipe, after_tag)
+        self.assertLess(after_tag, after_link)
+
+    def test_other_users_version_untouched(self):
+        other = sample_user('other@gmail.com')
+        start = versioning.current_version(other.id)
+        sample_recipe(self.user, commit=True)
+
+        self.assertEqual(versioning.current_version(other.id), start)
+
+    def test_stale_facet_index_rebuilt(self):
+        """An index built for an older version is not served"""
+        recipe = sample_recipe(self.user, commit=True)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        index = facets.get_index(self.user.id)
+
+        # simulate a change the index never heard of, eg. from another process
+        Recipe.tags.through.objects.filter(recipe=recipe).delete()
+        versioning.bump(self.user.id)
+
+        fresh = facets.get_index(self.user.id)
+        self.assertIsNot(fresh, index)
+        self.assertEqual(fresh.recipes(fresh.bitmap('tags', [tag.id])), [])
+
+    def test_api_create_bumps_version_once(self):
+        """A recipe's save and its tag/ingredient changes are one change"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        start = versioning.current_version(self.user.id)
+
+        with run_on_commit():
+            res = client.post(RECIPE_URL, {
+                'title': 'Curry',
+                'time_minutes': 10,
+                'price': '5.00',
+                'tags': ['Vegan'],
+                'ingredient': ['Rice', 'Salt'],
+            }, format='json')
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(versioning.current_version(self.user.id), start + 1)
+
+    def test_rolled_back_change_leaves_index(self):
+        with run_on_commit():
+            recipe = sample_recipe(self.user)
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+        index = facets.get_index(self.user.id)
+        start = versioning.current_version(self.user.id)
+
+        with run_on_commit():
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                recipe.tags.add(tag)
+                raise RuntimeError
+
+        self.assertEqual(versioning.current_version(self.user.id), start)
+        self.assertIs(facets.get_index(self.user.id), index)
+        self.assertEqual(index.recipes(index.bitmap('tags', [tag.id])), [])
+
+    def test_rolled_back_savepoint_left_out_of_index(self):
+        """A change kept alongside a rolled back one only applies its own"""
+        with run_on_commit():
+            recipe1 = sample_recipe(self.user)
+            recipe2 = sample_recipe(self.user)
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+        index = facets.get_index(self.user.id)
+        start = versioning.current_version(self.user.id)
+
+        with run_on_commit():
+            with transaction.atomic():
+                recipe1.tags.add(tag)
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    recipe2.tags.add(tag)
+                    raise RuntimeError
+
+        self.assertEqual(list(tag.recipe_set.all()), [recipe1])
+        self.assertEqual(versioning.current_version(self.user.id), start + 1)
+        self.assertIs(facets.get_index(self.user.id), index)
+        self.assertEqual(
+            index.recipes(index.bitmap('tags', [tag.id])), [recipe1.id]
+        )
+
+
+class CatalogETagTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        facets.clear_indexes()
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_list_not_modified(self):
+        sample_recipe(self.user, commit=True)
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Authorization', res['Vary'])
+        res2 = self.revalidate(RECIPE_URL, res['ETag'])
+        self.assertEqual(res2.status_code, 304)
+        self.assertEqual(res2['ETag'], res['ETag'])
+        self.assertEqual(res2.content, b'')
+
+    def test_recipe_change_invalidates(self):
+        recipe = sample_recipe(self.user, commit=True)
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        recipe.title = 'Renamed'
+        with run_on_commit():
+            recipe.save()
+
+        res = self.revalidate(RECIPE_URL, etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_membership_change_invalidates_detail(self):
+        recipe = sample_recipe(self.user, commit=True)
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+        etag = self.client.get(url)['ETag']
+
+        with run_on_commit():
+            recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_tag_change_invalidates_tag_list(self):
+        with run_on_commit():
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+        self.assertEqual(self.revalidate(TAGS_URL, etag).status_code, 304)
+
+        tag.name = 'Vegetarian'
+        with run_on_commit():
+            tag.save()
+
+        self.assertEqual(self.revalidate(TAGS_URL, etag).status_code, 200)
+
+    def test_etag_depends_on_query(self):
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        res = self.revalidate(RECIPE_URL + '?facets=1', etag)
+        self.assertEqual(res.status_code, 200)
+
+    def test_etag_per_user(self):
+        etag = self.client.get(RECIPE_URL)['ETag']
+        other = sample_user('other@gmail.com')
+        self.client.force_authenticate(other)
+
+        self.assertEqual(self.revalidate(RECIPE_URL, etag).status_code, 200)
@@ -6,6 +6,7 @@ router = DefaultRouter()
 router.register('tags', views.TagViewSet)
 router.register('ingredients', views.IngredientViewSet)
 router.register('recipes', views.RecipeViewSet)
+router.register('image-jobs', views.RecipeImageJobViewSet)
 
 app_name = 'recipe'
 
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import shutil
+import threading
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+DEFAULTS = {
+    # directory the generated variants are cached in, MEDIA_ROOT/cache if None
+    'CACHE_ROOT': None,
+    'MAX_BYTES': 256 * 1024 * 1024,
+    # (width, height) boxes variants may be requested for
+    'SIZES': ((100, 100), (200, 200), (600, 600), (1200, 1200)),
+    'QUALITY': 80,
+}
+
+# storage directory of recipe images, see core.models.recipe_image_life_path
+SOURCE_DIR = 'uploads/recipe'
+
+# url extension -> (Pillow format, content type)
+FORMATS = {
+    'jpg': ('JPEG', 'image/jpeg'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+
+def variant_settings():
+    return {**DEFAULTS, **getattr(settings, 'RECIPE_IMAGE_VARIANTS', {})}
+
+
+def cache_root():
+    return variant_settings()['CACHE_ROOT'] or os.path.join(settings.MEDIA_ROOT, 'cache')
+
+
+def source_name(image_id, ext):
+    """Storage name of the recipe image named image_id.ext"""
+    return os.path.join(SOURCE_DIR, f'{image_id}.{ext}')
+
+
+def allowed_size(width, height):
+    return (width, height) in {tuple(size) for size in variant_settings()['SIZES']}
+
+
+def supported(fmt):
+    """Whether Pillow in this build can write the url extension fmt"""
+    Image.init()
+    return fmt in FORMATS and FORMATS[fmt][0] in Image.SAVE
+
+
+def variant_etag(image_name, width, height, fmt):
+    """Validator that changes whenever the source image or the variant does"""
+    key = f'{image_name}:{width}x{height}.{fmt}'
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+class VariantCache:
+    """Generated image variants on disk, evicting least recently used files"""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.size = None
+
+    def path(self, image_id, etag, fmt):
+        return os.path.join(self.root, 'recipe', str(image_id), f'{etag}.{fmt}')
+
+    def get(self, path):
+        """Return path if cached, marking it as recently used"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, path, write):
+        """Create path by calling write(tmp_path), then enforce the size bound"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _, size, _ in self._files())
+            else:
+                self.size += os.path.getsize(path)
+            if self.size > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def purge(self, image_id):
+        """Delete the variants of the image"""
+        shutil.rmtree(
+            os.path.join(self.root, 'recipe', str(image_id)), ignore_errors=True
+        )
+        with self.lock:
+            # recounted on the next put
+            self.size = None
+
+    def _files(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _evict(self, keep):
+        """Delete the oldest files until the cache is back under 90% of its bound"""
+        files = sorted(self._files(), key=lambda item: item[2])
+        self.size = sum(size for _, size, _ in files)
+        target = self.max_bytes * 0.9
+        for path, size, _ in files:
+            if self.size <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache():
+    root = cache_root()
+    with _caches_lock:
+        cache = _caches.get(root)
+        if cache is None:
+            cache = _caches[root] = VariantCache(
+                root, variant_settings()['MAX_BYTES']
+            )
+    return cache
+
+
+def render_variant(source_path, width, height, fmt):
+    """Return a function writing the source image fitted into width x height"""
+    def write(path):
+        with Image.open(source_path) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail((width, height))
+            image.save(
+                path,
+                format=FORMATS[fmt][0],
+                quality=variant_settings()['QUALITY']
+            )
+    return write
+
+
+def get_variant(image_id, source_path, etag, width, height, fmt):
+    """Path of the cached variant, generating it on first request"""
+    cache = get_cache()
+    path = cache.path(image_id, etag, fmt)
+    return cache.get(path) or cache.put(
+        path, render_variant(source_path, width, height, fmt)
+    )
+
+
+def purge(image_name):
+    """Delete the cached variants of the recipe image stored as image_name"""
+    image_id = os.path.splitext(os.path.basename(image_name))[0]
+    get_cache().purge(image_id)
@@ -1,89 +1,395 @@
+import os
+
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.reverse import reverse
 from rest_framework import status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import viewsets, mixins
+from django.db.models import Exists, OuterRef, prefetch_related_objects
+
+from core.models import Tag, Ingredient, Recipe, RecipeImageJob
+from core.renderers import CSVRenderer, NDJSONRenderer
+from user.authentication import CachedTokenAuthentication
+from . import bulk, serializers, search, images, importer, variants
+from .filters import RecipeFilterBackend, facet_counts, parse_flag
+from .pagination import RecipeAttrPagination, RecipePagination
+from .querysets import optimize_for_serializer
+from .response_cache import cache_detail, cache_list
+from .rows import row_serializer
+from .versioning import catalog_etag
+
+
+class BulkModelMixin:
+    """Adds a bulk/ route writing many objects in one transaction
+
+    POST creates, PATCH updates (each item carries its id) and DELETE
+    removes the objects listed in {"ids": [...]}.
+    """
+    # serializer rendering the objects written by a bulk request
+    bulk_response_serializer_class = None
+    # relations to prefetch before rendering them
+    bulk_prefetch = ()
+
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False)
+    def bulk(self, request):
+        if request.method == 'DELETE':
+            return self.bulk_destroy(request)
+
+        partial = request.method == 'PATCH'
+        serializer = self.get_serializer(
+            self.get_queryset() if partial else None,
+            data=request.data,
+            many=True,
+            partial=partial
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                if partial:
+                    objs = serializer.save()
+                else:
+                    objs = serializer.save(user=self.request.user)
+        except IntegrityError:
+            # eg. renaming a tag to the name of another one
+            return Response(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    'The changes conflict with existing objects.'
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        prefetch_related_objects(objs, *self.bulk_prefetch)
+        response_serializer = self.bulk_response_serializer_class(
+            objs, many=True, context=self.get_serializer_context()
+        )
+        return Response(
+            response_serializer.data,
+            status=status.HTTP_200_OK if partial else status.HTTP_201_CREATED
+        )
+
+    def bulk_destroy(self, request):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+            return Response(
+                {'ids': ['Expected a list of ids.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            self.perform_bulk_destroy(self.get_queryset().filter(id__in=ids))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def perform_bulk_destroy(self, queryset):
+        queryset.delete()
 
-from core.models import Tag, Ingredient, Recipe
-from . import serializers
 
+class RowSerializerMixin:
+    """Renders the read-only actions from values() rows, see recipe.rows"""
+    row_actions = ('list', 'retrieve')
 
-class BaseRecipeAttrViewSet(mixins.ListModelMixin, mixins.CreateModelMixin,
+    def get_row_serializer(self):
+        if self.action not in self.row_actions:
+            return None
+        return row_serializer(self.get_serializer_class())
+
+    def list_response(self, queryset):
+        """Paginated response listing the filtered queryset"""
+        rows = self.get_row_serializer()
+        if rows is None:
+            page = self.paginate_queryset(queryset)
+            data = self.get_serializer(page, many=True).data
+        else:
+            page = self.paginate_queryset(rows.values(queryset))
+            data = rows.to_representation(page)
+        return self.get_paginated_response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    def retrieve(self, request, *args, **kwargs):
+        rows = self.get_row_serializer()
+        if rows is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = rows.values(self.filter_queryset(self.get_queryset())).filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            # as get_object_or_404 answers a malformed lookup value
+            raise Http404
+        data = rows.to_representation(queryset[:1])
+        if not data:
+            raise Http404
+        return Response(data[0])
+
+
+class BaseRecipeAttrViewSet(BulkModelMixin, RowSerializerMixin,
+                            mixins.ListModelMixin, mixins.CreateModelMixin,
                             viewsets.GenericViewSet):
     permission_classes = (IsAuthenticated,)
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
+    pagination_class = RecipeAttrPagination
 
     def get_queryset(self):
         """overriding the queryset method to list the query objects"""
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
-        )
         queryset = self.queryset
-        if assigned_only:
-            queryset= queryset.filter(recipe__isnull=False)
-            
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
+        if parse_flag(self.request.query_params, 'assigned_only'):
+            assigned = self.recipe_through.objects.filter(
+                **{self.recipe_through_field: OuterRef('pk')}
+            )
+            queryset = queryset.filter(Exists(assigned))
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        return queryset.filter(user=self.request.user).order_by('-name')
+
+    @catalog_etag
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def create(self, request, *args, **kwargs):
+        """create the object, or return the one already named so (any case)"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        obj, created = self.queryset.model.objects.get_or_create_by_name(
+            request.user, serializer.validated_data['name']
+        )
+        return Response(
+            self.get_serializer(obj).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
 
 
 # Create your views here.
 class TagViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.TagSerializer
+    bulk_response_serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    recipe_through = Recipe.tags.through
+    recipe_through_field = 'tag'
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientSerializer
+    bulk_response_serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+    recipe_through = Recipe.ingredient.through
+    recipe_through_field = 'ingredient'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    authentication_classes = (TokenAuthentication,)
+class RecipeViewSet(BulkModelMixin, RowSerializerMixin, viewsets.ModelViewSet):
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     serializer_class = serializers.RecipeSerializer
+    bulk_response_serializer_class = serializers.RecipeSerializer
+    bulk_prefetch = ('tags', 'ingredient')
     queryset = Recipe.objects.all()
-
-    def _params_to_int(self, qs):
-        return [int(str_id) for str_id in qs.split(',')]
+    pagination_class = RecipePagination
+    filter_backends = (RecipeFilterBackend,)
+    # actions whose response is rendered straight from the queryset
+    optimized_actions = ('list', 'retrieve', 'search')
+    # ranked candidates considered by a search before filters apply
+    search_candidates = 1000
+    # recipes fetched, with their tags/ingredients, per export query
+    export_chunk_size = 500
 
     def get_queryset(self):
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredient')
         queryset = self.queryset
 
-        if tags:
-            tags_id = self._params_to_int(tags)
-            queryset = queryset.filter(tags__id__in=tags_id)
-        if ingredients:
-            ingredient_id = self._params_to_int(ingredients)
-            queryset = queryset.filter(ingredient__id__in=ingredient_id)
+        if self.action in self.optimized_actions:
+            queryset = optimize_for_serializer(
+                queryset, self.get_serializer_class()
+            )
 
         return queryset.filter(user=self.request.user)
 
+    @catalog_etag
+    @cache_list
+    def list(self, request, *args, **kwargs):
+        """list recipes, with per tag/ingredient counts when ?facets=1"""
+        queryset = self.filter_queryset(self.get_queryset())
+        response = self.list_response(queryset)
+
+        if parse_flag(request.query_params, 'facets'):
+            response.data['facets'] = facet_counts(request.user.id, queryset)
+
+        return response
+
+    @catalog_etag
+    @cache_detail
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(methods=['GET'], detail=False)
+    def search(self, request):
+        """recipes matching ?q= on title, tag and ingredient names, best first"""
+        limit = self.paginator.get_page_size(request)
+        ranked = search.rank_recipes(
+            request.user.id,
+            request.query_params.get('q', ''),
+            self.search_candidates
+        )
+        queryset = self.filter_queryset(self.get_queryset())
+        recipes = {recipe.id: recipe for recipe in queryset.filter(id__in=ranked)}
+        matches = [recipes[recipe_id] for recipe_id in ranked if recipe_id in recipes]
+
+        serializer = self.get_serializer(matches[:limit], many=True)
+        return Response({'results': serializer.data})
+
+    @action(
+        methods=['GET'], detail=False,
+        renderer_classes=(NDJSONRenderer, CSVRenderer)
+    )
+    def export(self, request):
+        """stream all the user's recipes as ?format=ndjson or csv"""
+        rows = row_serializer(self.get_serializer_class())
+        recipes = rows.iterate(
+            self.filter_queryset(self.get_queryset()).order_by('id'),
+            self.export_chunk_size
+        )
+        renderer = request.accepted_renderer
+        if renderer.format == 'csv':
+            recipes = map(csv_record, recipes)
+
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.render_iter(recipes), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{renderer.format}"'
+        )
+        return response
+
+    @action(methods=['POST'], detail=False, url_path='import')
+    def import_recipes(self, request):
+        """import an uploaded NDJSON/CSV file, as produced by export"""
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = serializer.validated_data['file']
+        fmt = serializer.validated_data.get('file_format')
+        if fmt is None:
+            fmt = os.path.splitext(upload.name)[1].lstrip('.').lower()
+        if fmt not in importer.FORMATS:
+            return Response(
+                {'file_format': ['Could not tell the format from the file name.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        result = importer.import_recipes(
+            request.user, upload, fmt, serializer.validated_data['skip']
+        )
+        return Response(result.as_dict(), status=status.HTTP_201_CREATED)
+
     def get_serializer_class(self):
-        if self.action == 'retrieve':
+        if self.action in ('retrieve', 'export'):
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
-            return serializers.RecipeImageSerializer
+            return serializers.RecipeImageUploadSerializer
+        elif self.action == 'bulk':
+            return serializers.RecipeBulkSerializer
+        elif self.action == 'import_recipes':
+            return serializers.RecipeImportUploadSerializer
 
         return self.serializer_class
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_bulk_destroy(self, queryset):
+        bulk.delete_recipes(queryset)
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
+        """stage the upload and hand it to the image workers"""
         recipe = self.get_object()
-        serializer = self.get_serializer(
-            recipe,
-            data=request.data
-        )
+        serializer = self.get_serializer(data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
-            return Response(data=serializer.data, status=status.HTTP_201_CREATED)
+            job = images.enqueue(recipe, serializer.validated_data['image'])
+            job_serializer = serializers.RecipeImageJobSerializer(
+                job, context=self.get_serializer_context()
+            )
+            location = reverse(
+                'recipe:recipeimagejob-detail', args=[job.id], request=request
+            )
+            return Response(
+                data=job_serializer.data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': location}
+            )
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+def csv_record(recipe):
+    """Flatten an exported recipe, naming its tags and ingredients"""
+    return {
+        **recipe,
+        'ingredient': '|'.join(item['name'] for item in recipe['ingredient']),
+        'tags': '|'.join(item['name'] for item in recipe['tags']),
+    }
+
+
+class RecipeImageJobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Status of background recipe image processing"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    serializer_class = serializers.RecipeImageJobSerializer
+    queryset = RecipeImageJob.objects.select_related('recipe')
+
+    def get_queryset(self):
+        return self.queryset.filter(recipe__user=self.request.user)
+
+
+@require_safe
+def recipe_image_variant(request, image_id, ext, width, height, fmt):
+    """Serve a recipe image fitted into width x height, generated on first use
+
+    Like the original image, the variant is only reachable by the image's
+    unguessable file name.
+    """
+    if not variants.allowed_size(width, height):
+        raise Http404('Unsupported image size')
+    if not variants.supported(fmt):
+        raise Http404('Unsupported image format')
+    if not ext.isalnum():
+        raise Http404('Unknown image')
+
+    image_name = variants.source_name(image_id, ext)
+    try:
+        source_path = default_storage.path(image_name)
+        last_modified = int(os.path.getmtime(source_path))
+    except (FileNotFoundError, SuspiciousFileOperation):
+        raise Http404('Unknown image')
+
+    etag = quote_etag(variants.variant_etag(image_name, width, height, fmt))
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        path = variants.get_variant(
+            image_id, source_path, etag.strip('"'), width, height, fmt
+        )
+        response = FileResponse(
+            open(path, 'rb'), content_type=variants.FORMATS[fmt][1]
+        )
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=86400)
+    return response
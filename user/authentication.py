@@ -0,0 +1,180 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+DEFAULTS = {
+    'MAX_SIZE': 1024,
+    'TTL': 60,
+    # alias of a Django cache shared between processes, or None
+    'CACHE_ALIAS': None,
+}
+
+
+def cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+class TokenCache:
+    """Bounded LRU of token key -> (user, token) with a time to live
+
+    The LRU is per process, and invalidation only reaches the process
+    making it. With a shared_cache, every hit checks the user's generation
+    there, which invalidation moves, so a deleted token or deactivated
+    user is rejected by all processes at once. Without one, the other
+    processes keep accepting them for up to ttl seconds.
+    """
+
+    def __init__(self, max_size, ttl, shared_cache=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_cache = shared_cache
+        self.entries = OrderedDict()
+        self.user_keys = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _shared_key(self, key):
+        return f'authtoken:{key}'
+
+    def _generation_key(self, user_id):
+        return f'authtoken-user:{user_id}'
+
+    def _generation(self, user_id):
+        """The user's generation in the shared cache, None without one"""
+        if self.shared_cache is None:
+            return None
+        key = self._generation_key(user_id)
+        generation = self.shared_cache.get(key)
+        if generation is None:
+            # add() so processes starting it together agree on one value
+            self.shared_cache.add(key, uuid.uuid4().hex, None)
+            generation = self.shared_cache.get(key)
+        return generation
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry[1] > now and (
+                self.shared_cache is None
+                or self._generation(entry[0][0].pk) == entry[2]):
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                self.hits += 1
+            return entry[0]
+
+        value = None
+        if self.shared_cache is not None:
+            value = self.shared_cache.get(self._shared_key(key))
+        if value is not None:
+            self._store(key, value)
+            with self.lock:
+                self.hits += 1
+            return value
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self._store(key, value)
+        if self.shared_cache is not None:
+            self.shared_cache.set(self._shared_key(key), value, self.ttl)
+
+    def _store(self, key, value):
+        user_id = value[0].pk
+        generation = self._generation(user_id)
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl, generation)
+            self.entries.move_to_end(key)
+            self.user_keys.setdefault(user_id, set()).add(key)
+            while len(self.entries) > self.max_size:
+                old_key, (old_value, *_) = self.entries.popitem(last=False)
+                self._forget_key(old_value[0].pk, old_key)
+
+    def _forget_key(self, user_id, key):
+        keys = self.user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.user_keys[user_id]
+
+    def invalidate(self, key, user_id=None):
+        """Forget the token; given its user_id, in the other processes too"""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self._forget_key(entry[0][0].pk, key)
+        if self.shared_cache is not None:
+            self.shared_cache.delete(self._shared_key(key))
+            if user_id is not None:
+                self._advance_generation(user_id)
+
+    def _advance_generation(self, user_id):
+        self.shared_cache.set(
+            self._generation_key(user_id), uuid.uuid4().hex, None
+        )
+
+    def invalidate_user(self, user_id):
+        with self.lock:
+            keys = self.user_keys.pop(user_id, set())
+            for key in keys:
+                self.entries.pop(key, None)
+        if self.shared_cache is not None:
+            keys |= set(
+                Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+            )
+            self.shared_cache.delete_many(
+                [self._shared_key(key) for key in keys]
+            )
+            self._advance_generation(user_id)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.user_keys.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries),
+            }
+
+
+def build_token_cache():
+    options = cache_settings()
+    alias = options['CACHE_ALIAS']
+    return TokenCache(
+        options['MAX_SIZE'],
+        options['TTL'],
+        caches[alias] if alias else None
+    )
+
+
+token_cache = build_token_cache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that remembers recently seen tokens"""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+
+        user, token = cached
+        # each request gets its own copy to mutate
+        return copy.copy(user), token
@@ -0,0 +1,131 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from user.authentication import TokenCache, token_cache
+
+ME_URL = reverse('user:me')
+
+
+def create_user(**params):
+    return get_user_model().objects.create_user(**params)
+
+
+class TokenCacheTest(TestCase):
+
+    def setUp(self):
+        self.user = create_user(email='kousik.sekar@gmail.com', password='pass123')
+
+    def test_least_recently_used_evicted(self):
+        cache = TokenCache(max_size=2, ttl=60)
+        cache.set('a', (self.user, None))
+        cache.set('b', (self.user, None))
+        cache.get('a')
+        cache.set('c', (self.user, None))
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_expired_entry_is_a_miss(self):
+        cache = TokenCache(max_size=2, ttl=60)
+        with patch('time.monotonic', return_value=0):
+            cache.set('a', (self.user, None))
+        with patch('time.monotonic', return_value=61):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_invalidate_user(self):
+        cache = TokenCache(max_size=2, ttl=60)
+        cache.set('a', (self.user, None))
+        cache.invalidate_user(self.user.pk)
+        self.assertIsNone(cache.get('a'))
+
+    def test_shared_cache_second_level(self):
+        shared = caches['default']
+        writer = TokenCache(max_size=2, ttl=60, shared_cache=shared)
+        reader = TokenCache(max_size=2, ttl=60, shared_cache=shared)
+        token = Token.objects.create(user=self.user)
+
+        writer.set(token.key, (self.user, token))
+        self.assertEqual(reader.get(token.key)[0], self.user)
+
+        writer.invalidate_user(self.user.pk)
+        self.assertIsNone(shared.get(f'authtoken:{token.key}'))
+
+    def test_shared_cache_revokes_other_processes_entries(self):
+        shared = caches['default']
+        shared.clear()
+        writer = TokenCache(max_size=2, ttl=60, shared_cache=shared)
+        reader = TokenCache(max_size=2, ttl=60, shared_cache=shared)
+        token = Token.objects.create(user=self.user)
+        reader.set(token.key, (self.user, token))
+        self.assertIsNotNone(reader.get(token.key))
+
+        writer.invalidate_user(self.user.pk)
+        self.assertIsNone(reader.get(token.key))
+
+        reader.set(token.key, (self.user, token))
+        writer.invalidate(token.key, self.user.pk)
+        self.assertIsNone(reader.get(token.key))
+
+
+class CachedTokenAuthenticationTest(TestCase):
+
+    def setUp(self):
+        self.user = create_user(
+            email='kousik.sekar@gmail.com',
+            password='pass123',
+            name='Kousik'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        token_cache.clear()
+
+    def test_second_request_skips_token_lookup(self):
+        self.client.get(ME_URL)
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(token_cache.stats()['hits'], 1)
+        self.assertEqual(token_cache.stats()['misses'], 1)
+
+    def test_profile_update_seen_by_next_request(self):
+        self.client.get(ME_URL)
+        self.client.patch(ME_URL, {'name': 'New name'})
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'New name')
+
+    def test_password_change_invalidates_cached_token(self):
+        self.client.get(ME_URL)
+        self.client.patch(ME_URL, {'password': 'newpass123'})
+
+        self.assertEqual(token_cache.stats()['size'], 0)
+
+    def test_deleted_token_rejected(self):
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_inactive_user_rejected_after_save(self):
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -1,6 +1,7 @@
 from rest_framework.authtoken.views import ObtainAuthToken
 from . import serializers
-from rest_framework import generics, authentication, permissions
+from .authentication import CachedTokenAuthentication
+from rest_framework import generics, permissions
 from django.contrib.auth import get_user_model
 from rest_framework.settings import api_settings
 # Create your views here.
@@ -18,7 +19,7 @@ class AuhtenticateUserView(ObtainAuthToken):
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = serializers.UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):